@@ -0,0 +1,212 @@
+import asyncio
+import os
+import queue
+import threading
+import time
+
+import database as db
+import metrics
+from tracing import tracer
+from domain_blocklist import iter_domains_from_file
+from cache import LRUCache
+from storage import create_backend
+
+# --- ACESSO ASSÍNCRONO AO BANCO ---
+# Todas as chamadas ao SQLite rodam numa única thread dedicada, que mantém a conexão persistente do database.py.
+# O loop do discord.py só agenda o trabalho e aguarda o resultado, sem bloquear o heartbeat do gateway.
+# Backpressure: no máximo MAX_PENDING operações ficam na fila; as demais coroutines esperam por uma vaga.
+MAX_PENDING = int(os.getenv("DB_MAX_PENDING", 1000))
+
+# Configurações por servidor só mudam via set_settings (/configurar) e set_lockdown (/seguranca bloqueio),
+# então ficam em cache e os caminhos quentes (entradas, /verificar, logs) não tocam o banco.
+settings_cache = LRUCache(int(os.getenv("SETTINGS_CACHE_SIZE", 5000)))
+raid_settings_cache = LRUCache(int(os.getenv("SETTINGS_CACHE_SIZE", 5000)))
+
+# Configurações, verificações, usuários verificados e domínios bloqueados vão para o backend de STORAGE_BACKEND (ver storage.py)
+storage_backend = create_backend()
+
+DB_CALL_SECONDS = metrics.REGISTRY.histogram("astro_db_call_seconds", "Duração das chamadas ao banco (fila + execução), por função.", ["function"])
+DB_CALL_ERRORS = metrics.REGISTRY.counter("astro_db_call_errors", "Chamadas ao banco que terminaram com erro, por função.", ["function"])
+metrics.REGISTRY.gauge("astro_db_queue_depth", "Operações aguardando a thread do banco.").set_function(lambda: pending())
+_SETTINGS_CACHE = metrics.REGISTRY.gauge("astro_settings_cache", "Acertos, faltas e tamanho dos caches de configurações, por cache.", ["cache", "stat"])
+for _cache_name, _cache in (("settings", settings_cache), ("raid_settings", raid_settings_cache)):
+    for _stat in ("hits", "misses", "size"):
+        _SETTINGS_CACHE.labels(_cache_name, _stat).set_function(lambda cache=_cache, stat=_stat: cache.stats()[stat])
+
+_queue = queue.SimpleQueue()
+_worker = None
+_slots = None
+_slots_loop = None
+
+def _set_result(future, result):
+    if not future.done(): future.set_result(result)
+
+def _set_exception(future, error):
+    if not future.done(): future.set_exception(error)
+
+def _worker_loop():
+    while True:
+        job = _queue.get()
+        if job is None: break
+        loop, future, func, args = job
+        try:
+            result = func(*args)
+        except Exception as e:
+            loop.call_soon_threadsafe(_set_exception, future, e)
+        else:
+            loop.call_soon_threadsafe(_set_result, future, result)
+    db.close_connection()
+
+def start():
+    global _worker
+    if _worker is None or not _worker.is_alive():
+        _worker = threading.Thread(target=_worker_loop, name="db-worker", daemon=True)
+        _worker.start()
+
+async def close():
+    global _worker
+    if _worker is not None and _worker.is_alive():
+        await run(storage_backend.close)
+        _queue.put(None)
+        await asyncio.to_thread(_worker.join)
+    _worker = None
+
+def pending():
+    return _queue.qsize()
+
+async def run(func, *args):
+    global _slots, _slots_loop
+    loop = asyncio.get_running_loop()
+    if _slots is None or _slots_loop is not loop:
+        _slots, _slots_loop = asyncio.Semaphore(MAX_PENDING), loop
+    start()
+    started = time.perf_counter()
+    async with _slots:
+        future = loop.create_future()
+        _queue.put((loop, future, func, args))
+        try:
+            with tracer.span("db." + func.__name__):
+                return await future
+        except Exception:
+            DB_CALL_ERRORS.labels(func.__name__).inc()
+            raise
+        finally:
+            DB_CALL_SECONDS.labels(func.__name__).observe(time.perf_counter() - started)
+
+# --- VERSÕES ASSÍNCRONAS DO database.py ---
+async def init_db(): return await run(db.init_db)
+
+async def init_backend(): return await run(storage_backend.init)
+
+async def add_verified_user(user_id, guild_id): return await run(storage_backend.add_verified_user, user_id, guild_id)
+
+async def add_verified_users(pairs, verified_at=None, keep_existing=False): return await run(storage_backend.add_verified_users, pairs, verified_at, keep_existing)
+
+async def remove_verified_user(user_id, guild_id): return await run(storage_backend.remove_verified_user, user_id, guild_id)
+
+async def remove_verified_users(pairs): return await run(storage_backend.remove_verified_users, pairs)
+
+async def get_verified_user_ids(guild_id): return await run(storage_backend.get_verified_user_ids, guild_id)
+
+async def get_verified_user(user_id, guild_id): return await run(storage_backend.get_verified_user, user_id, guild_id)
+
+async def delete_expired_verifications(max_age=None, batch_size=500): return await run(storage_backend.delete_expired_verifications, max_age, batch_size)
+
+async def set_settings(guild_id, verified_role_id, unverified_role_id, log_channel_id, allowed_domains=None):
+    await run(storage_backend.set_settings, guild_id, verified_role_id, unverified_role_id, log_channel_id, allowed_domains)
+    # Write-through: set_settings sempre grava lockdown_enabled = False
+    settings_cache.put(guild_id, (verified_role_id, unverified_role_id, log_channel_id, False))
+
+async def get_settings(guild_id):
+    settings = settings_cache.get(guild_id)
+    if settings is None:
+        settings = await run(storage_backend.get_settings, guild_id)
+        settings_cache.put(guild_id, settings)
+    return settings
+
+async def set_lockdown(guild_id, status: bool):
+    await run(storage_backend.set_lockdown, guild_id, status)
+    # O UPDATE não faz nada se o servidor nunca foi configurado, então invalida em vez de supor o resultado
+    settings_cache.invalidate(guild_id)
+
+async def get_raid_settings(guild_id):
+    settings = raid_settings_cache.get(guild_id)
+    if settings is None:
+        settings = await run(storage_backend.get_raid_settings, guild_id)
+        raid_settings_cache.put(guild_id, settings)
+    return settings
+
+async def set_raid_settings(guild_id, threshold_count, threshold_seconds, auto_lockdown: bool):
+    await run(storage_backend.set_raid_settings, guild_id, threshold_count, threshold_seconds, auto_lockdown)
+    raid_settings_cache.put(guild_id, (threshold_count, threshold_seconds, auto_lockdown))
+
+async def get_settings_version(): return await run(storage_backend.get_settings_version)
+
+async def get_blocklist_version(): return await run(storage_backend.get_blocklist_version)
+
+async def watch_settings(interval=5, blocklist=None, blocklist_version=None):
+    # Modo cluster: outro processo pode ter mudado as configurações ou os domínios bloqueados; quando a versão no banco
+    # muda, esvazia os caches ou recarrega a lista. blocklist_version é a versão lida antes da carga inicial da lista.
+    version = await get_settings_version()
+    while True:
+        await asyncio.sleep(interval)
+        current = await get_settings_version()
+        if current != version:
+            settings_cache.clear()
+            raid_settings_cache.clear()
+            version = current
+        if blocklist is not None:
+            current = await get_blocklist_version()
+            if current != blocklist_version:
+                blocklist.load(await get_all_blocked_domains())
+                blocklist_version = current
+
+async def create_verification(user_id, guild_id, code): return await run(storage_backend.create_verification, user_id, guild_id, code)
+
+async def get_verification(user_id, guild_id=None): return await run(storage_backend.get_verification, user_id, guild_id)
+
+async def update_attempts(user_id, guild_id): return await run(storage_backend.update_attempts, user_id, guild_id)
+
+async def update_input_code(user_id, guild_id, new_input): return await run(storage_backend.update_input_code, user_id, guild_id, new_input)
+
+async def delete_verification(user_id, guild_id): return await run(storage_backend.delete_verification, user_id, guild_id)
+
+async def add_blocked_domain(domain): return await run(storage_backend.add_blocked_domain, domain)
+
+async def remove_blocked_domain(domain): return await run(storage_backend.remove_blocked_domain, domain)
+
+async def is_domain_blocked(domain): return await run(storage_backend.is_domain_blocked, domain)
+
+async def get_all_blocked_domains(): return await run(storage_backend.get_all_blocked_domains)
+
+async def get_blocked_domains_page(after=None, before=None, prefix="", limit=25):
+    return await run(storage_backend.get_blocked_domains_page, after, before, prefix, limit)
+
+async def import_blocked_domains(path, progress=None):
+    # O arquivo é lido e inserido na thread do banco; progress (dict) recebe o número de linhas processadas
+    def on_progress(processed):
+        if progress is not None: progress["linhas"] = processed
+    return await run(storage_backend.add_blocked_domains, iter_domains_from_file(path), 1000, on_progress)
+
+async def export_blocked_domains(path): return await run(storage_backend.export_blocked_domains, path)
+
+async def get_state(key): return await run(db.get_state, key)
+
+async def set_state(key, value): return await run(db.set_state, key, value)
+
+async def record_events(rows): return await run(db.record_events, rows)
+
+async def get_verification_stats(guild_id, since): return await run(db.get_verification_stats, guild_id, since)
+
+async def enqueue_email(user_id, guild_id, recipient, code, user_name, guild_name):
+    return await run(db.enqueue_email, user_id, guild_id, recipient, code, user_name, guild_name)
+
+async def claim_due_emails(limit, shards=None): return await run(db.claim_due_emails, limit, shards)
+
+async def reschedule_email(email_id, next_attempt_at, error): return await run(db.reschedule_email, email_id, next_attempt_at, error)
+
+async def delete_email(email_id): return await run(db.delete_email, email_id)
+
+async def reset_sending_emails(shards=None): return await run(db.reset_sending_emails, shards)
+
+async def next_email_due_at(shards=None): return await run(db.next_email_due_at, shards)
@@ -0,0 +1,149 @@
+# Benchmark de vazão de eventos (entradas de membros) com 1 processo vs N processos, como no cluster.py.
+# Cada evento faz o que o bot faz num GUILD_MEMBER_ADD: decodifica o JSON, monta o discord.Member e guarda no cache,
+# registra a entrada no RaidDetector e lê as configurações do servidor num LRU.
+# Os eventos são divididos entre os processos pela mesma fórmula do Discord: shard = (guild_id >> 22) % shard_count.
+# Em uma máquina com menos núcleos que processos, o ganho fica limitado ao número de núcleos.
+# Depois, dois processos com EmailOutbox dividem o mesmo SQLite (o segundo sobe com o primeiro já enviando, como num
+# reinício): com o filtro por shard, cada e-mail tem que sair exatamente uma vez, pelo processo dono do servidor.
+# Uso: python benchmarks/bench_cluster.py [eventos] [servidores] [shards] [processos...]
+import asyncio
+import json
+import multiprocessing as mp
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import discord
+from discord.state import ConnectionState
+
+import database as db
+from cache import LRUCache
+from cluster import shard_ranges
+from raid_detector import RaidDetector
+
+ROLE_DATA = [{"id": 1, "name": "@everyone", "permissions": "0", "position": 0, "color": 0, "hoist": False, "managed": False, "mentionable": False}]
+
+def guild_id(index):
+    # IDs com timestamps diferentes nos bits altos, para que (guild_id >> 22) espalhe os servidores pelos shards
+    return ((index * 7919 + 1) << 22) | index
+
+def make_events(count, guilds, seed=42):
+    rng = random.Random(seed)
+    events = []
+    for n in range(count):
+        user_id = 10**17 + n
+        events.append(json.dumps({"guild_id": str(guild_id(rng.randrange(guilds))), "user": {"id": str(user_id), "username": f"user{user_id}",
+                                  "discriminator": "0", "avatar": None, "global_name": None}, "roles": [], "joined_at": "2024-01-01T00:00:00+00:00",
+                                  "deaf": False, "mute": False, "flags": 0}).encode())
+    return events
+
+def process_events(events, guild_ids, start_at):
+    state = ConnectionState(dispatch=lambda *a, **k: None, handlers={}, hooks={}, http=None, intents=discord.Intents.default())
+    guilds = {gid: discord.Guild(data={"id": gid, "name": str(gid), "roles": ROLE_DATA, "member_count": 0}, state=state) for gid in guild_ids}
+    settings = LRUCache(5000)
+    for gid in guild_ids: settings.put(gid, (None, None, None, False))
+    detector = RaidDetector()
+    while time.time() < start_at: time.sleep(0.001) # Todos os processos começam juntos
+    started = time.perf_counter()
+    for raw in events:
+        data = json.loads(raw)
+        guild = guilds[int(data["guild_id"])]
+        member = discord.Member(data=data, guild=guild, state=state)
+        guild._add_member(member)
+        detector.record(guild.id, time.time(), 10, 50)
+        settings.get(guild.id)
+    return time.perf_counter() - started
+
+def _run_partition(args):
+    return process_events(*args)
+
+def run(events_by_shard, guild_ids_by_shard, shard_count, processes):
+    ranges = shard_ranges(shard_count, processes)
+    jobs = [([event for shard in shard_ids for event in events_by_shard[shard]], [gid for shard in shard_ids for gid in guild_ids_by_shard[shard]])
+            for shard_ids in ranges]
+    start_at = time.time() + 0.5 + 0.1 * len(jobs)
+    with mp.Pool(len(jobs)) as pool:
+        durations = pool.map(_run_partition, [(events, guild_ids, start_at) for events, guild_ids in jobs], chunksize=1)
+    return max(durations), [len(events) for events, _ in jobs]
+
+def _run_outbox(db_path, shards, start_delay, send_delay):
+    # Um "processo do cluster" só com a fila de e-mails; devolve (email_id, guild_id) de cada envio
+    os.environ["DB_PATH"] = db_path
+    import async_database as adb
+    from email_outbox import EmailOutbox
+    sent = []
+
+    async def send(email):
+        await asyncio.sleep(send_delay)
+        sent.append((email.id, email.guild_id))
+        return True
+
+    async def done(*args): pass
+
+    async def run():
+        await asyncio.sleep(start_delay)
+        outbox = EmailOutbox(send, done, done, workers=4, provider_rate=10_000, provider_burst=10_000, poll_interval=0.05, shards=shards)
+        outbox.start()
+        while await adb.run(lambda: db.get_connection().execute("SELECT COUNT(*) FROM email_outbox").fetchone()[0]):
+            await asyncio.sleep(0.05)
+        await asyncio.sleep(0.2)
+        await outbox.close()
+        await adb.close()
+
+    asyncio.run(run())
+    return sent
+
+def check_outbox(emails=400, guilds=50):
+    # Dois processos, shards 0 e 1 de 2; o segundo começa com o primeiro no meio dos envios
+    shard_count = 2
+    results = {}
+    for label, filtered in (("sem filtro", False), ("com filtro", True)):
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, "cluster.db")
+            os.environ["DB_PATH"] = db_path
+            db.init_db()
+            for n in range(emails):
+                db.enqueue_email(n, guild_id(n % guilds), f"u{n}@example.com", "123456", "u", "g")
+            db.close_connection()
+            args = [(db_path, (shard_count, [shard]) if filtered else None, 0.3 * shard, 0.01) for shard in range(shard_count)]
+            with mp.get_context("spawn").Pool(shard_count) as pool:
+                sent = pool.starmap(_run_outbox, args)
+        ids = [email_id for process in sent for email_id, _ in process]
+        foreign = sum(1 for shard, process in enumerate(sent) for _, gid in process if (gid >> 22) % shard_count != shard)
+        results[label] = (len(set(ids)), len(ids) - len(set(ids)), foreign)
+        print(f"outbox {label}: {len(set(ids))}/{emails} e-mails enviados, {len(ids) - len(set(ids))} duplicados, "
+              f"{foreign} enviados por um processo que não é dono do servidor")
+    unique, duplicates, foreign = results["com filtro"]
+    return unique == emails and duplicates == 0 and foreign == 0
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    guilds = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    shard_count = int(sys.argv[3]) if len(sys.argv) > 3 else 8
+    process_counts = [int(arg) for arg in sys.argv[4:]] or [1, 2, 4, os.cpu_count() or 1]
+    events = make_events(count, guilds)
+    events_by_shard = [[] for _ in range(shard_count)]
+    guild_ids_by_shard = [[] for _ in range(shard_count)]
+    for index in range(guilds):
+        guild_ids_by_shard[(guild_id(index) >> 22) % shard_count].append(guild_id(index))
+    for raw in events:
+        events_by_shard[(int(json.loads(raw)["guild_id"]) >> 22) % shard_count].append(raw)
+    print(f"{count} eventos, {guilds} servidores, {shard_count} shards, {os.cpu_count()} núcleos")
+
+    baseline = None
+    for processes in dict.fromkeys(process_counts):
+        wall, sizes = run(events_by_shard, guild_ids_by_shard, shard_count, processes)
+        throughput = count / wall
+        baseline = baseline or throughput
+        print(f"{processes:>2} processo(s): {throughput:>10,.0f} eventos/s | {wall:6.2f}s | {throughput / baseline:4.2f}x | eventos por processo {min(sizes)}-{max(sizes)}")
+
+    if not check_outbox():
+        print("FALHOU: com o filtro por shard, cada e-mail deveria sair uma única vez, pelo processo dono")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# Micro-benchmark: conexão persistente (database.py) vs. o padrão antigo de abrir/fechar uma conexão por chamada.
+# Uso: python benchmarks/bench_database.py [operações]
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database as db
+
+def legacy_get_settings(path, guild_id):
+    con = sqlite3.connect(path)
+    cur = con.cursor()
+    cur.execute('SELECT verified_role_id, unverified_role_id, log_channel_id, lockdown_enabled FROM guild_settings WHERE guild_id = ?', (guild_id,))
+    settings = cur.fetchone()
+    con.close()
+    return settings
+
+def legacy_update_input_code(path, user_id, new_input):
+    con = sqlite3.connect(path)
+    cur = con.cursor()
+    cur.execute('UPDATE verifications SET current_input = ? WHERE user_id = ?', (new_input, user_id))
+    con.commit()
+    con.close()
+
+def legacy_get_verification(path, user_id):
+    con = sqlite3.connect(path)
+    cur = con.cursor()
+    cur.execute('SELECT guild_id, verification_code, attempts, created_at, current_input FROM verifications WHERE user_id = ?', (user_id,))
+    verification = cur.fetchone()
+    con.close()
+    return verification
+
+def run(label, n, get_settings, get_verification, update_input_code):
+    # Simula o fluxo do teclado: leitura da verificação + escrita do input, e uma leitura de configurações
+    start = time.perf_counter()
+    for i in range(n):
+        user_id = i % 1000
+        get_settings(1)
+        get_verification(user_id)
+        update_input_code(user_id, str(i % 999999))
+    elapsed = time.perf_counter() - start
+    ops = n * 3
+    print(f"{label:<22} {ops:>8} ops em {elapsed:7.3f}s -> {ops / elapsed:>10.0f} ops/s")
+    return ops / elapsed
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_path = os.path.join(tmp, "legacy.db")
+        con = sqlite3.connect(legacy_path)
+        con.close()
+
+        # O padrão antigo roda sobre o mesmo schema, mas sem WAL (journal padrão do SQLite)
+        os.environ["DB_PATH"] = legacy_path
+        db.init_db()
+        db.set_settings(1, 10, 20, 30)
+        for user_id in range(1000):
+            db.create_verification(user_id, 1, "123456")
+        db.get_connection().execute('PRAGMA journal_mode = DELETE')
+        db.close_connection()
+
+        legacy = run("por chamada (antigo)", n,
+                     lambda g: legacy_get_settings(legacy_path, g),
+                     lambda u: legacy_get_verification(legacy_path, u),
+                     lambda u, v: legacy_update_input_code(legacy_path, u, v))
+
+        os.environ["DB_PATH"] = os.path.join(tmp, "pooled.db")
+        db.init_db()
+        db.set_settings(1, 10, 20, 30)
+        for user_id in range(1000):
+            db.create_verification(user_id, 1, "123456")
+        pooled = run("persistente + WAL", n, db.get_settings, lambda u: db.get_verification(u, 1), lambda u, v: db.update_input_code(u, 1, v))
+        db.close_connection()
+
+    print(f"Ganho: {pooled / legacy:.1f}x")
+
+if __name__ == "__main__":
+    main()
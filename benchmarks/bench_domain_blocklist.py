@@ -0,0 +1,60 @@
+# Benchmark da lista de bloqueio em memória (DomainBlocklist) contra a consulta exata no SQLite (database.is_domain_blocked).
+# Uso: python benchmarks/bench_domain_blocklist.py [domínios_bloqueados] [consultas]
+import os
+import random
+import string
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database as db
+from domain_blocklist import DomainBlocklist
+
+TLDS = ["com", "org", "net", "io", "xyz", "info", "email", "com.br"]
+
+def random_domain(rng):
+    name = "".join(rng.choices(string.ascii_lowercase + string.digits + "-", k=rng.randint(5, 14))).strip("-") or "x"
+    return f"{name}.{rng.choice(TLDS)}"
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 150_000
+    queries = int(sys.argv[2]) if len(sys.argv) > 2 else 200_000
+    rng = random.Random(42)
+    blocked = list({random_domain(rng) for _ in range(size)})
+
+    # Metade das consultas cai em subdomínios de domínios bloqueados, metade em domínios livres
+    lookups = []
+    for i in range(queries):
+        if i % 2: lookups.append(f"mail.{rng.choice(blocked)}")
+        else: lookups.append(random_domain(rng))
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    index = DomainBlocklist(blocked)
+    build = time.perf_counter() - start
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(f"Índice: {len(index)} domínios carregados em {build:.3f}s, ~{memory / 1024 / 1024:.1f} MB")
+
+    start = time.perf_counter()
+    hits = sum(1 for d in lookups if index.is_blocked(d))
+    elapsed = time.perf_counter() - start
+    print(f"DomainBlocklist       {queries:>8} consultas em {elapsed:7.3f}s -> {queries / elapsed:>10.0f}/s ({hits} bloqueados)")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DB_PATH"] = os.path.join(tmp, "bench.db")
+        db.init_db()
+        with db.get_connection() as con:
+            con.executemany('INSERT OR IGNORE INTO blocked_domains (domain) VALUES (?)', ((d,) for d in blocked))
+        sample = lookups[:min(queries, 50_000)]
+        start = time.perf_counter()
+        hits = sum(1 for d in sample if db.is_domain_blocked(d))
+        elapsed = time.perf_counter() - start
+        print(f"SQLite (exato)        {len(sample):>8} consultas em {elapsed:7.3f}s -> {len(sample) / elapsed:>10.0f}/s ({hits} bloqueados, subdomínios passam)")
+        db.close_connection()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+# Benchmark do EmailTemplate (segmentos pré-divididos + cache por servidor) contra a leitura do arquivo e str.replace a cada envio.
+# Uso: python benchmarks/bench_email_template.py [renderizações]
+import os
+import sys
+import time
+from email.message import EmailMessage
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from email_template import EmailTemplate, build_message
+
+TEMPLATE_PATH = os.path.join(ROOT, "templates", "email_template.html")
+GUILDS = [f"Servidor {i}" for i in range(50)]
+
+def legacy_render(user_name, guild_name, code):
+    with open(TEMPLATE_PATH, "r", encoding="utf-8") as f:
+        html_content = f.read()
+    return html_content.replace("{{NOME_USUARIO}}", user_name).replace("{{NOME_SERVIDOR}}", guild_name).replace("{{CODIGO}}", code)
+
+def legacy_message(html_content, guild_name, code):
+    msg = EmailMessage()
+    msg["Subject"] = f"Seu Código de Verificação para {guild_name}"
+    msg["From"] = "astro@example.com"
+    msg["To"] = "user@example.com"
+    msg.set_content(f"Seu código para '{guild_name}' é: {code}")
+    msg.add_alternative(html_content, subtype='html')
+    return msg
+
+def new_message(html_content, guild_name, code):
+    return build_message("astro@example.com", "user@example.com", f"Seu Código de Verificação para {guild_name}", f"Seu código para '{guild_name}' é: {code}", html_content)
+
+def run(label, n, render, message=None):
+    start = time.perf_counter()
+    for i in range(n):
+        guild_name = GUILDS[i % len(GUILDS)]
+        html_content = render(f"usuario{i}", guild_name, f"{i % 1000000:06d}")
+        if message: message(html_content, guild_name, "123456")
+    elapsed = time.perf_counter() - start
+    print(f"{label:<34} {n:>7} em {elapsed:7.3f}s -> {n / elapsed:>10.0f}/s")
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    template = EmailTemplate(TEMPLATE_PATH)
+    assert template.render("a", "b", "123456") == legacy_render("a", "b", "123456")
+    run("render: arquivo + str.replace", n, legacy_render)
+    run("render: EmailTemplate", n, template.render)
+    run("render + EmailMessage (antigo)", n // 10, legacy_render, legacy_message)
+    run("render + build_message (novo)", n // 10, template.render, new_message)
+
+if __name__ == "__main__":
+    main()
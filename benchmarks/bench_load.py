@@ -0,0 +1,410 @@
+# Teste de carga ponta a ponta, offline: simula uma onda de entradas (raid) sem Discord e sem Gmail.
+# Cada usuário sintético entra no servidor (on_member_join), usa /verificar, recebe o e-mail num servidor SMTP
+# local (aiosmtpd, em outra thread), espera o teclado chegar na DM, digita o código e clica em OK — chamando os
+# mesmos handlers do main.py, com Interaction/Member/Guild falsos que só esperam api_latency a cada chamada à API.
+# Relata p50/p99 por etapa, atraso do event loop, operações no banco (por função) e memória.
+# Com --json o resumo é salvo; com --baseline, cada número é comparado a um resumo anterior (regressão).
+# Requer o aiosmtpd, que não está no requirements.txt: pip install -r requirements-dev.txt
+# Uso: python benchmarks/bench_load.py [--users 500] [--rate 50] [--guilds 5] [--api-latency 0.05] [--json out.json] [--baseline base.json]
+import argparse
+import asyncio
+import json
+import logging
+import os
+import re
+import resource
+import socket
+import sys
+import tempfile
+import time
+import traceback
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from email import message_from_bytes
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from aiosmtpd.controller import Controller
+from aiosmtpd.smtp import AuthResult
+
+CODE_PATTERN = re.compile(r"é: (\d{6})")
+
+def percentile(values, q):
+    if not values: return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+# --- SERVIDOR SMTP LOCAL ---
+class SMTPSink:
+    # Aceita qualquer login e guarda o código de cada destinatário (tirado do texto do e-mail)
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.codes = {}
+        self.received = 0
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.latency: await asyncio.sleep(self.latency)
+        message = message_from_bytes(envelope.original_content or envelope.content)
+        for part in message.walk():
+            if part.get_content_type() == "text/plain" and (match := CODE_PATTERN.search(part.get_payload(decode=True).decode())):
+                for recipient in envelope.rcpt_tos: self.codes[recipient] = match.group(1)
+        self.received += 1
+        return "250 OK"
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+# --- DISCORD FALSO ---
+class FakeAPI:
+    # Cada chamada "à API" só espera `latency` segundos e é contada
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = 0
+
+    async def call(self):
+        self.calls += 1
+        if self.latency: await asyncio.sleep(self.latency)
+
+class FakeRole:
+    def __init__(self, role_id, name):
+        self.id = role_id
+        self.name = name
+        self.mention = f"<@&{role_id}>"
+
+class FakeChannel:
+    def __init__(self, api, channel_id):
+        self.api = api
+        self.id = channel_id
+        self.messages = 0
+
+    async def send(self, content=None, **kwargs):
+        await self.api.call()
+        self.messages += 1
+
+class FakeMember:
+    def __init__(self, api, guild, user_id):
+        self.api = api
+        self.guild = guild
+        self.id = user_id
+        self.bot = False
+        self.name = self.display_name = f"carga{user_id}"
+        self.mention = f"<@{user_id}>"
+        self.created_at = datetime.now(timezone.utc) - timedelta(days=30)
+        self.roles = []
+        self.keypad = None
+        self.keypad_arrived = asyncio.Event()
+
+    async def add_roles(self, *roles, reason=None):
+        await self.api.call()
+        self.roles += [role for role in roles if role not in self.roles]
+
+    async def remove_roles(self, *roles, reason=None):
+        await self.api.call()
+        self.roles = [role for role in self.roles if role not in roles]
+
+    async def send(self, content=None, embed=None, view=None, **kwargs):
+        await self.api.call()
+        if view is not None:
+            self.keypad = view
+            self.keypad_arrived.set()
+
+class FakeGuild:
+    def __init__(self, api, guild_id):
+        self.id = guild_id
+        self.name = f"Servidor de carga {guild_id}"
+        self.verified_role = FakeRole(guild_id + 1, "Verificado")
+        self.unverified_role = FakeRole(guild_id + 2, "Não verificado")
+        self.log_channel = FakeChannel(api, guild_id + 3)
+        self._roles = {role.id: role for role in (self.verified_role, self.unverified_role)}
+        self._members = {}
+
+    def get_role(self, role_id):
+        return self._roles.get(role_id)
+
+    def get_member(self, user_id):
+        return self._members.get(user_id)
+
+    def add_member(self, member):
+        self._members[member.id] = member
+
+class FakeResponse:
+    def __init__(self, api):
+        self.api = api
+        self._done = False
+
+    def is_done(self):
+        return self._done
+
+    async def defer(self, **kwargs):
+        await self.api.call()
+        self._done = True
+
+    async def send_message(self, content=None, **kwargs):
+        await self.api.call()
+        self._done = True
+
+    async def edit_message(self, **kwargs):
+        await self.api.call()
+        self._done = True
+
+class FakeFollowup:
+    def __init__(self, api):
+        self.api = api
+        self.messages = []
+
+    async def send(self, content=None, **kwargs):
+        await self.api.call()
+        self.messages.append(content)
+
+class FakeInteraction:
+    def __init__(self, api, user, guild=None):
+        self.user = user
+        self.guild = guild
+        self.guild_id = guild.id if guild else None
+        self.response = FakeResponse(api)
+        self.followup = FakeFollowup(api)
+
+# --- HARNESS ---
+class LoadTest:
+    def __init__(self, args, main, smtp):
+        self.args = args
+        self.main = main
+        self.smtp = smtp
+        self.api = FakeAPI(args.api_latency)
+        self.guilds = [FakeGuild(self.api, (g + 1) * 10**15) for g in range(args.guilds)]
+        self.users = {}
+        self.stages = {}
+        self.outcomes = {}
+        self.errors = []
+        self.loop_lags = []
+
+    def observe(self, stage, started):
+        self.stages.setdefault(stage, []).append(time.perf_counter() - started)
+
+    def outcome(self, name):
+        self.outcomes[name] = self.outcomes.get(name, 0) + 1
+
+    def install(self):
+        # O bot não conecta: as buscas de servidor, usuário e canal respondem com os objetos falsos
+        bot = self.main.bot
+        guilds = {guild.id: guild for guild in self.guilds}
+        channels = {guild.log_channel.id: guild.log_channel for guild in self.guilds}
+        bot.get_guild = guilds.get
+        bot.get_channel = channels.get
+        bot.get_user = self.users.get
+        async def fetch_user(user_id): return self.users[user_id]
+        bot.fetch_user = fetch_user
+
+    async def setup(self):
+        # O mesmo que o setup_hook faz, menos o que precisa do gateway (sincronizar comandos, views persistentes)
+        adb = self.main.adb
+        adb.start()
+        await adb.init_backend()
+        self.main.verification_events.start()
+        self.main.outbox.start()
+        self.main.blocklist.load(await adb.get_all_blocked_domains())
+        for guild in self.guilds:
+            await adb.set_settings(guild.id, guild.verified_role.id, guild.unverified_role.id, guild.log_channel.id)
+            await adb.set_raid_settings(guild.id, self.args.raid_threshold, 10, False)
+
+    async def teardown(self):
+        main = self.main
+        await main.outbox.close()
+        await main.role_queue.close()
+        await main.log_dispatcher.close()
+        await main.verification_events.close()
+        if main.smtp_pool: await main.smtp_pool.close()
+        await main.adb.close()
+
+    async def monitor_loop(self, stop, interval=0.01):
+        loop = asyncio.get_running_loop()
+        while not stop.is_set():
+            started = loop.time()
+            await asyncio.sleep(interval)
+            self.loop_lags.append(max(0.0, loop.time() - started - interval))
+
+    async def user_flow(self, n):
+        main, args = self.main, self.args
+        guild = self.guilds[n % len(self.guilds)]
+        member = FakeMember(self.api, guild, 10**17 + n)
+        self.users[member.id] = member
+        guild.add_member(member)
+        flow_started = started = time.perf_counter()
+        await main.on_member_join(member)
+        self.observe("join", started)
+
+        if args.think: await asyncio.sleep(args.think)
+        email = f"carga{n}@provedor{n % args.providers}.example"
+        interaction = FakeInteraction(self.api, member, guild)
+        started = time.perf_counter()
+        await main.verificar.callback(interaction, email)
+        self.observe("verificar", started)
+        if not interaction.followup.messages or not interaction.followup.messages[-1].startswith("📨"):
+            return self.outcome("verificar_recusado")
+
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(member.keypad_arrived.wait(), args.timeout)
+        except asyncio.TimeoutError:
+            return self.outcome("teclado_nao_chegou")
+        self.observe("email_ate_dm", started)
+        code = self.smtp.codes.get(email)
+        if code is None: return self.outcome("codigo_nao_recebido")
+
+        for digit in code:
+            if args.key_interval: await asyncio.sleep(args.key_interval)
+            started = time.perf_counter()
+            await member.keypad.handle_key_press(FakeInteraction(self.api, member), digit)
+            self.observe("tecla", started)
+        started = time.perf_counter()
+        await member.keypad.handle_submission(FakeInteraction(self.api, member))
+        self.observe("ok", started)
+        if guild.verified_role not in member.roles: return self.outcome("nao_verificado")
+        self.observe("ponta_a_ponta", flow_started)
+        self.outcome("verificado")
+
+    async def run(self):
+        args = self.args
+        self.install()
+        await self.setup()
+        db_before = self.db_ops()
+        api_before = self.api.calls
+        stop = asyncio.Event()
+        monitor = asyncio.create_task(self.monitor_loop(stop))
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if args.tracemalloc: tracemalloc.start()
+
+        started = time.perf_counter()
+        flows = []
+        for n in range(args.users):
+            # Chegadas no ritmo de --rate por segundo, sem acumular o atraso dos sleeps
+            delay = started + n / args.rate - time.perf_counter()
+            if delay > 0: await asyncio.sleep(delay)
+            flows.append(asyncio.create_task(self.user_flow(n)))
+        results = await asyncio.gather(*flows, return_exceptions=True)
+        duration = time.perf_counter() - started
+        for result in results:
+            if isinstance(result, BaseException):
+                self.outcome("erro")
+                self.errors.append(result)
+        if self.errors: traceback.print_exception(self.errors[0])
+
+        stop.set()
+        await monitor
+        traced_peak = tracemalloc.get_traced_memory()[1] if args.tracemalloc else None
+        if args.tracemalloc: tracemalloc.stop()
+        db_ops = {name: (count - db_before.get(name, (0, 0))[0], total - db_before.get(name, (0, 0))[1]) for name, (count, total) in self.db_ops().items()}
+        summary = {
+            "config": {key: value for key, value in vars(args).items() if key not in ("json", "baseline")},
+            "duration": duration,
+            "outcomes": self.outcomes,
+            "stages": {stage: {"count": len(values), "p50": percentile(values, 0.5), "p99": percentile(values, 0.99), "max": max(values)}
+                       for stage, values in self.stages.items()},
+            "loop_lag": {"p50": percentile(self.loop_lags, 0.5), "p99": percentile(self.loop_lags, 0.99), "max": max(self.loop_lags, default=0.0)},
+            "db": {"ops": sum(count for count, _ in db_ops.values()), "seconds": sum(total for _, total in db_ops.values()),
+                   "by_function": {name: count for name, (count, _) in sorted(db_ops.items(), key=lambda item: -item[1][0]) if count}},
+            "api_calls": self.api.calls - api_before,
+            "emails": self.smtp.received,
+            "role_queue": self.main.role_queue.stats(),
+            "memory": {"max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, "rss_growth_mb": (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before) / 1024,
+                       "traced_peak_mb": traced_peak / 1024 / 1024 if traced_peak is not None else None},
+        }
+        await self.teardown()
+        return summary
+
+    def db_ops(self):
+        return {values[0]: (child.count, child.sum) for values, child in list(self.main.adb.DB_CALL_SECONDS._children.items())}
+
+# --- RELATÓRIO ---
+def flatten(summary):
+    # Números comparáveis entre execuções (chave -> valor, menor é melhor)
+    metrics = {f"{stage}.{q}": values[q] for stage, values in summary["stages"].items() for q in ("p50", "p99")}
+    metrics.update({f"loop_lag.{q}": summary["loop_lag"][q] for q in ("p50", "p99", "max")})
+    metrics["db.ops_por_usuario"] = summary["db"]["ops"] / max(1, summary["config"]["users"])
+    metrics["memoria.max_rss_mb"] = summary["memory"]["max_rss_mb"]
+    return metrics
+
+def report(summary, baseline=None):
+    config = summary["config"]
+    print(f"{config['users']} usuários a {config['rate']}/s em {config['guilds']} servidores, latência da API {config['api_latency'] * 1000:.0f} ms "
+          f"-> {summary['duration']:.1f}s")
+    print("resultados: " + ", ".join(f"{name}={count}" for name, count in sorted(summary["outcomes"].items())))
+    old = flatten(baseline) if baseline else {}
+    new = flatten(summary)
+
+    def delta(key):
+        if key not in old or not old[key]: return ""
+        return f" ({(new[key] - old[key]) / old[key]:+.0%})"
+
+    print(f"\n{'etapa':<14} {'n':>6} {'p50 ms':>10} {'p99 ms':>10} {'max ms':>10}")
+    for stage, values in summary["stages"].items():
+        print(f"{stage:<14} {values['count']:>6} {values['p50'] * 1000:>10.1f} {values['p99'] * 1000:>10.1f} {values['max'] * 1000:>10.1f} {delta(stage + '.p99')}")
+    lag = summary["loop_lag"]
+    print(f"\natraso do event loop: p50 {lag['p50'] * 1000:.1f} ms | p99 {lag['p99'] * 1000:.1f} ms{delta('loop_lag.p99')} | max {lag['max'] * 1000:.1f} ms")
+    db = summary["db"]
+    print(f"banco: {db['ops']} operações ({new['db.ops_por_usuario']:.1f} por usuário{delta('db.ops_por_usuario')}), {db['seconds']:.2f}s somando fila + execução")
+    print("  " + ", ".join(f"{name}={count}" for name, count in list(db["by_function"].items())[:8]))
+    queue = summary["role_queue"]
+    print(f"API falsa: {summary['api_calls']} chamadas | e-mails recebidos: {summary['emails']} | fila de cargos: {queue['assigned']} aplicados, atraso máx. {queue['max_lag']:.1f}s")
+    memory = summary["memory"]
+    traced = f" | pico Python (tracemalloc) {memory['traced_peak_mb']:.1f} MB" if memory["traced_peak_mb"] is not None else ""
+    print(f"memória: RSS máx. {memory['max_rss_mb']:.0f} MB{delta('memoria.max_rss_mb')} (+{memory['rss_growth_mb']:.0f} MB durante o teste){traced}")
+
+# --- EXECUÇÃO ---
+def parse_args():
+    parser = argparse.ArgumentParser(description="Teste de carga offline do Astro (Discord falso + SMTP local).")
+    parser.add_argument("--users", type=int, default=500, help="usuários sintéticos")
+    parser.add_argument("--rate", type=float, default=50, help="entradas por segundo")
+    parser.add_argument("--guilds", type=int, default=5, help="servidores")
+    parser.add_argument("--providers", type=int, default=20, help="domínios de e-mail distintos (cada um tem seu limite de envio)")
+    parser.add_argument("--api-latency", type=float, default=0.05, help="segundos por chamada à API falsa do Discord")
+    parser.add_argument("--smtp-latency", type=float, default=0.0, help="segundos que o SMTP local leva para aceitar cada e-mail")
+    parser.add_argument("--think", type=float, default=0.0, help="segundos entre entrar e usar /verificar")
+    parser.add_argument("--key-interval", type=float, default=0.0, help="segundos entre teclas")
+    parser.add_argument("--raid-threshold", type=int, default=15, help="entradas em 10s para disparar o alerta de raid")
+    parser.add_argument("--timeout", type=float, default=120, help="segundos esperando o teclado chegar na DM")
+    parser.add_argument("--tracemalloc", action="store_true", help="mede o pico de memória Python (deixa tudo mais lento)")
+    parser.add_argument("--json", help="salva o resumo neste arquivo")
+    parser.add_argument("--baseline", help="compara com um resumo salvo antes com --json")
+    args = parser.parse_args()
+    # Os caminhos são relativos ao diretório de onde o script foi chamado (o teste roda a partir da raiz do repositório)
+    if args.json: args.json = os.path.abspath(args.json)
+    if args.baseline: args.baseline = os.path.abspath(args.baseline)
+    return args
+
+def main():
+    args = parse_args()
+    smtp = SMTPSink(args.smtp_latency)
+    smtp_port = free_port()
+    controller = Controller(smtp, hostname="127.0.0.1", port=smtp_port, auth_require_tls=False,
+                            authenticator=lambda server, session, envelope, mechanism, auth_data: AuthResult(success=True))
+    logging.getLogger("mail.log").setLevel(logging.ERROR) # O aiosmtpd loga cada sessão
+    controller.start()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Configuração lida pelo main.py ao ser importado: banco temporário, SMTP local, sem servidor de métricas
+        os.environ.update({"DB_PATH": os.path.join(tmp, "carga.db"), "SMTP_HOST": "127.0.0.1", "SMTP_PORT": str(smtp_port), "SMTP_USE_TLS": "false",
+                           "EMAIL_ADDRESS": "astro@carga.example", "EMAIL_PASSWORD": "carga", "METRICS_PORT": "0",
+                           "LOG_LEVEL": os.getenv("LOG_LEVEL", "WARNING")})
+        os.chdir(ROOT)
+        import main as bot_main
+
+        summary = asyncio.run(LoadTest(args, bot_main, smtp).run())
+        bot_main.db.close_connection()
+    controller.stop()
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f: baseline = json.load(f)
+    report(summary, baseline)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f: json.dump(summary, f, indent=2)
+    if summary.get("outcomes", {}).get("erro"):
+        print(f"\n{summary['outcomes']['erro']} fluxo(s) terminaram com exceção")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
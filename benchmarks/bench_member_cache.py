@@ -0,0 +1,87 @@
+# Benchmark de memória (tracemalloc) dos perfis de cache de membros, com objetos reais do discord.py.
+# "full": todos os membros de todos os servidores no cache (o que o chunking na inicialização faz).
+# "low": nenhum membro no cache do discord.py; buscas sob demanda passam pelo MemberCache (LRU).
+# Uso: python benchmarks/bench_member_cache.py [servidores] [membros_por_servidor] [buscas]
+import asyncio
+import gc
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import discord
+from discord.state import ConnectionState
+
+from member_cache import MemberCache
+
+ROLE_DATA = [{"id": 1, "name": "@everyone", "permissions": "0", "position": 0, "color": 0, "hoist": False, "managed": False, "mentionable": False},
+             {"id": 2, "name": "Verificado", "permissions": "0", "position": 1, "color": 0, "hoist": False, "managed": False, "mentionable": False}]
+
+def member_data(user_id):
+    return {"user": {"id": user_id, "username": f"user{user_id}", "discriminator": "0", "avatar": None, "global_name": None},
+            "roles": ["2"], "joined_at": "2024-01-01T00:00:00+00:00", "deaf": False, "mute": False, "flags": 0}
+
+class BenchGuild(discord.Guild):
+    # fetch_member sem HTTP: monta o membro a partir de um payload, como a API devolveria
+    async def fetch_member(self, member_id):
+        return discord.Member(data=member_data(member_id), guild=self, state=self._state)
+
+def make_guilds(state, guilds, members_per_guild):
+    return [BenchGuild(data={"id": g + 1, "name": f"guild{g}", "roles": ROLE_DATA, "member_count": members_per_guild}, state=state) for g in range(guilds)]
+
+def user_id(guild_index, member_index, members_per_guild):
+    return 10**17 + guild_index * members_per_guild + member_index
+
+def measure(label, build):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    keep = build()
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<8} atual {current / 1024 / 1024:8.1f} MB | pico {peak / 1024 / 1024:8.1f} MB | {time.perf_counter() - start:6.1f}s")
+    del keep
+    return current
+
+def main():
+    guilds = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    members_per_guild = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    lookups = int(sys.argv[3]) if len(sys.argv) > 3 else 100_000
+    print(f"{guilds} servidores x {members_per_guild} membros = {guilds * members_per_guild} membros; {lookups} buscas no perfil low")
+
+    def build_full():
+        state = ConnectionState(dispatch=lambda *a, **k: None, handlers={}, hooks={}, http=None, intents=discord.Intents.default())
+        all_guilds = make_guilds(state, guilds, members_per_guild)
+        for g, guild in enumerate(all_guilds):
+            for i in range(members_per_guild):
+                guild._add_member(discord.Member(data=member_data(user_id(g, i, members_per_guild)), guild=guild, state=state))
+        return all_guilds
+
+    def build_low():
+        state = ConnectionState(dispatch=lambda *a, **k: None, handlers={}, hooks={}, http=None, intents=discord.Intents.default(),
+                                member_cache_flags=discord.MemberCacheFlags.none(), chunk_guilds_at_startup=False, max_messages=None)
+        all_guilds = make_guilds(state, guilds, members_per_guild)
+        cache = MemberCache(maxsize=1000)
+        rng = random.Random(42)
+
+        async def lookups_run():
+            for _ in range(lookups):
+                g = rng.randrange(guilds)
+                # Acessos concentrados: 80% das buscas caem em 1% dos membros (quem está no meio da verificação)
+                i = rng.randrange(max(1, members_per_guild // 100)) if rng.random() < 0.8 else rng.randrange(members_per_guild)
+                await cache.get(all_guilds[g], user_id(g, i, members_per_guild))
+        asyncio.run(lookups_run())
+        stats = cache.stats()
+        print(f"         LRU: {stats['size']} membros, hit rate {stats['hit_rate']:.1%}, {stats['fetches']} buscas na API")
+        return all_guilds, cache
+
+    full = measure("full", build_full)
+    low = measure("low", build_low)
+    print(f"Redução: {full / low:.0f}x ({(full - low) / 1024 / 1024:.0f} MB a menos)")
+
+if __name__ == "__main__":
+    main()
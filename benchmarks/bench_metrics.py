@@ -0,0 +1,40 @@
+# Micro-benchmark do custo das métricas no caminho quente: observe() de histograma e inc() de contador,
+# com e sem a busca do filho por labels, e render() do registro com vários filhos.
+# Uso: python benchmarks/bench_metrics.py [operações]
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from metrics import Registry
+
+def bench(label, n, func):
+    start = time.perf_counter()
+    for _ in range(n):
+        func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<34} {elapsed / n * 1e9:8.0f} ns/op")
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500_000
+    registry = Registry()
+    histogram = registry.histogram("bench_seconds", "bench", ["function"])
+    counter = registry.counter("bench_events", "bench", ["kind"])
+    child = histogram.labels("get_settings")
+
+    bench("chamada vazia (referência)", n, lambda: None)
+    bench("histogram.labels(x).observe()", n, lambda: histogram.labels("get_settings").observe(0.0004))
+    bench("filho em cache .observe()", n, lambda: child.observe(0.0004))
+    bench("counter.labels(x).inc()", n, lambda: counter.labels("normal").inc())
+    bench("perf_counter() x2 + observe()", n, lambda: child.observe(time.perf_counter() - time.perf_counter()))
+
+    for i in range(50):
+        histogram.labels(f"function_{i}").observe(0.001)
+    start = time.perf_counter()
+    for _ in range(100):
+        text = registry.render()
+    print(f"render() com 50 séries: {(time.perf_counter() - start) / 100 * 1000:.2f} ms ({len(text)} bytes)")
+
+if __name__ == "__main__":
+    main()
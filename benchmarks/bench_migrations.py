@@ -0,0 +1,84 @@
+# Benchmark das migrações: cria um banco no schema antigo (versão 0, verifications com chave user_id) com
+# N linhas em verified_users e em verifications, e mede quanto cada migração leva para rodar.
+# Também compara consultas por servidor antes e depois dos índices novos.
+# Uso: python benchmarks/bench_migrations.py [linhas]
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database as db
+
+GUILDS = 500
+
+def create_legacy_db(path, n):
+    con = sqlite3.connect(path)
+    con.execute('PRAGMA journal_mode = WAL')
+    con.execute('''
+        CREATE TABLE guild_settings (
+            guild_id INTEGER PRIMARY KEY, verified_role_id INTEGER, unverified_role_id INTEGER,
+            log_channel_id INTEGER, lockdown_enabled BOOLEAN DEFAULT FALSE
+        )
+    ''')
+    con.execute('''
+        CREATE TABLE verifications (
+            user_id INTEGER PRIMARY KEY, guild_id INTEGER NOT NULL, verification_code TEXT NOT NULL,
+            attempts INTEGER DEFAULT 0, created_at INTEGER NOT NULL, current_input TEXT DEFAULT ''
+        )
+    ''')
+    con.execute('CREATE TABLE blocked_domains (domain TEXT PRIMARY KEY)')
+    con.execute('CREATE TABLE verified_users (user_id INTEGER, guild_id INTEGER, verified_at INTEGER NOT NULL, PRIMARY KEY (user_id, guild_id))')
+    rng = random.Random(42)
+    now = int(time.time())
+    batch = 50_000
+    with con:
+        for start in range(0, n, batch):
+            rows = range(start, min(n, start + batch))
+            con.executemany('INSERT INTO verified_users VALUES (?, ?, ?)', ((i, rng.randrange(GUILDS), now - rng.randrange(86400 * 365)) for i in rows))
+            con.executemany('INSERT INTO verifications (user_id, guild_id, verification_code, created_at) VALUES (?, ?, ?, ?)',
+                            ((i, rng.randrange(GUILDS), "123456", now - rng.randrange(600)) for i in rows))
+    con.close()
+
+def time_queries(label, con, runs=50):
+    start = time.perf_counter()
+    for guild_id in range(runs):
+        con.execute('SELECT COUNT(*) FROM verified_users WHERE guild_id = ?', (guild_id,)).fetchone()
+        con.execute('SELECT user_id FROM verified_users WHERE guild_id = ? ORDER BY verified_at DESC LIMIT 25', (guild_id,)).fetchall()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<34} {runs * 2:>5} consultas por servidor em {elapsed:7.3f}s ({elapsed / (runs * 2) * 1000:.2f} ms/consulta)")
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "legacy.db")
+        start = time.perf_counter()
+        create_legacy_db(path, n)
+        print(f"Banco de teste: {n} linhas em verified_users e verifications ({time.perf_counter() - start:.1f}s para gerar)")
+
+        con = sqlite3.connect(path)
+        time_queries("antes (sem índice)", con)
+        con.close()
+
+        os.environ["DB_PATH"] = path
+        start = time.perf_counter()
+        applied = db.init_db()
+        total = time.perf_counter() - start
+        for version, seconds in applied:
+            print(f"migração {version}: {seconds:7.3f}s")
+        print(f"total: {total:7.3f}s, versão do schema: {db.get_schema_version()}")
+
+        con = db.get_connection()
+        assert con.execute('SELECT COUNT(*) FROM verifications').fetchone()[0] == n
+        time_queries("depois (idx_verified_users_guild)", con)
+
+        start = time.perf_counter()
+        assert db.init_db() == []
+        print(f"init_db sem migrações pendentes: {(time.perf_counter() - start) * 1000:.2f} ms")
+        db.close_connection()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+# Replay de entradas simuladas: RaidDetector (baldes, memória constante) contra o dict de deques usado antes.
+# Uso: python benchmarks/bench_raid_detector.py [entradas] [servidores]
+import os
+import random
+import sys
+import time
+import tracemalloc
+from collections import deque
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from raid_detector import RaidDetector
+
+WINDOW = 60
+THRESHOLD = 15
+
+def generate_joins(total, guilds, rng):
+    # Distribuição desigual (alguns servidores grandes, muitos pequenos) e rajadas ocasionais de raid
+    weights = [1 / (i + 1) for i in range(guilds)]
+    guild_ids = rng.choices(range(guilds), weights=weights, k=total)
+    now = 0.0
+    for i, guild_id in enumerate(guild_ids):
+        now += rng.expovariate(200)
+        if i % 50_000 == 0:
+            raid_guild = rng.randrange(guilds)
+            for _ in range(30):
+                yield raid_guild, now
+        yield guild_id, now
+
+def legacy_replay(joins):
+    recent_joins = {}
+    alerts = 0
+    for guild_id, now in joins:
+        if guild_id not in recent_joins:
+            recent_joins[guild_id] = deque()
+        recent_joins[guild_id].append(now)
+        while recent_joins[guild_id] and now - recent_joins[guild_id][0] > WINDOW:
+            recent_joins[guild_id].popleft()
+        if len(recent_joins[guild_id]) >= THRESHOLD:
+            alerts += 1
+            recent_joins[guild_id].clear()
+    return alerts, recent_joins
+
+def detector_replay(joins):
+    detector = RaidDetector(idle_after=WINDOW * 5)
+    alerts = 0
+    for guild_id, now in joins:
+        if detector.record(guild_id, now, WINDOW, THRESHOLD):
+            alerts += 1
+    return alerts, detector
+
+def run(label, replay, joins):
+    # Tempo e memória em passadas separadas: o tracemalloc distorce bastante o tempo de código Python puro
+    start = time.perf_counter()
+    alerts, state = replay(joins)
+    elapsed = time.perf_counter() - start
+    del state
+    tracemalloc.start()
+    alerts, state = replay(joins)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(f"{label:<16} {len(joins):>9} entradas em {elapsed:7.2f}s -> {len(joins) / elapsed:>9.0f}/s, {alerts} alertas, "
+          f"{len(state)} servidores em memória, ~{memory / 1024 / 1024:.1f} MB")
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000_000
+    guilds = int(sys.argv[2]) if len(sys.argv) > 2 else 5_000
+    joins = list(generate_joins(total, guilds, random.Random(42)))
+    run("dict de deques", legacy_replay, joins)
+    run("RaidDetector", detector_replay, joins)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+# Benchmark do SMTPPool contra um servidor SMTP local (aiosmtpd), comparando com uma conexão por e-mail (aiosmtplib.send).
+# Também confere que todos os e-mails chegaram ao servidor local.
+# Requer o aiosmtpd, que não está no requirements.txt: pip install -r requirements-dev.txt
+# Uso: python benchmarks/bench_smtp.py [e-mails] [concorrência]
+import asyncio
+import os
+import socket
+import sys
+import time
+from email.message import EmailMessage
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import aiosmtplib
+from aiosmtpd.controller import Controller
+
+from smtp_pool import SMTPPool
+
+class CountingHandler:
+    def __init__(self):
+        self.received = 0
+
+    async def handle_DATA(self, server, session, envelope):
+        self.received += 1
+        return "250 OK"
+
+def build_message(i):
+    msg = EmailMessage()
+    msg["Subject"] = f"Código {i:06d}"
+    msg["From"] = "astro@localhost"
+    msg["To"] = f"user{i}@example.com"
+    msg.set_content(f"Seu código é: {i:06d}")
+    return msg
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+async def run(label, total, concurrency, send):
+    limit = asyncio.Semaphore(concurrency)
+    async def one(i):
+        async with limit:
+            await send(build_message(i))
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    elapsed = time.perf_counter() - start
+    print(f"{label:<24} {total:>6} e-mails em {elapsed:7.3f}s -> {total / elapsed:>8.0f} e-mails/s")
+    return total / elapsed
+
+async def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    handler = CountingHandler()
+    host, port = "127.0.0.1", free_port()
+    controller = Controller(handler, hostname=host, port=port)
+    controller.start()
+    try:
+        per_message = await run("uma conexão por e-mail", total, concurrency, lambda msg: aiosmtplib.send(msg, hostname=host, port=port))
+        pool = SMTPPool(host, port, use_tls=False, max_size=concurrency)
+        pooled = await run("SMTPPool", total, concurrency, pool.send)
+        print(f"Pool: {pool.stats()}")
+        await pool.close()
+    finally:
+        controller.stop()
+    assert handler.received == total * 2, f"esperados {total * 2} e-mails, recebidos {handler.received}"
+    print(f"Todos os {handler.received} e-mails foram entregues. Ganho: {pooled / per_message:.1f}x")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,192 @@
+# Conformidade e desempenho dos backends de armazenamento (storage.py): sqlite, memory e remote.
+# O remote roda contra um storage_server.py local (uvicorn numa thread), com um MemoryBackend por trás.
+# Primeiro cada backend passa pelas mesmas verificações de comportamento (as do database.py são a referência);
+# depois mede operações por segundo das chamadas dos caminhos quentes.
+# Uso: python benchmarks/bench_storage.py [operações] [backends...]
+import os
+import sys
+import tempfile
+import threading
+import time
+import traceback
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import uvicorn
+
+import database as db
+import storage
+from storage_server import create_app
+
+# --- CONFORMIDADE ---
+def check_settings(backend):
+    assert backend.get_settings(1) == (None, None, None, False)
+    assert backend.get_raid_settings(1) == (db.DEFAULT_RAID_THRESHOLD_COUNT, db.DEFAULT_RAID_THRESHOLD_SECONDS, False)
+    version = backend.get_settings_version()
+    backend.set_settings(1, 10, 11, 12)
+    assert tuple(backend.get_settings(1)[:3]) == (10, 11, 12) and not backend.get_settings(1)[3]
+    backend.set_lockdown(1, True)
+    assert backend.get_settings(1)[3]
+    backend.set_settings(1, 20, 21, 22) # set_settings sempre desliga o lockdown
+    assert backend.get_settings(1)[:3] == (20, 21, 22) and not backend.get_settings(1)[3]
+    backend.set_raid_settings(1, 5, 30, True)
+    assert tuple(backend.get_raid_settings(1)[:2]) == (5, 30) and backend.get_raid_settings(1)[2]
+    assert backend.get_settings(1)[:3] == (20, 21, 22) # Configurações de raid não mexem nas de cargos
+    backend.set_raid_settings(2, 7, 10, False) # Servidor sem /configurar
+    assert backend.get_settings(2)[:3] == (None, None, None)
+    assert backend.get_settings_version() > version
+
+def check_verifications(backend):
+    assert backend.get_verification(100) is None
+    backend.create_verification(100, 1, "111111")
+    guild_id, code, attempts, created_at, current_input = backend.get_verification(100, 1)
+    assert (guild_id, code, attempts, current_input) == (1, "111111", 0, "") and abs(created_at - time.time()) < 5
+    backend.update_attempts(100, 1)
+    backend.update_input_code(100, 1, "12")
+    assert backend.get_verification(100, 1)[2:5:2] == (1, "12")
+    backend.create_verification(100, 2, "222222") # Mesmo usuário em outro servidor: a mais recente vence
+    assert backend.get_verification(100)[:2] == (2, "222222")
+    backend.create_verification(100, 1, "333333") # Recriar zera tentativas e entrada
+    assert backend.get_verification(100, 1)[1:3] == ("333333", 0) and backend.get_verification(100, 1)[4] == ""
+    backend.delete_verification(100, 2)
+    assert backend.get_verification(100, 2) is None and backend.get_verification(100)[0] == 1
+    backend.update_attempts(999, 1) # Sem linha: não faz nada
+    assert backend.get_verification(999) is None
+    for user_id in range(200, 210): backend.create_verification(user_id, 1, "000000")
+    assert backend.delete_expired_verifications(3600) == 0
+    time.sleep(1.1)
+    assert backend.delete_expired_verifications(0, 4) == 4
+    assert backend.delete_expired_verifications(0, 500) == 7
+
+def check_verified_users(backend):
+    assert backend.get_verified_user(1, 1) is None
+    backend.add_verified_user(1, 1)
+    assert abs(backend.get_verified_user(1, 1) - time.time()) < 5
+    backend.add_verified_users([(2, 1), (3, 1), (2, 2)], verified_at=100)
+    assert sorted(backend.get_verified_user_ids(1)) == [1, 2, 3] and backend.get_verified_user_ids(2) == [2]
+    backend.add_verified_users([(2, 1), (4, 1)], verified_at=200, keep_existing=True)
+    assert backend.get_verified_user(2, 1) == 100 and backend.get_verified_user(4, 1) == 200
+    backend.add_verified_users([(2, 1)], verified_at=300)
+    assert backend.get_verified_user(2, 1) == 300
+    backend.remove_verified_user(1, 1)
+    backend.remove_verified_users([(2, 1), (9, 9)])
+    assert sorted(backend.get_verified_user_ids(1)) == [3, 4] and backend.get_verified_user_ids(3) == []
+
+def check_blocked_domains(backend):
+    assert not backend.is_domain_blocked("a.com")
+    version = backend.get_blocklist_version()
+    backend.add_blocked_domain("b.com")
+    assert backend.get_blocklist_version() > version
+    version = backend.get_blocklist_version()
+    backend.add_blocked_domain("b.com")
+    assert backend.get_blocklist_version() == version # Nada mudou
+    assert backend.is_domain_blocked("b.com") and backend.get_all_blocked_domains() == ["b.com"]
+    progress = []
+    domains = [f"d{i:03d}.com" for i in range(250)] + ["b.com", "a.com", "mail.ru"]
+    assert tuple(backend.add_blocked_domains(iter(domains), 100, progress.append)) == (253, 252)
+    assert progress[-1] == 253
+    assert backend.get_blocked_domains_page(limit=3) == ["a.com", "b.com", "d000.com"]
+    assert backend.get_blocked_domains_page(after="d248.com", limit=5) == ["d249.com", "mail.ru"]
+    assert backend.get_blocked_domains_page(before="d002.com", limit=3) == ["b.com", "d000.com", "d001.com"]
+    assert backend.get_blocked_domains_page(prefix="d1", limit=200)[::99] == ["d100.com", "d199.com"]
+    assert backend.get_blocked_domains_page(after="d150.com", prefix="d1", limit=2) == ["d151.com", "d152.com"]
+    assert backend.get_blocklist_version() > version
+    version = backend.get_blocklist_version()
+    assert backend.remove_blocked_domain("b.com") == 1 and backend.get_blocklist_version() > version
+    version = backend.get_blocklist_version()
+    assert backend.remove_blocked_domain("b.com") == 0 and backend.get_blocklist_version() == version
+    assert list(backend.iter_blocked_domains(64)) == backend.get_all_blocked_domains() and len(backend.get_all_blocked_domains()) == 252
+    with tempfile.TemporaryDirectory() as tmp:
+        assert backend.export_blocked_domains(os.path.join(tmp, "out.txt")) == 252
+
+CHECKS = [check_settings, check_verifications, check_verified_users, check_blocked_domains]
+
+# --- DESEMPENHO ---
+def bench(label, operations, func):
+    start = time.perf_counter()
+    for i in range(operations): func(i)
+    elapsed = time.perf_counter() - start
+    print(f"    {label:<28} {operations / elapsed:>12,.0f} ops/s | {elapsed / operations * 1e6:8.1f} µs/op")
+
+def run_benchmarks(backend, operations):
+    for guild_id in range(100): backend.set_settings(guild_id, 1, 2, 3)
+    backend.add_blocked_domains((f"spam{i}.com" for i in range(10_000)))
+    bench("get_settings", operations, lambda i: backend.get_settings(i % 100))
+    bench("create_verification", operations, lambda i: backend.create_verification(10**17 + i, i % 100, "123456"))
+    bench("get_verification", operations, lambda i: backend.get_verification(10**17 + i))
+    bench("update_attempts", operations, lambda i: backend.update_attempts(10**17 + i, i % 100))
+    bench("add_verified_users (100)", max(1, operations // 100), lambda i: backend.add_verified_users([(10**17 + i * 100 + j, i % 100) for j in range(100)]))
+    bench("get_verified_user_ids", max(1, operations // 100), lambda i: backend.get_verified_user_ids(i % 100))
+    bench("is_domain_blocked", operations, lambda i: backend.is_domain_blocked(f"spam{i}.com"))
+    bench("get_blocked_domains_page", max(1, operations // 10), lambda i: backend.get_blocked_domains_page(after=f"spam{i}.com"))
+
+# --- BACKENDS ---
+class LocalServer:
+    # storage_server.py numa thread, numa porta livre
+    def __init__(self, backend):
+        self.server = uvicorn.Server(uvicorn.Config(create_app(backend), host="127.0.0.1", port=0, log_level="warning", access_log=False, lifespan="off"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        while not self.server.started: time.sleep(0.01)
+        port = self.server.servers[0].sockets[0].getsockname()[1]
+        return f"http://127.0.0.1:{port}"
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join()
+
+def fresh_sqlite(tmp, name):
+    db.close_connection()
+    os.environ["DB_PATH"] = os.path.join(tmp, f"{name}.db")
+    backend = storage.SQLiteBackend()
+    backend.init()
+    return backend
+
+def run_backend(name, tmp, operations):
+    failures = 0
+    for phase in ("conformidade", "desempenho"):
+        if name == "remote":
+            inner = storage.MemoryBackend()
+            server = LocalServer(inner)
+            url = server.__enter__()
+            backend = storage.create_backend("remote", url)
+        else:
+            server = None
+            backend = fresh_sqlite(tmp, f"{name}-{phase}") if name == "sqlite" else storage.create_backend(name)
+        backend.init()
+        try:
+            if phase == "conformidade":
+                for check in CHECKS:
+                    if name == "sqlite": backend = fresh_sqlite(tmp, f"{name}-{check.__name__}")
+                    elif name == "memory": backend = storage.MemoryBackend()
+                    else: inner.__init__() # Zera o backend por trás do servidor
+                    try:
+                        check(backend)
+                        print(f"  ok     {check.__name__}")
+                    except AssertionError:
+                        failures += 1
+                        print(f"  FALHOU {check.__name__}")
+                        traceback.print_exc()
+            else:
+                run_benchmarks(backend, operations)
+        finally:
+            backend.close()
+            if server: server.__exit__()
+    return failures
+
+def main():
+    operations = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    backends = sys.argv[2:] or ["sqlite", "memory", "remote"]
+    failures = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in backends:
+            print(f"{name}:")
+            failures += run_backend(name, tmp, operations)
+        db.close_connection()
+    print("todas as verificações passaram" if not failures else f"{failures} verificação(ões) falharam")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
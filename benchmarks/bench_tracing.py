@@ -0,0 +1,58 @@
+# Benchmark do custo do tracing: simula um comando com três chamadas reais ao banco (via async_database)
+# e mede o tempo por comando com o tracing desligado, com amostragem de 1% e com todos os comandos rastreados.
+# As configurações são alternadas em várias rodadas e vale o melhor tempo de cada uma, para reduzir o ruído.
+# Uso: python benchmarks/bench_tracing.py [comandos]
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import async_database as adb
+import database as db
+import tracing
+
+async def command(tracer):
+    trace = tracer.start_trace("/bench")
+    try:
+        await adb.get_verification(1, 1)
+        await adb.get_verified_user(1, 1)
+        await adb.create_verification(1, 1, "123456")
+        with tracer.span("log_action"):
+            pass
+    finally:
+        tracer.finish_trace(trace)
+
+CONFIGS = [("desligado", False, 1.0), ("amostragem 1%", True, 0.01), ("todos os comandos", True, 1.0)]
+
+async def measure(n, tracer):
+    start = time.perf_counter()
+    for _ in range(n):
+        await command(tracer)
+    return (time.perf_counter() - start) / n
+
+async def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    rounds = 5
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DB_PATH"] = os.path.join(tmp, "bench.db")
+        db.init_db()
+        adb.start()
+        # O async_database usa o tracer global do módulo tracing; cada rodada troca a configuração dele
+        tracer = tracing.tracer
+        best = {label: float("inf") for label, _, _ in CONFIGS}
+        await measure(500, tracer) # aquecimento
+        for _ in range(rounds):
+            for label, enabled, sample_rate in CONFIGS:
+                tracer.configure(enabled, sample_rate)
+                best[label] = min(best[label], await measure(n, tracer))
+        baseline = best["desligado"]
+        for label, per_command in best.items():
+            print(f"{label:<20} {per_command * 1e6:8.1f} us/comando {(per_command / baseline - 1) * 100:+6.2f}%")
+        print(f"{tracer.recorded} traces registrados, {len(tracer)} no buffer")
+        await adb.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,124 @@
+import asyncio
+import contextvars
+import logging
+import re
+import time
+
+import discord
+
+import async_database as adb
+from rate_limit import TokenBucket
+
+logger = logging.getLogger("astro.bulk")
+
+# --- VERIFICAÇÃO EM MASSA ---
+# Um job em segundo plano por servidor. Cada membro ganha o cargo de verificado e perde o de não verificado, no ritmo de
+# um token bucket (um token por membro). Só esses dois cargos são mexidos: o job pode levar horas, e substituir a lista
+# inteira (member.edit) desfaria cargos dados ou tirados depois que o comando rodou. Os membros verificados são
+# gravados no banco em lotes de chunk_size com executemany, e on_progress(job) é chamado a cada lote.
+# on_verified(member) é chamado (sem await) antes de cada troca de cargos, e on_done(job) quando o job termina.
+# O job roda fora do contexto do comando que o criou (num Context vazio), então os spans dele não caem no trace do comando.
+# Cancelar o job grava o lote em andamento antes de parar.
+MEMBER_ID = re.compile(r"\b\d{15,21}\b")
+
+def parse_member_ids(path, limit=100_000):
+    # Aceita qualquer formato de texto (um ID por linha, CSV, menções <@123>): pega tudo que parece um ID do Discord
+    ids = {}
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        for line in f:
+            for match in MEMBER_ID.findall(line):
+                ids[int(match)] = None
+                if len(ids) >= limit: return list(ids)
+    return list(ids)
+
+class BulkVerificationJob:
+    def __init__(self, guild, members, verified_role, unverified_role, moderator, rate=1.0, burst=5, chunk_size=100, on_progress=None, on_verified=None, on_done=None):
+        self.guild = guild
+        self.members = members
+        self.verified_role = verified_role
+        self.unverified_role = unverified_role
+        self.moderator = moderator
+        self.chunk_size = chunk_size
+        self.on_progress = on_progress
+        self.on_verified = on_verified
+        self.on_done = on_done
+        self.total = len(members)
+        self.processed = 0
+        self.verified = 0
+        self.skipped = 0
+        self.failed = 0
+        self.cancelled = False
+        self.error = None
+        self.started_at = None
+        self.finished_at = None
+        self.task = None
+        self._bucket = TokenBucket(rate, burst)
+
+    def stats(self):
+        return {"total": self.total, "processed": self.processed, "verified": self.verified, "skipped": self.skipped,
+                "failed": self.failed, "cancelled": self.cancelled, "error": self.error}
+
+    def elapsed(self):
+        if self.started_at is None: return 0.0
+        return (self.finished_at or time.monotonic()) - self.started_at
+
+    def start(self):
+        self.task = contextvars.Context().run(asyncio.create_task, self._run())
+        return self.task
+
+    def cancel(self):
+        if self.task and not self.task.done():
+            self.cancelled = True
+            self.task.cancel()
+
+    async def _run(self):
+        self.started_at = time.monotonic()
+        try:
+            for start in range(0, self.total, self.chunk_size):
+                await self._process_chunk(self.members[start:start + self.chunk_size])
+                if self.error: break
+                if self.on_progress: await self.on_progress(self)
+        except asyncio.CancelledError:
+            self.cancelled = True
+        except Exception as e:
+            self.error = str(e)
+            logger.exception("erro na verificação em massa guild_id=%s", self.guild.id)
+        finally:
+            self.finished_at = time.monotonic()
+            logger.info("verificação em massa finalizada guild_id=%s %s duration=%.1fs", self.guild.id, self.stats(), self.elapsed())
+        if self.on_done:
+            try:
+                await self.on_done(self)
+            except Exception:
+                logger.exception("erro ao reportar a verificação em massa guild_id=%s", self.guild.id)
+
+    async def _process_chunk(self, members):
+        verified = []
+        reason = f"Verificação em massa por {self.moderator}"
+        try:
+            for member in members:
+                self.processed += 1
+                if self.verified_role in member.roles:
+                    self.skipped += 1
+                    continue
+                await self._bucket.acquire()
+                if self.on_verified: self.on_verified(member)
+                try:
+                    await member.add_roles(self.verified_role, reason=reason)
+                    # Sem olhar member.roles: a cópia é de quando o comando rodou, e o cargo pode ter sido dado depois
+                    if self.unverified_role: await member.remove_roles(self.unverified_role, reason=reason)
+                    verified.append((member.id, self.guild.id))
+                except discord.NotFound:
+                    self.skipped += 1
+                except discord.Forbidden:
+                    # Sem permissão (ou cargo acima do bot): vale para todos os membros, então não adianta continuar
+                    self.failed += 1
+                    self.error = "sem permissão para gerenciar os cargos de verificação"
+                    return
+                except discord.HTTPException as e:
+                    self.failed += 1
+                    logger.warning("erro na verificação em massa guild_id=%s user_id=%s: %s", self.guild.id, member.id, e)
+        finally:
+            if verified:
+                await adb.add_verified_users(verified)
+                self.verified += len(verified)
@@ -0,0 +1,118 @@
+import asyncio
+import logging
+import os
+import signal
+import sys
+import time
+
+import aiohttp
+from dotenv import load_dotenv
+
+load_dotenv()
+
+import database as db
+
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper(), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+logger = logging.getLogger("astro.cluster")
+
+# --- LANÇADOR DO CLUSTER ---
+# Divide os shards em CLUSTER_COUNT faixas contíguas e roda cada faixa num processo (main.py com SHARD_IDS/SHARD_COUNT/CLUSTER_ID).
+# Os processos compartilham o mesmo SQLite (WAL; as migrações rodam aqui, uma vez, antes de subir os workers).
+# Cada worker expõe métricas em METRICS_PORT + CLUSTER_ID. Um worker que cair é reiniciado com backoff exponencial;
+# Ctrl+C/SIGTERM viram um SIGINT para cada worker (o bot.run do discord.py fecha normalmente com KeyboardInterrupt).
+# Uso: SHARD_COUNT=8 CLUSTER_COUNT=4 python cluster.py (sem SHARD_COUNT, usa o número recomendado pelo Discord)
+CLUSTER_COUNT = int(os.getenv("CLUSTER_COUNT", os.cpu_count() or 1))
+METRICS_PORT = int(os.getenv("METRICS_PORT", 9108))
+IDENTIFY_DELAY = float(os.getenv("CLUSTER_IDENTIFY_DELAY", 5)) # O Discord aceita um IDENTIFY a cada 5 segundos (sem max_concurrency)
+MAX_BACKOFF = 300
+MAIN = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+
+async def recommended_shard_count(token):
+    async with aiohttp.ClientSession() as session:
+        async with session.get("https://discord.com/api/v10/gateway/bot", headers={"Authorization": f"Bot {token}"}) as response:
+            response.raise_for_status()
+            data = await response.json()
+    return data["shards"], data["session_start_limit"].get("max_concurrency", 1)
+
+def shard_ranges(shard_count, cluster_count):
+    # Faixas contíguas e o mais parecidas possível: 10 shards em 4 processos -> 3, 3, 2, 2
+    cluster_count = max(1, min(cluster_count, shard_count))
+    size, extra = divmod(shard_count, cluster_count)
+    ranges, start = [], 0
+    for cluster_id in range(cluster_count):
+        end = start + size + (cluster_id < extra)
+        ranges.append(list(range(start, end)))
+        start = end
+    return ranges
+
+class Worker:
+    def __init__(self, cluster_id, shard_ids, shard_count):
+        self.cluster_id = cluster_id
+        self.shard_ids = shard_ids
+        self.shard_count = shard_count
+        self.process = None
+        self.restarts = 0
+
+    def env(self):
+        env = dict(os.environ, SHARD_IDS=",".join(map(str, self.shard_ids)), SHARD_COUNT=str(self.shard_count), CLUSTER_ID=str(self.cluster_id))
+        env["METRICS_PORT"] = str(METRICS_PORT + self.cluster_id) if METRICS_PORT else "0"
+        return env
+
+    async def start(self):
+        self.process = await asyncio.create_subprocess_exec(sys.executable, MAIN, env=self.env(), start_new_session=True)
+        logger.info("cluster %d iniciado pid=%d shards=%s", self.cluster_id, self.process.pid, self.shard_ids)
+
+    async def supervise(self, stopping):
+        while True:
+            started = time.monotonic()
+            code = await self.process.wait()
+            if stopping.is_set(): return
+            # Se o worker ficou de pé por um bom tempo, a queda não é um loop de crash: o backoff volta ao início
+            if time.monotonic() - started > MAX_BACKOFF: self.restarts = 0
+            delay = min(MAX_BACKOFF, 2 ** self.restarts)
+            self.restarts += 1
+            logger.warning("cluster %d saiu com código %s, reiniciando em %ds", self.cluster_id, code, delay)
+            await asyncio.sleep(delay)
+            if stopping.is_set(): return
+            await self.start()
+            if stopping.is_set(): self.stop() # O sinal chegou enquanto o processo subia
+
+    def stop(self):
+        # Sessão própria (start_new_session): o Ctrl+C do terminal não chega direto ao worker, só este SIGINT
+        if self.process and self.process.returncode is None: self.process.send_signal(signal.SIGINT)
+
+async def main():
+    shard_count = int(os.getenv("SHARD_COUNT", 0))
+    max_concurrency = 1
+    if not shard_count:
+        shard_count, max_concurrency = await recommended_shard_count(os.getenv("DISCORD_TOKEN"))
+    db.init_db()
+    db.close_connection()
+
+    workers = [Worker(cluster_id, shard_ids, shard_count) for cluster_id, shard_ids in enumerate(shard_ranges(shard_count, CLUSTER_COUNT))]
+    logger.info("%d shards em %d processos", shard_count, len(workers))
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, lambda: (stopping.set(), [worker.stop() for worker in workers]))
+        except NotImplementedError: # Windows
+            pass
+
+    supervisors = []
+    for worker in workers:
+        if stopping.is_set(): break
+        await worker.start()
+        if stopping.is_set(): worker.stop()
+        supervisors.append(asyncio.create_task(worker.supervise(stopping)))
+        # Escalona os logins: cada processo identifica seus shards em sequência, e o limite de IDENTIFY é global por bot
+        await asyncio.sleep(IDENTIFY_DELAY * len(worker.shard_ids) / max_concurrency)
+    await asyncio.gather(*supervisors)
+    for worker in workers:
+        if worker.process and worker.process.returncode is None: await worker.process.wait()
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
@@ -1,10 +1,53 @@
+import os
 import sqlite3
+from collections import Counter
+import threading
 import time
 
-def init_db():
-    con = sqlite3.connect('bot.db')
-    cur = con.cursor()
-    cur.execute('''
+VERIFICATION_TTL = int(os.getenv("VERIFICATION_TTL", 600)) # Tempo de vida de um código de verificação, em segundos
+DEFAULT_RAID_THRESHOLD_COUNT = 15
+DEFAULT_RAID_THRESHOLD_SECONDS = 60
+MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", 256 * 1024 * 1024))
+
+# --- CONEXÃO ---
+# Uma conexão persistente por thread (sqlite3 não permite compartilhar a mesma conexão entre threads).
+# O cache de statements do sqlite3 reaproveita os prepared statements, já que o SQL de cada função é constante.
+_local = threading.local()
+
+def get_db_path():
+    return os.getenv("DB_PATH", "bot.db")
+
+def get_connection():
+    con = getattr(_local, "con", None)
+    if con is None:
+        con = sqlite3.connect(get_db_path(), timeout=30, cached_statements=256)
+        con.execute('PRAGMA journal_mode = WAL')
+        con.execute('PRAGMA synchronous = NORMAL') # Seguro com WAL, evita um fsync por commit
+        con.execute('PRAGMA cache_size = -8000') # ~8 MB de cache de páginas
+        con.execute('PRAGMA temp_store = MEMORY')
+        con.execute('PRAGMA busy_timeout = 5000')
+        con.execute(f'PRAGMA mmap_size = {MMAP_SIZE}') # Leituras direto do mapeamento em memória, sem uma cópia por página
+        _local.con = con
+    return con
+
+def close_connection():
+    con = getattr(_local, "con", None)
+    if con is not None:
+        # Atualiza as estatísticas do planejador só das tabelas que mudaram bastante desde a abertura (barato)
+        try:
+            con.execute('PRAGMA optimize')
+        except sqlite3.Error:
+            pass
+        con.close()
+        _local.con = None
+
+# --- MIGRAÇÕES ---
+# A versão do schema fica em PRAGMA user_version. Cada migração roda uma única vez, em ordem, numa transação
+# própria junto com a atualização da versão: se falhar no meio, o banco continua na versão anterior.
+# Para mudar o schema, adicione uma função nova ao fim de MIGRATIONS; nunca altere uma migração já publicada.
+def _migration_1(con):
+    # Schema original (bancos criados antes das migrações já têm essas tabelas e ficam como estão)
+    con.execute('''
         CREATE TABLE IF NOT EXISTS guild_settings (
             guild_id INTEGER PRIMARY KEY,
             verified_role_id INTEGER,
@@ -13,7 +56,7 @@ def init_db():
             lockdown_enabled BOOLEAN DEFAULT FALSE
         )
     ''')
-    cur.execute('''
+    con.execute('''
         CREATE TABLE IF NOT EXISTS verifications (
             user_id INTEGER PRIMARY KEY,
             guild_id INTEGER NOT NULL,
@@ -23,8 +66,9 @@ def init_db():
             current_input TEXT DEFAULT ''
         )
     ''')
-    cur.execute('CREATE TABLE IF NOT EXISTS blocked_domains (domain TEXT PRIMARY KEY)')
-    cur.execute('''
+    con.execute('CREATE INDEX IF NOT EXISTS idx_verifications_created_at ON verifications (created_at)')
+    con.execute('CREATE TABLE IF NOT EXISTS blocked_domains (domain TEXT PRIMARY KEY)')
+    con.execute('''
         CREATE TABLE IF NOT EXISTS verified_users (
             user_id INTEGER,
             guild_id INTEGER,
@@ -32,150 +76,395 @@ def init_db():
             PRIMARY KEY (user_id, guild_id)
         )
     ''')
-    con.commit()
-    con.close()
+    con.execute('''
+        CREATE TABLE IF NOT EXISTS email_outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            guild_id INTEGER NOT NULL,
+            recipient TEXT NOT NULL,
+            code TEXT NOT NULL,
+            user_name TEXT NOT NULL,
+            guild_name TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER DEFAULT 0,
+            next_attempt_at REAL NOT NULL,
+            created_at INTEGER NOT NULL,
+            last_error TEXT
+        )
+    ''')
+    con.execute('CREATE INDEX IF NOT EXISTS idx_email_outbox_due ON email_outbox (status, next_attempt_at)')
+    # Colunas adicionadas depois da criação da tabela
+    columns = {row[1] for row in con.execute('PRAGMA table_info(guild_settings)')}
+    if 'raid_threshold_count' not in columns:
+        con.execute(f'ALTER TABLE guild_settings ADD COLUMN raid_threshold_count INTEGER DEFAULT {DEFAULT_RAID_THRESHOLD_COUNT}')
+    if 'raid_threshold_seconds' not in columns:
+        con.execute(f'ALTER TABLE guild_settings ADD COLUMN raid_threshold_seconds INTEGER DEFAULT {DEFAULT_RAID_THRESHOLD_SECONDS}')
+    if 'raid_auto_lockdown' not in columns:
+        con.execute('ALTER TABLE guild_settings ADD COLUMN raid_auto_lockdown BOOLEAN DEFAULT FALSE')
+
+def _migration_2(con):
+    # verifications passa a ter chave (user_id, guild_id): verificar em dois servidores ao mesmo tempo não sobrescreve mais.
+    # O SQLite não altera chave primária, então a tabela é recriada e os dados copiados.
+    con.execute('''
+        CREATE TABLE verifications_new (
+            user_id INTEGER NOT NULL,
+            guild_id INTEGER NOT NULL,
+            verification_code TEXT NOT NULL,
+            attempts INTEGER DEFAULT 0,
+            created_at INTEGER NOT NULL,
+            current_input TEXT DEFAULT '',
+            PRIMARY KEY (user_id, guild_id)
+        )
+    ''')
+    con.execute('''
+        INSERT INTO verifications_new (user_id, guild_id, verification_code, attempts, created_at, current_input)
+        SELECT user_id, guild_id, verification_code, attempts, created_at, current_input FROM verifications
+    ''')
+    con.execute('DROP TABLE verifications')
+    con.execute('ALTER TABLE verifications_new RENAME TO verifications')
+    con.execute('CREATE INDEX idx_verifications_created_at ON verifications (created_at)')
+
+def _migration_3(con):
+    # Consultas por servidor (contagens, listagens por data de verificação) sem varrer a tabela inteira;
+    # a chave primária (user_id, guild_id) só serve para buscas por usuário.
+    con.execute('CREATE INDEX IF NOT EXISTS idx_verified_users_guild ON verified_users (guild_id, verified_at)')
+    con.execute('CREATE INDEX IF NOT EXISTS idx_verifications_guild ON verifications (guild_id)')
+
+def _migration_4(con):
+    # Eventos do funil de verificação (só inserção) e agregados por hora para o /estatisticas
+    con.execute('''
+        CREATE TABLE verification_events (
+            id INTEGER PRIMARY KEY,
+            guild_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            event TEXT NOT NULL,
+            created_at INTEGER NOT NULL,
+            duration REAL
+        )
+    ''')
+    con.execute('''
+        CREATE TABLE verification_stats_hourly (
+            guild_id INTEGER NOT NULL,
+            hour INTEGER NOT NULL,
+            event TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (guild_id, hour, event)
+        ) WITHOUT ROWID
+    ''')
+    con.execute('''
+        CREATE TABLE verification_durations_hourly (
+            guild_id INTEGER NOT NULL,
+            hour INTEGER NOT NULL,
+            bucket INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (guild_id, hour, bucket)
+        ) WITHOUT ROWID
+    ''')
+
+def _migration_5(con):
+    # Pequenos valores internos do bot (ex.: hash da árvore de comandos sincronizada)
+    con.execute('CREATE TABLE bot_state (key TEXT PRIMARY KEY, value TEXT NOT NULL)')
+
+MIGRATIONS = [_migration_1, _migration_2, _migration_3, _migration_4, _migration_5]
+
+def get_schema_version():
+    return get_connection().execute('PRAGMA user_version').fetchone()[0]
+
+def init_db():
+    # Aplica as migrações pendentes; retorna [(versão, segundos)] das que rodaram
+    con = get_connection()
+    applied = []
+    for version in range(get_schema_version() + 1, len(MIGRATIONS) + 1):
+        started = time.perf_counter()
+        # BEGIN IMMEDIATE pega o lock de escrita antes de ler a versão de novo, então dois processos
+        # iniciando juntos não aplicam a mesma migração duas vezes
+        con.execute('BEGIN IMMEDIATE')
+        try:
+            if con.execute('PRAGMA user_version').fetchone()[0] >= version:
+                con.rollback()
+                continue
+            MIGRATIONS[version - 1](con)
+            con.execute(f'PRAGMA user_version = {version}')
+            con.commit()
+        except BaseException:
+            con.rollback()
+            raise
+        applied.append((version, time.perf_counter() - started))
+    return applied
 
 def add_verified_user(user_id, guild_id):
-    con = sqlite3.connect('bot.db')
-    cur = con.cursor()
-    cur.execute('INSERT OR REPLACE INTO verified_users (user_id, guild_id, verified_at) VALUES (?, ?, ?)', (user_id, guild_id, int(time.time())))
-    con.commit()
-    con.close()
+    with get_connection() as con:
+        con.execute('INSERT OR REPLACE INTO verified_users (user_id, guild_id, verified_at) VALUES (?, ?, ?)', (user_id, guild_id, int(time.time())))
+
+def add_verified_users(pairs, verified_at=None, keep_existing=False):
+    # pairs: [(user_id, guild_id), ...], gravados num único executemany; keep_existing não sobrescreve o verified_at de quem já está
+    verified_at = int(time.time()) if verified_at is None else verified_at
+    conflict = 'IGNORE' if keep_existing else 'REPLACE'
+    with get_connection() as con:
+        con.executemany(f'INSERT OR {conflict} INTO verified_users (user_id, guild_id, verified_at) VALUES (?, ?, ?)', [(user_id, guild_id, verified_at) for user_id, guild_id in pairs])
 
 def remove_verified_user(user_id, guild_id):
-    con = sqlite3.connect('bot.db')
-    cur = con.cursor()
-    cur.execute('DELETE FROM verified_users WHERE user_id = ? AND guild_id = ?', (user_id, guild_id))
-    con.commit()
-    con.close()
+    with get_connection() as con:
+        con.execute('DELETE FROM verified_users WHERE user_id = ? AND guild_id = ?', (user_id, guild_id))
+
+def remove_verified_users(pairs):
+    with get_connection() as con:
+        con.executemany('DELETE FROM verified_users WHERE user_id = ? AND guild_id = ?', pairs)
+
+def get_verified_user_ids(guild_id):
+    # Usa o índice idx_verified_users_guild
+    return [row[0] for row in get_connection().execute('SELECT user_id FROM verified_users WHERE guild_id = ?', (guild_id,))]
 
 def get_verified_user(user_id, guild_id):
-    con = sqlite3.connect('bot.db')
-    cur = con.cursor()
-    cur.execute('SELECT verified_at FROM verified_users WHERE user_id = ? AND guild_id = ?', (user_id, guild_id))
-    result = cur.fetchone()
-    con.close()
+    result = get_connection().execute('SELECT verified_at FROM verified_users WHERE user_id = ? AND guild_id = ?', (user_id, guild_id)).fetchone()
     return result[0] if result else None
 
-def delete_expired_verifications():
-    timeout = int(time.time()) - 3600
-    con = sqlite3.connect('bot.db')
-    cur = con.cursor()
-    cur.execute('DELETE FROM verifications WHERE created_at < ?', (timeout,))
-    rows_deleted = cur.rowcount
-    con.commit()
-    con.close()
+def delete_expired_verifications(max_age=None, batch_size=500):
+    # Apaga no máximo batch_size linhas por chamada, para não segurar o lock de escrita por muito tempo
+    timeout = int(time.time()) - (VERIFICATION_TTL if max_age is None else max_age)
+    with get_connection() as con:
+        rows_deleted = con.execute('DELETE FROM verifications WHERE rowid IN (SELECT rowid FROM verifications WHERE created_at < ? LIMIT ?)', (timeout, batch_size)).rowcount
     return rows_deleted
 
-# Renomeei para set_settings para consistência e adicionei allowed_domains (mesmo que não esteja na tabela ainda)
-# Sua função set_settings no database.py
-# database.py
-# ... (código anterior) ...
+# Toda escrita em guild_settings incrementa settings_version (em bot_state) na mesma transação; com vários
+# processos (cluster.py), cada um compara essa versão periodicamente para saber quando limpar o cache de configurações.
+def _bump_settings_version(con):
+    con.execute("INSERT INTO bot_state (key, value) VALUES ('settings_version', '1') ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1")
 
+def get_settings_version():
+    result = get_connection().execute("SELECT value FROM bot_state WHERE key = 'settings_version'").fetchone()
+    return int(result[0]) if result else 0
+
+# Renomeei para set_settings para consistência e adicionei allowed_domains (mesmo que não esteja na tabela ainda)
 def set_settings(guild_id, verified_role_id, unverified_role_id, log_channel_id, allowed_domains=None):
-    con = sqlite3.connect('bot.db')
-    cur = con.cursor()
-    cur.execute('''
-        INSERT INTO guild_settings (guild_id, verified_role_id, unverified_role_id, log_channel_id, lockdown_enabled) 
-        VALUES (?, ?, ?, ?, ?)
-        ON CONFLICT(guild_id) DO UPDATE SET
-        verified_role_id = excluded.verified_role_id,
-        unverified_role_id = excluded.unverified_role_id,
-        log_channel_id = excluded.log_channel_id,
-        lockdown_enabled = excluded.lockdown_enabled
-    ''', (guild_id, verified_role_id, unverified_role_id, log_channel_id, False))
-    con.commit()
-    con.close()
+    with get_connection() as con:
+        con.execute('''
+            INSERT INTO guild_settings (guild_id, verified_role_id, unverified_role_id, log_channel_id, lockdown_enabled)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(guild_id) DO UPDATE SET
+            verified_role_id = excluded.verified_role_id,
+            unverified_role_id = excluded.unverified_role_id,
+            log_channel_id = excluded.log_channel_id,
+            lockdown_enabled = excluded.lockdown_enabled
+        ''', (guild_id, verified_role_id, unverified_role_id, log_channel_id, False))
+        _bump_settings_version(con)
 
 def get_settings(guild_id):
-    con = sqlite3.connect('bot.db')
-    cur = con.cursor()
-    cur.execute('SELECT verified_role_id, unverified_role_id, log_channel_id, lockdown_enabled FROM guild_settings WHERE guild_id = ?', (guild_id,))
-    settings = cur.fetchone()
-    con.close()
+    settings = get_connection().execute('SELECT verified_role_id, unverified_role_id, log_channel_id, lockdown_enabled FROM guild_settings WHERE guild_id = ?', (guild_id,)).fetchone()
     return settings if settings else (None, None, None, False) # Retorna 4 elementos
 
-# ... (restante do código) ...
-
 def set_lockdown(guild_id, status: bool):
-    con = sqlite3.connect('bot.db')
-    cur = con.cursor()
-    cur.execute('UPDATE guild_settings SET lockdown_enabled = ? WHERE guild_id = ?', (status, guild_id))
-    con.commit()
-    con.close()
+    with get_connection() as con:
+        con.execute('UPDATE guild_settings SET lockdown_enabled = ? WHERE guild_id = ?', (status, guild_id))
+        _bump_settings_version(con)
+
+def get_raid_settings(guild_id):
+    settings = get_connection().execute('SELECT raid_threshold_count, raid_threshold_seconds, raid_auto_lockdown FROM guild_settings WHERE guild_id = ?', (guild_id,)).fetchone()
+    return settings if settings else (DEFAULT_RAID_THRESHOLD_COUNT, DEFAULT_RAID_THRESHOLD_SECONDS, False)
+
+def set_raid_settings(guild_id, threshold_count, threshold_seconds, auto_lockdown: bool):
+    with get_connection() as con:
+        con.execute('''
+            INSERT INTO guild_settings (guild_id, raid_threshold_count, raid_threshold_seconds, raid_auto_lockdown) VALUES (?, ?, ?, ?)
+            ON CONFLICT(guild_id) DO UPDATE SET
+            raid_threshold_count = excluded.raid_threshold_count,
+            raid_threshold_seconds = excluded.raid_threshold_seconds,
+            raid_auto_lockdown = excluded.raid_auto_lockdown
+        ''', (guild_id, threshold_count, threshold_seconds, auto_lockdown))
+        _bump_settings_version(con)
 
 def create_verification(user_id, guild_id, code):
-    con = sqlite3.connect('bot.db')
-    cur = con.cursor()
-    cur.execute('''
-        INSERT INTO verifications (user_id, guild_id, verification_code, created_at, current_input) VALUES (?, ?, ?, ?, '')
-        ON CONFLICT(user_id) DO UPDATE SET
-        guild_id = excluded.guild_id,
-        verification_code = excluded.verification_code,
-        attempts = 0,
-        created_at = excluded.created_at,
-        current_input = ''
-    ''', (user_id, guild_id, code, int(time.time())))
-    con.commit()
-    con.close()
-
-def get_verification(user_id):
-    con = sqlite3.connect('bot.db')
-    cur = con.cursor()
-    cur.execute('SELECT guild_id, verification_code, attempts, created_at, current_input FROM verifications WHERE user_id = ?', (user_id,))
-    verification = cur.fetchone()
-    con.close()
-    return verification
-
-def update_attempts(user_id):
-    con = sqlite3.connect('bot.db')
-    cur = con.cursor()
-    cur.execute('UPDATE verifications SET attempts = attempts + 1 WHERE user_id = ?', (user_id,))
-    con.commit()
-    con.close()
-
-def update_input_code(user_id, new_input):
-    con = sqlite3.connect('bot.db')
-    cur = con.cursor()
-    cur.execute('UPDATE verifications SET current_input = ? WHERE user_id = ?', (new_input, user_id))
-    con.commit()
-    con.close()
-
-def delete_verification(user_id):
-    con = sqlite3.connect('bot.db')
-    cur = con.cursor()
-    cur.execute('DELETE FROM verifications WHERE user_id = ?', (user_id,))
-    con.commit()
-    con.close()
+    with get_connection() as con:
+        con.execute('''
+            INSERT INTO verifications (user_id, guild_id, verification_code, created_at, current_input) VALUES (?, ?, ?, ?, '')
+            ON CONFLICT(user_id, guild_id) DO UPDATE SET
+            verification_code = excluded.verification_code,
+            attempts = 0,
+            created_at = excluded.created_at,
+            current_input = ''
+        ''', (user_id, guild_id, code, int(time.time())))
+
+def get_verification(user_id, guild_id=None):
+    # Sem guild_id, retorna a verificação mais recente do usuário (em qualquer servidor)
+    con = get_connection()
+    if guild_id is not None:
+        return con.execute('SELECT guild_id, verification_code, attempts, created_at, current_input FROM verifications WHERE user_id = ? AND guild_id = ?', (user_id, guild_id)).fetchone()
+    return con.execute('SELECT guild_id, verification_code, attempts, created_at, current_input FROM verifications WHERE user_id = ? ORDER BY created_at DESC, rowid DESC LIMIT 1', (user_id,)).fetchone()
+
+def update_attempts(user_id, guild_id):
+    with get_connection() as con:
+        con.execute('UPDATE verifications SET attempts = attempts + 1 WHERE user_id = ? AND guild_id = ?', (user_id, guild_id))
+
+def update_input_code(user_id, guild_id, new_input):
+    with get_connection() as con:
+        con.execute('UPDATE verifications SET current_input = ? WHERE user_id = ? AND guild_id = ?', (new_input, user_id, guild_id))
+
+def delete_verification(user_id, guild_id):
+    with get_connection() as con:
+        con.execute('DELETE FROM verifications WHERE user_id = ? AND guild_id = ?', (user_id, guild_id))
+
+# Como nas configurações: toda mudança em blocked_domains incrementa blocklist_version, e em modo cluster cada
+# processo recarrega a lista em memória quando a versão muda
+def _bump_blocklist_version(con):
+    con.execute("INSERT INTO bot_state (key, value) VALUES ('blocklist_version', '1') ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1")
+
+def get_blocklist_version():
+    result = get_connection().execute("SELECT value FROM bot_state WHERE key = 'blocklist_version'").fetchone()
+    return int(result[0]) if result else 0
 
 def add_blocked_domain(domain):
-    con = sqlite3.connect('bot.db')
-    cur = con.cursor()
-    cur.execute('INSERT OR IGNORE INTO blocked_domains (domain) VALUES (?)', (domain,))
-    con.commit()
-    con.close()
+    with get_connection() as con:
+        if con.execute('INSERT OR IGNORE INTO blocked_domains (domain) VALUES (?)', (domain,)).rowcount:
+            _bump_blocklist_version(con)
 
 def remove_blocked_domain(domain):
-    con = sqlite3.connect('bot.db')
-    cur = con.cursor()
-    cur.execute('DELETE FROM blocked_domains WHERE domain = ?', (domain,))
-    rows_affected = cur.rowcount
-    con.commit()
-    con.close()
+    with get_connection() as con:
+        rows_affected = con.execute('DELETE FROM blocked_domains WHERE domain = ?', (domain,)).rowcount
+        if rows_affected: _bump_blocklist_version(con)
     return rows_affected
 
 def is_domain_blocked(domain):
-    con = sqlite3.connect('bot.db')
-    cur = con.cursor()
-    cur.execute('SELECT 1 FROM blocked_domains WHERE domain = ?', (domain,))
-    result = cur.fetchone()
-    con.close()
+    result = get_connection().execute('SELECT 1 FROM blocked_domains WHERE domain = ?', (domain,)).fetchone()
     return result is not None
 
 def get_all_blocked_domains():
-    con = sqlite3.connect('bot.db')
-    cur = con.cursor()
-    cur.execute('SELECT domain FROM blocked_domains ORDER BY domain ASC')
-    domains = [row[0] for row in cur.fetchall()]
-    con.close()
-    return domains
\ No newline at end of file
+    return [row[0] for row in get_connection().execute('SELECT domain FROM blocked_domains ORDER BY domain ASC')]
+
+def _prefix_range(prefix):
+    # Intervalo [prefix, fim) que cobre todos os domínios com o prefixo, usando o índice da chave primária
+    if not prefix: return "", "\U0010ffff"
+    return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+def get_blocked_domains_page(after=None, before=None, prefix="", limit=25):
+    # Paginação por chave (keyset): busca só as linhas da página, depois de `after` ou antes de `before`
+    lower, upper = _prefix_range(prefix)
+    con = get_connection()
+    if before is not None:
+        rows = con.execute('SELECT domain FROM blocked_domains WHERE domain < ? AND domain >= ? AND domain < ? ORDER BY domain DESC LIMIT ?', (before, lower, upper, limit)).fetchall()
+        rows.reverse()
+    else:
+        rows = con.execute('SELECT domain FROM blocked_domains WHERE domain > ? AND domain >= ? AND domain < ? ORDER BY domain ASC LIMIT ?', (after or "", lower, upper, limit)).fetchall()
+    return [row[0] for row in rows]
+
+def add_blocked_domains(domains, batch_size=1000, progress=None):
+    # Insere um iterável de domínios (pode ser um gerador) em lotes, numa única transação
+    con = get_connection()
+    processed = 0
+    changes_before = con.total_changes
+    batch = []
+    with con:
+        for domain in domains:
+            batch.append((domain,))
+            if len(batch) >= batch_size:
+                con.executemany('INSERT OR IGNORE INTO blocked_domains (domain) VALUES (?)', batch)
+                processed += len(batch)
+                batch.clear()
+                if progress: progress(processed)
+        if batch:
+            con.executemany('INSERT OR IGNORE INTO blocked_domains (domain) VALUES (?)', batch)
+            processed += len(batch)
+            if progress: progress(processed)
+        added = con.total_changes - changes_before
+        if added: _bump_blocklist_version(con)
+    return processed, added
+
+def iter_blocked_domains(batch_size=1000):
+    cur = get_connection().execute('SELECT domain FROM blocked_domains ORDER BY domain ASC')
+    while rows := cur.fetchmany(batch_size):
+        for (domain,) in rows:
+            yield domain
+
+def export_blocked_domains(path):
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for domain in iter_blocked_domains():
+            f.write(domain + "\n")
+            count += 1
+    return count
+
+def get_state(key):
+    result = get_connection().execute('SELECT value FROM bot_state WHERE key = ?', (key,)).fetchone()
+    return result[0] if result else None
+
+def set_state(key, value):
+    with get_connection() as con:
+        con.execute('INSERT INTO bot_state (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value', (key, value))
+
+# --- EVENTOS E ESTATÍSTICAS ---
+# hour = created_at // 3600 (hora UTC). Os agregados são atualizados na mesma transação que insere os eventos,
+# então as consultas de estatísticas leem no máximo (horas do período x tipos de evento) linhas, seja qual for o histórico.
+def record_events(rows):
+    # rows: [(guild_id, user_id, event, created_at, duration, bucket), ...]
+    counts = Counter((guild_id, created_at // 3600, event) for guild_id, _, event, created_at, _, _ in rows)
+    durations = Counter((guild_id, created_at // 3600, bucket) for guild_id, _, _, created_at, _, bucket in rows if bucket is not None)
+    with get_connection() as con:
+        con.executemany('INSERT INTO verification_events (guild_id, user_id, event, created_at, duration) VALUES (?, ?, ?, ?, ?)', [row[:5] for row in rows])
+        con.executemany('''
+            INSERT INTO verification_stats_hourly (guild_id, hour, event, count) VALUES (?, ?, ?, ?)
+            ON CONFLICT(guild_id, hour, event) DO UPDATE SET count = count + excluded.count
+        ''', [(*key, count) for key, count in counts.items()])
+        con.executemany('''
+            INSERT INTO verification_durations_hourly (guild_id, hour, bucket, count) VALUES (?, ?, ?, ?)
+            ON CONFLICT(guild_id, hour, bucket) DO UPDATE SET count = count + excluded.count
+        ''', [(*key, count) for key, count in durations.items()])
+
+def get_verification_stats(guild_id, since):
+    # Retorna ({evento: total}, {balde: total}) desde o timestamp `since`
+    con = get_connection()
+    hour = int(since) // 3600
+    counts = dict(con.execute('SELECT event, SUM(count) FROM verification_stats_hourly WHERE guild_id = ? AND hour >= ? GROUP BY event', (guild_id, hour)))
+    histogram = dict(con.execute('SELECT bucket, SUM(count) FROM verification_durations_hourly WHERE guild_id = ? AND hour >= ? GROUP BY bucket', (guild_id, hour)))
+    return counts, histogram
+
+# --- FILA DE E-MAILS (OUTBOX) ---
+# status: 'pending' (aguardando envio ou nova tentativa) ou 'sending' (entregue a um worker).
+# Linhas enviadas ou que falharam de vez são apagadas.
+def enqueue_email(user_id, guild_id, recipient, code, user_name, guild_name):
+    now = time.time()
+    with get_connection() as con:
+        return con.execute('''
+            INSERT INTO email_outbox (user_id, guild_id, recipient, code, user_name, guild_name, next_attempt_at, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (user_id, guild_id, recipient, code, user_name, guild_name, now, int(now))).lastrowid
+
+def _shard_clause(shards):
+    # shards = (shard_count, shard_ids): restringe aos servidores desses shards (shard = (guild_id >> 22) % shard_count)
+    if not shards: return "", ()
+    shard_count, shard_ids = shards
+    return f" AND ((guild_id >> 22) % ?) IN ({', '.join('?' * len(shard_ids))})", (shard_count, *shard_ids)
+
+def claim_due_emails(limit, shards=None):
+    shard_sql, shard_args = _shard_clause(shards)
+    con = get_connection()
+    # BEGIN IMMEDIATE pega o lock de escrita antes do SELECT: com vários processos, dois workers nunca pegam o mesmo e-mail
+    con.execute('BEGIN IMMEDIATE')
+    try:
+        rows = con.execute(f'''
+            SELECT id, user_id, guild_id, recipient, code, user_name, guild_name, attempts, created_at FROM email_outbox
+            WHERE status = 'pending' AND next_attempt_at <= ?{shard_sql} ORDER BY next_attempt_at ASC LIMIT ?
+        ''', (time.time(), *shard_args, limit)).fetchall()
+        con.executemany("UPDATE email_outbox SET status = 'sending' WHERE id = ?", [(row[0],) for row in rows])
+        con.commit()
+    except BaseException:
+        con.rollback()
+        raise
+    return rows
+
+def reschedule_email(email_id, next_attempt_at, error):
+    with get_connection() as con:
+        con.execute("UPDATE email_outbox SET status = 'pending', attempts = attempts + 1, next_attempt_at = ?, last_error = ? WHERE id = ?", (next_attempt_at, error, email_id))
+
+def delete_email(email_id):
+    with get_connection() as con:
+        con.execute('DELETE FROM email_outbox WHERE id = ?', (email_id,))
+
+def reset_sending_emails(shards=None):
+    # Após um reinício, e-mails que estavam com um worker voltam para a fila (só os dos shards deste processo)
+    shard_sql, shard_args = _shard_clause(shards)
+    with get_connection() as con:
+        return con.execute(f"UPDATE email_outbox SET status = 'pending' WHERE status = 'sending'{shard_sql}", shard_args).rowcount
+
+def next_email_due_at(shards=None):
+    shard_sql, shard_args = _shard_clause(shards)
+    result = get_connection().execute(f"SELECT MIN(next_attempt_at) FROM email_outbox WHERE status = 'pending'{shard_sql}", shard_args).fetchone()
+    return result[0] if result else None
@@ -0,0 +1,46 @@
+# --- LISTA DE DOMÍNIOS BLOQUEADOS EM MEMÓRIA ---
+# A tabela blocked_domains é carregada uma vez na inicialização num conjunto de sufixos.
+# Uma consulta testa cada sufixo do domínio (mail.temp-mail.org -> temp-mail.org -> org),
+# então subdomínios de um domínio bloqueado também são bloqueados, sem nenhum acesso ao banco.
+def normalize_domain(domain):
+    return domain.lower().strip().replace('@', '')
+
+def iter_domains_from_file(path):
+    # Lê um .txt (um domínio por linha) ou .csv (domínio na primeira coluna) linha a linha, sem carregar o arquivo todo.
+    # Comentários (#), linhas vazias, cabeçalhos e entradas sem ponto ou com espaços são ignorados.
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        for line in f:
+            line = line.split("#", 1)[0]
+            field = line.replace(";", ",").split(",", 1)[0].strip().strip('"\'')
+            domain = normalize_domain(field)
+            if "." in domain and not any(c.isspace() for c in domain):
+                yield domain
+
+class DomainBlocklist:
+    def __init__(self, domains=()):
+        self._domains = set()
+        self.load(domains)
+
+    def __len__(self):
+        return len(self._domains)
+
+    def load(self, domains):
+        self._domains = {d for d in map(normalize_domain, domains) if d}
+
+    def add(self, domain):
+        if domain := normalize_domain(domain): self._domains.add(domain)
+
+    def discard(self, domain):
+        self._domains.discard(normalize_domain(domain))
+
+    def match(self, domain):
+        # Retorna a entrada da lista que bloqueia o domínio (ele mesmo ou um domínio pai), ou None
+        domain = normalize_domain(domain).rstrip('.')
+        start = 0
+        while True:
+            if domain[start:] in self._domains: return domain[start:]
+            start = domain.find('.', start) + 1
+            if start == 0: return None
+
+    def is_blocked(self, domain):
+        return self.match(domain) is not None
@@ -0,0 +1,119 @@
+import asyncio
+import logging
+import random
+import time
+from collections import namedtuple
+
+import async_database as adb
+from rate_limit import TokenBucket
+
+logger = logging.getLogger("astro.outbox")
+
+# --- FILA PERSISTENTE DE E-MAILS ---
+# /verificar só grava o e-mail na tabela email_outbox e responde na hora; um pool de workers esvazia a fila.
+# Falhas temporárias voltam para a fila com backoff exponencial; cada provedor (domínio do destinatário)
+# tem seu próprio limite de envios. Como a fila fica no banco, e-mails pendentes sobrevivem a um reinício.
+OutboxEmail = namedtuple("OutboxEmail", "id user_id guild_id recipient code user_name guild_name attempts created_at")
+
+class EmailOutbox:
+    def __init__(self, send, on_delivered, on_failed, workers=4, max_attempts=5, base_delay=5, max_delay=120,
+                 expire_after=600, provider_rate=1.0, provider_burst=10, poll_interval=5, shards=None):
+        # send(email) -> True | "recipient_refused" | False; on_delivered(email) e on_failed(email, motivo) são coroutines
+        self.send = send
+        self.on_delivered = on_delivered
+        self.on_failed = on_failed
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.expire_after = expire_after
+        self.provider_rate = provider_rate
+        self.provider_burst = provider_burst
+        self.poll_interval = poll_interval
+        # (shard_count, shard_ids): em modo cluster, cada processo só processa os e-mails dos seus servidores
+        self.shards = shards
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self._buckets = {}
+        self._queue = None
+        self._wakeup = None
+        self._tasks = []
+
+    def stats(self):
+        return {"in_flight": self._queue.qsize() if self._queue else 0, "sent": self.sent, "failed": self.failed, "retried": self.retried}
+
+    def start(self):
+        self._queue = asyncio.Queue(maxsize=self.workers * 2)
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._dispatcher())]
+        self._tasks += [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def close(self):
+        for task in self._tasks: task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def enqueue(self, user_id, guild_id, recipient, code, user_name, guild_name):
+        email_id = await adb.enqueue_email(user_id, guild_id, recipient, code, user_name, guild_name)
+        if self._wakeup: self._wakeup.set()
+        return email_id
+
+    def _bucket(self, recipient):
+        provider = recipient.rsplit("@", 1)[-1].lower()
+        if provider not in self._buckets:
+            self._buckets[provider] = TokenBucket(self.provider_rate, self.provider_burst)
+        return self._buckets[provider]
+
+    async def _dispatcher(self):
+        await adb.reset_sending_emails(self.shards)
+        while True:
+            self._wakeup.clear()
+            timeout = self.poll_interval
+            free = self._queue.maxsize - self._queue.qsize()
+            if free:
+                rows = await adb.claim_due_emails(free, self.shards)
+                for row in rows: self._queue.put_nowait(OutboxEmail(*row))
+                if rows: continue
+                if (due := await adb.next_email_due_at(self.shards)) is not None:
+                    timeout = max(0, min(self.poll_interval, due - time.time()))
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _worker(self):
+        while True:
+            email = await self._queue.get()
+            try:
+                await self._process(email)
+            except Exception:
+                logger.exception("erro ao processar e-mail email_id=%s", email.id)
+            finally:
+                self._queue.task_done()
+                self._wakeup.set()
+
+    async def _finish(self, email, reason=None):
+        await adb.delete_email(email.id)
+        if reason is None:
+            self.sent += 1
+            await self.on_delivered(email)
+        else:
+            self.failed += 1
+            await self.on_failed(email, reason)
+
+    async def _process(self, email):
+        if time.time() - email.created_at > self.expire_after:
+            return await self._finish(email, "expired")
+        await self._bucket(email.recipient).acquire()
+        result = await self.send(email)
+        if result is True:
+            await self._finish(email)
+        elif result == "recipient_refused":
+            await self._finish(email, "recipient_refused")
+        elif email.attempts + 1 >= self.max_attempts:
+            await self._finish(email, "send_failed")
+        else:
+            delay = min(self.max_delay, self.base_delay * 2 ** email.attempts) * random.uniform(0.8, 1.2)
+            await adb.reschedule_email(email.id, time.time() + delay, "send_failed")
+            self.retried += 1
@@ -0,0 +1,64 @@
+import html
+import os
+import re
+import time
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+from cache import LRUCache
+
+# --- TEMPLATE DE E-MAIL ---
+# O HTML é lido uma vez e dividido nos marcadores {{NOME}}: segmentos pares são texto fixo, ímpares são nomes de marcadores.
+# Renderizar é só um "".join dos segmentos. O nome do servidor é pré-aplicado e guardado em cache por servidor,
+# e o arquivo é recarregado automaticamente quando seu mtime muda (checado no máximo a cada check_interval segundos).
+PLACEHOLDER = re.compile(r"\{\{(\w+)\}\}")
+
+class EmailTemplate:
+    def __init__(self, path, check_interval=5.0, cache_size=256):
+        self.path = path
+        self.check_interval = check_interval
+        self.reloads = 0
+        self._segments = None
+        self._mtime = None
+        self._checked_at = 0.0
+        self._guild_cache = LRUCache(cache_size)
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if self._segments is not None and now - self._checked_at < self.check_interval: return
+        self._checked_at = now
+        mtime = os.stat(self.path).st_mtime_ns
+        if mtime != self._mtime:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._segments = PLACEHOLDER.split(f.read())
+            self._mtime = mtime
+            self._guild_cache.clear()
+            self.reloads += 1
+
+    def _for_guild(self, guild_name):
+        # Substitui {{NOME_SERVIDOR}} e junta os textos fixos vizinhos, mantendo a alternância texto/marcador
+        segments = self._guild_cache.get(guild_name)
+        if segments is None:
+            escaped = html.escape(guild_name)
+            segments = [""]
+            for i, part in enumerate(self._segments):
+                if i % 2 == 0: segments[-1] += part
+                elif part == "NOME_SERVIDOR": segments[-1] += escaped
+                else: segments += [part, ""]
+            self._guild_cache.put(guild_name, segments)
+        return segments
+
+    def render(self, user_name, guild_name, code):
+        self._maybe_reload()
+        values = {"NOME_USUARIO": html.escape(user_name), "CODIGO": html.escape(code)}
+        return "".join(values.get(part, "{{%s}}" % part) if i % 2 else part for i, part in enumerate(self._for_guild(guild_name)))
+
+def build_message(sender, recipient, subject, text, html_content):
+    # MIMEMultipart é bem mais barato de montar que EmailMessage.set_content/add_alternative
+    msg = MIMEMultipart("alternative")
+    msg["Subject"] = subject
+    msg["From"] = sender
+    msg["To"] = recipient
+    msg.attach(MIMEText(text, "plain", "utf-8"))
+    msg.attach(MIMEText(html_content, "html", "utf-8"))
+    return msg
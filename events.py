@@ -0,0 +1,88 @@
+import asyncio
+import bisect
+import logging
+import time
+
+import async_database as adb
+
+logger = logging.getLogger("astro.events")
+
+# --- EVENTOS DE VERIFICAÇÃO ---
+# Cada etapa do funil vira uma linha em verification_events (só inserção). record() só guarda o evento na memória;
+# um writer em segundo plano grava o buffer a cada flush_interval segundos (ou quando enche) num único executemany,
+# atualizando na mesma transação os agregados por hora que o /estatisticas lê.
+# O tempo até a verificação é agregado num histograma (DURATION_BUCKETS), do qual a mediana é estimada.
+EVENT_STARTED = "started"
+EVENT_EMAIL_FAILED = "email_failed"
+EVENT_DM_FAILED = "dm_failed"
+EVENT_WRONG_CODE = "wrong_code"
+EVENT_ATTEMPTS_EXCEEDED = "attempts_exceeded"
+EVENT_EXPIRED = "expired"
+EVENT_VERIFIED = "verified"
+
+DURATION_BUCKETS = (15, 30, 45, 60, 90, 120, 180, 240, 300, 420, 600, 900) # Limites superiores, em segundos; o último balde é "acima de 900"
+
+def duration_bucket(seconds):
+    return bisect.bisect_left(DURATION_BUCKETS, seconds)
+
+def median_from_histogram(histogram):
+    # histogram: {balde: contagem}; interpola linearmente dentro do balde que contém a mediana
+    total = sum(histogram.values())
+    if not total: return None
+    half = total / 2
+    cumulative = 0
+    for bucket in sorted(histogram):
+        count = histogram[bucket]
+        if cumulative + count >= half:
+            lower = DURATION_BUCKETS[bucket - 1] if bucket > 0 else 0
+            if bucket >= len(DURATION_BUCKETS): return lower
+            return lower + (DURATION_BUCKETS[bucket] - lower) * (half - cumulative) / count
+        cumulative += count
+    return None
+
+class EventWriter:
+    def __init__(self, flush_interval=5.0, max_buffer=500):
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.written = 0
+        self.dropped = 0
+        self._buffer = []
+        self._wakeup = None
+        self._task = None
+
+    def stats(self):
+        return {"buffered": len(self._buffer), "written": self.written, "dropped": self.dropped}
+
+    def record(self, guild_id, user_id, event, duration=None):
+        bucket = duration_bucket(duration) if duration is not None else None
+        self._buffer.append((guild_id, user_id, event, int(time.time()), duration, bucket))
+        if len(self._buffer) >= self.max_buffer and self._wakeup: self._wakeup.set()
+
+    def start(self):
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        rows, self._buffer = self._buffer, []
+        if not rows: return
+        try:
+            await adb.record_events(rows)
+            self.written += len(rows)
+        except Exception:
+            self.dropped += len(rows)
+            logger.exception("erro ao gravar %d eventos de verificação", len(rows))
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        await self.flush()
@@ -0,0 +1,97 @@
+import asyncio
+import heapq
+import itertools
+import logging
+
+import discord
+
+logger = logging.getLogger("astro.logs")
+
+# --- ENVIO AGRUPADO DE LOGS ---
+# Em vez de uma mensagem por evento, os embeds de cada servidor vão para um buffer e são enviados juntos,
+# até 10 por mensagem (limite do Discord), quando o buffer enche ou depois de flush_interval segundos.
+# Embeds de prioridade alta (ex.: alerta de raid) saem primeiro e disparam o envio na hora.
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+MAX_EMBED_CHARS = 6000 # Limite do Discord para a soma dos textos de todos os embeds de uma mensagem
+
+class LogDispatcher:
+    def __init__(self, resolve_channel, flush_interval=2.0, max_batch=10, max_buffer=100):
+        # resolve_channel(guild_id) é uma coroutine que retorna o canal de logs do servidor (ou None)
+        self.resolve_channel = resolve_channel
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.max_buffer = max_buffer
+        self.sent_messages = 0
+        self.sent_embeds = 0
+        self.dropped = 0
+        self._buffers = {}
+        self._timers = {}
+        self._locks = {}
+        self._tasks = set()
+        self._counter = itertools.count()
+
+    def stats(self):
+        return {"buffered": sum(len(b) for b in self._buffers.values()), "sent_messages": self.sent_messages, "sent_embeds": self.sent_embeds, "dropped": self.dropped}
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def enqueue(self, guild_id, embed, priority=PRIORITY_NORMAL):
+        buffer = self._buffers.setdefault(guild_id, [])
+        heapq.heappush(buffer, (priority, next(self._counter), embed))
+        if len(buffer) > self.max_buffer:
+            # Buffer cheio (canal inacessível ou sob rate limit): descarta o log menos importante e mais recente
+            buffer.remove(max(buffer))
+            heapq.heapify(buffer)
+            self.dropped += 1
+        if priority == PRIORITY_HIGH or len(buffer) >= self.max_batch:
+            self._spawn(self.flush(guild_id))
+        elif guild_id not in self._timers:
+            self._timers[guild_id] = self._spawn(self._flush_later(guild_id))
+
+    async def _flush_later(self, guild_id):
+        try:
+            await asyncio.sleep(self.flush_interval)
+        finally:
+            self._timers.pop(guild_id, None)
+        await self.flush(guild_id)
+
+    async def flush(self, guild_id):
+        # Um envio por vez por servidor, para manter a ordem e não estourar o rate limit do canal
+        lock = self._locks.setdefault(guild_id, asyncio.Lock())
+        async with lock:
+            while buffer := self._buffers.get(guild_id):
+                batch, size = [], 0
+                while buffer and len(batch) < self.max_batch and (not batch or size + len(buffer[0][2]) <= MAX_EMBED_CHARS):
+                    embed = heapq.heappop(buffer)[2]
+                    batch.append(embed)
+                    size += len(embed)
+                if not buffer: self._buffers.pop(guild_id, None)
+                await self._send(guild_id, batch)
+
+    async def _send(self, guild_id, embeds):
+        try:
+            channel = await self.resolve_channel(guild_id)
+            if not channel:
+                self.dropped += len(embeds)
+                return
+            await channel.send(embeds=embeds)
+            self.sent_messages += 1
+            self.sent_embeds += len(embeds)
+            logger.debug("logs enviados guild_id=%s channel_id=%s embeds=%d", guild_id, channel.id, len(embeds))
+        except discord.Forbidden:
+            self.dropped += len(embeds)
+            logger.warning("sem permissão para enviar logs guild_id=%s (verifique 'Enviar Mensagens' e 'Incorporar Links')", guild_id)
+        except Exception:
+            self.dropped += len(embeds)
+            logger.exception("erro ao enviar logs guild_id=%s", guild_id)
+
+    async def close(self):
+        for timer in list(self._timers.values()): timer.cancel()
+        self._timers.clear()
+        for guild_id in list(self._buffers):
+            await self.flush(guild_id)
@@ -4,40 +4,251 @@ from discord import app_commands
 import os
 import random
 import string
-from email.message import EmailMessage
 from dotenv import load_dotenv
 import time
 import asyncio
 import aiosmtplib
 from datetime import datetime, timedelta, timezone
 import traceback
-from collections import deque
+import logging
+import tempfile
+import html
+import aiohttp
+import hashlib
+import json
 
-import database as db
+STARTED_AT = time.perf_counter() # Início da contagem do tempo de inicialização (depois das bibliotecas externas)
 
+# O .env precisa ser carregado antes dos módulos abaixo, que leem suas configurações ao serem importados
 load_dotenv()
-db.init_db()
+
+import database as db
+import async_database as adb
+from sessions import SessionStore, VerificationSession
+from domain_blocklist import DomainBlocklist, normalize_domain
+from smtp_pool import SMTPPool
+from email_outbox import EmailOutbox
+from email_template import EmailTemplate, build_message
+from log_dispatcher import LogDispatcher, PRIORITY_HIGH, PRIORITY_NORMAL
+from raid_detector import RaidDetector
+from role_queue import RoleAssignmentQueue
+from bulk_verify import BulkVerificationJob, parse_member_ids
+from reconcile import reconcile_guild
+from member_cache import MemberCache, client_options, iter_guild_members, MEMBER_CACHE_PROFILE
+from metrics import REGISTRY
+from metrics_server import MetricsServer
+from tracing import tracer
+from events import (EventWriter, median_from_histogram, EVENT_STARTED, EVENT_EMAIL_FAILED, EVENT_DM_FAILED, EVENT_WRONG_CODE,
+                    EVENT_ATTEMPTS_EXCEEDED, EVENT_EXPIRED, EVENT_VERIFIED)
+
+# --- MODO SHARDED / CLUSTER ---
+# Sem SHARD_COUNT: um processo, um shard (commands.Bot). Com SHARD_COUNT: AutoShardedBot; SHARD_IDS restringe este
+# processo a alguns shards (é assim que o cluster.py divide os shards entre processos). O Discord entrega os eventos de
+# um servidor sempre ao shard (guild_id >> 22) % SHARD_COUNT, então o estado em memória indexado por servidor
+# (raid_detector, caches, fila de cargos, logs) já fica particionado entre os processos. DMs (o teclado) chegam no shard 0.
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", 0)) or None
+SHARD_IDS = [int(shard_id) for shard_id in os.getenv("SHARD_IDS", "").split(",") if shard_id.strip()] or None
+CLUSTER_ID = os.getenv("CLUSTER_ID")
+CLUSTER_MODE = bool(SHARD_IDS) and SHARD_COUNT is not None and len(SHARD_IDS) < SHARD_COUNT # Há outros processos dividindo o banco
+PRIMARY_PROCESS = not SHARD_IDS or 0 in SHARD_IDS # Dono do shard 0: recebe as DMs e faz as tarefas globais
+
+log_prefix = f"[cluster {CLUSTER_ID}] " if CLUSTER_ID is not None else ""
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper(), format=f"%(asctime)s %(levelname)s {log_prefix}%(name)s: %(message)s")
+logger = logging.getLogger("astro")
+
+# --- TEMPO DE INICIALIZAÇÃO ---
+# Cada fase registra quanto tempo levou desde a anterior; o detalhamento é logado no primeiro on_ready.
+STARTUP_PHASE_SECONDS = REGISTRY.gauge("astro_startup_phase_seconds", "Duração de cada fase da inicialização.", ["phase"])
+startup_phases = []
+_startup_last = STARTED_AT
+
+def mark_startup(phase):
+    global _startup_last
+    now = time.perf_counter()
+    startup_phases.append((phase, now - _startup_last))
+    STARTUP_PHASE_SECONDS.labels(phase).set(now - _startup_last)
+    _startup_last = now
+
+mark_startup("modules")
+for version, seconds in db.init_db(): logger.info("migração do banco aplicada version=%d seconds=%.2f", version, seconds)
+mark_startup("migrations")
 
 # --- CONSTANTES ---
 BOT_OWNER_ID = 475255757370032138 # Substitua pelo seu ID de usuário
-RAID_THRESHOLD_COUNT = 15
-RAID_THRESHOLD_SECONDS = 60
-recent_joins = {}
+VERIFICATION_TTL = db.VERIFICATION_TTL # Configurável via VERIFICATION_TTL no .env
+SWEEP_INTERVAL = int(os.getenv("SWEEP_INTERVAL", 60))
+SWEEP_BATCH_SIZE = int(os.getenv("SWEEP_BATCH_SIZE", 500))
+SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", 465))
+SMTP_USE_TLS = os.getenv("SMTP_USE_TLS", "true").lower() == "true"
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", 4))
+BULK_VERIFY_RATE = float(os.getenv("BULK_VERIFY_RATE", 1.0)) # Membros por segundo na verificação em massa
+BULK_VERIFY_CHUNK = int(os.getenv("BULK_VERIFY_CHUNK", 100))
+BULK_VERIFY_MAX_FILE_SIZE = int(os.getenv("BULK_VERIFY_MAX_FILE_SIZE", 10 * 1024 * 1024)) # Tamanho máximo do arquivo de IDs, em bytes
+FORCE_COMMAND_SYNC = os.getenv("FORCE_COMMAND_SYNC", "false").lower() == "true" # Sincroniza os comandos mesmo sem mudanças
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", 9108)) # 0 desativa o servidor de métricas
+TRACING_DUMP_PATH = os.getenv("TRACING_DUMP_PATH") # Se definido, os traces são salvos nesse arquivo ao desligar o bot
+RECONCILE_INTERVAL = int(os.getenv("RECONCILE_INTERVAL", 6 * 3600)) # Cada servidor é reconciliado uma vez a cada intervalo
+SETTINGS_WATCH_INTERVAL = float(os.getenv("SETTINGS_WATCH_INTERVAL", 5)) # Modo cluster: frequência de checagem de configurações e domínios bloqueados alterados por outro processo
+raid_detector = RaidDetector(idle_after=int(os.getenv("RAID_IDLE_EVICTION", 3600)))
+sessions = SessionStore(ttl=VERIFICATION_TTL)
+blocklist = DomainBlocklist()
+member_cache = MemberCache(maxsize=int(os.getenv("MEMBER_CACHE_SIZE", 1000)), ttl=int(os.getenv("MEMBER_CACHE_TTL", 300)))
+verification_events = EventWriter(flush_interval=float(os.getenv("EVENTS_FLUSH_INTERVAL", 5.0)))
+
+# --- MÉTRICAS ---
+COMMAND_SECONDS = REGISTRY.histogram("astro_command_seconds", "Duração dos comandos slash, por comando e resultado.", ["command", "status"])
+INTERACTION_LAG = REGISTRY.histogram("astro_interaction_lag_seconds", "Tempo entre a criação da interação no Discord e o início do processamento (o prazo para responder é 3s).",
+                                     buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 1.5, 2.0, 2.5, 3.0, 5.0))
+EMAIL_SEND_SECONDS = REGISTRY.histogram("astro_email_send_seconds", "Duração do envio de e-mails via SMTP, por resultado.", ["result"], buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0))
+LOG_ACTIONS = REGISTRY.counter("astro_log_actions", "Embeds de log enfileirados, por prioridade.", ["priority"])
+LOG_ACTION_SECONDS = REGISTRY.histogram("astro_log_action_seconds", "Duração de log_action (só o enfileiramento; o envio é feito em lote).", buckets=(0.00001, 0.0001, 0.001, 0.01))
+LOOP_LAG = REGISTRY.histogram("astro_event_loop_lag_seconds", "Atraso do event loop, medido por um sleep periódico.", buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0))
+REGISTRY.gauge("astro_pending_verifications", "Sessões de verificação ativas em memória.").set_function(lambda: len(sessions))
+REGISTRY.gauge("astro_email_outbox_in_flight", "E-mails entregues aos workers do outbox.").set_function(lambda: outbox.stats()["in_flight"])
+REGISTRY.gauge("astro_role_queue_depth", "Atribuições de cargo aguardando na fila.").set_function(lambda: role_queue.depth())
+REGISTRY.gauge("astro_log_buffered", "Embeds de log aguardando envio.").set_function(lambda: log_dispatcher.stats()["buffered"])
+REGISTRY.gauge("astro_events_buffered", "Eventos de verificação aguardando gravação.").set_function(lambda: verification_events.stats()["buffered"])
+REGISTRY.gauge("astro_member_lru_size", "Membros no LRU usado pelo perfil de cache 'low'.").set_function(lambda: len(member_cache._cache))
+REGISTRY.gauge("astro_guilds", "Servidores em que o bot está.").set_function(lambda: len(bot.guilds))
+REGISTRY.gauge("astro_gateway_latency_seconds", "Latência do heartbeat do gateway.").set_function(lambda: bot.latency)
+metrics_server = MetricsServer(METRICS_HOST, METRICS_PORT)
+
+def observe_command(interaction: discord.Interaction, status: str):
+    tracer.finish_trace(status=status)
+    if (started := interaction.extras.get("started_at")) is not None and interaction.command:
+        COMMAND_SECONDS.labels(interaction.command.qualified_name, status).observe(time.perf_counter() - started)
+
+class InstrumentedCommandTree(app_commands.CommandTree):
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        interaction.extras["started_at"] = time.perf_counter()
+        tracer.start_trace(f"/{interaction.command.qualified_name}" if interaction.command else "interaction", guild_id=interaction.guild_id, user_id=interaction.user.id)
+        INTERACTION_LAG.observe(max(0.0, (discord.utils.utcnow() - interaction.created_at).total_seconds()))
+        return True
+
+async def monitor_loop_lag(interval=0.5):
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        LOOP_LAG.observe(max(0.0, loop.time() - started - interval))
 
 # --- BOT ---
 intents = discord.Intents.default()
 intents.members = True
 intents.message_content = True 
 
-class PersistentBot(commands.Bot):
+def shard_options():
+    if SHARD_COUNT is None: return {}
+    return {"shard_count": SHARD_COUNT, "shard_ids": SHARD_IDS}
+
+class PersistentBot(commands.AutoShardedBot if SHARD_COUNT else commands.Bot):
     def __init__(self):
-        super().__init__(command_prefix="!", intents=intents)
+        # MEMBER_CACHE_PROFILE=low desliga o chunking na inicialização e o cache de membros (ver member_cache.py)
+        super().__init__(command_prefix="!", intents=intents, tree_cls=InstrumentedCommandTree, **client_options(), **shard_options())
+        self.loop_lag_task = None
+        self.settings_watch_task = None
+        self.sweeper_task = None
+        self.last_sweep = None
+        self.reconcile_task = None
 
     async def setup_hook(self):
+        mark_startup("login")
+        adb.start()
+        await adb.init_backend()
+        logger.info("backend de armazenamento: %s", adb.storage_backend.name)
+        logger.info("perfil de cache de membros: %s", MEMBER_CACHE_PROFILE)
+        if SHARD_COUNT: logger.info("shards %s de %d", SHARD_IDS or "todos", SHARD_COUNT)
+        self.loop_lag_task = asyncio.create_task(monitor_loop_lag())
+        if METRICS_PORT: metrics_server.start()
+        verification_events.start()
+        outbox.start()
+        blocklist_version = await adb.get_blocklist_version()
+        blocklist.load(await adb.get_all_blocked_domains())
+        logger.info("%d domínios bloqueados carregados", len(blocklist))
+        mark_startup("blocklist")
+        # Cada processo tem a sua cópia da lista; as mudanças feitas em outro processo chegam pela versão no banco
+        if CLUSTER_MODE: self.settings_watch_task = asyncio.create_task(adb.watch_settings(SETTINGS_WATCH_INTERVAL, blocklist, blocklist_version))
         self.add_view(VerificationKeypad())
-        print("View persistente registrada.")
+        logger.info("View persistente registrada.")
+        # Com vários processos, só o dono do shard 0 sincroniza os comandos e limpa as verificações expiradas
+        if PRIMARY_PROCESS: await self.sync_commands()
+        mark_startup("command_sync")
+        if PRIMARY_PROCESS: self.sweeper_task = asyncio.create_task(self.sweep_expired_verifications())
+        self.reconcile_task = asyncio.create_task(self.reconcile_guilds())
+
+    async def sync_commands(self):
+        # on_ready roda de novo a cada reconexão; a árvore só é enviada ao Discord quando o hash dela muda
+        payload = json.dumps([command.to_dict() for command in self.tree.get_commands()], sort_keys=True)
+        tree_hash = hashlib.sha256(payload.encode()).hexdigest()
+        key = f"command_tree_hash:{self.application_id}"
+        if not FORCE_COMMAND_SYNC and await adb.get_state(key) == tree_hash:
+            logger.info("comandos sem alterações, sincronização ignorada (hash %s)", tree_hash[:12])
+            return False
+        try:
+            synced = await self.tree.sync()
+        except discord.HTTPException:
+            logger.exception("erro ao sincronizar os comandos")
+            return False
+        await adb.set_state(key, tree_hash)
+        logger.info("%d comandos sincronizados (hash %s)", len(synced), tree_hash[:12])
+        return True
+
+    async def sweep_expired_verifications(self):
+        # Remove periodicamente verificações abandonadas, em lotes pequenos para não segurar o lock de escrita
+        while True:
+            await asyncio.sleep(SWEEP_INTERVAL)
+            try:
+                start = time.perf_counter()
+                purged = 0
+                while True:
+                    deleted = await adb.delete_expired_verifications(VERIFICATION_TTL, SWEEP_BATCH_SIZE)
+                    purged += deleted
+                    if deleted < SWEEP_BATCH_SIZE: break
+                    await asyncio.sleep(0.05) # Deixa outras operações do banco rodarem entre os lotes
+                sessions.purge_expired()
+                self.last_sweep = {"purged": purged, "duration": time.perf_counter() - start, "at": time.time()}
+                logger.log(logging.INFO if purged else logging.DEBUG, "limpeza de verificações expiradas purged=%d duration_ms=%.1f", purged, self.last_sweep["duration"] * 1000)
+            except Exception:
+                logger.exception("erro na limpeza de verificações expiradas")
+
+    async def reconcile_guilds(self):
+        # Os servidores são espalhados ao longo de RECONCILE_INTERVAL, em vez de todos reconciliados de uma vez
+        await self.wait_until_ready()
+        while True:
+            guild_ids = [guild.id for guild in self.guilds]
+            delay = RECONCILE_INTERVAL / max(1, len(guild_ids))
+            if not guild_ids: await asyncio.sleep(delay)
+            for guild_id in guild_ids:
+                await asyncio.sleep(delay)
+                if not (guild := self.get_guild(guild_id)): continue
+                try:
+                    await reconcile_and_report(guild)
+                except Exception:
+                    logger.exception("erro na reconciliação guild_id=%s", guild_id)
+
+    async def close(self):
+        if self.loop_lag_task: self.loop_lag_task.cancel()
+        if self.settings_watch_task: self.settings_watch_task.cancel()
+        if self.sweeper_task: self.sweeper_task.cancel()
+        if self.reconcile_task: self.reconcile_task.cancel()
+        for job in bulk_jobs.values(): job.cancel()
+        await asyncio.gather(*(job.task for job in bulk_jobs.values() if job.task), return_exceptions=True)
+        # Tudo que ainda fala com o Discord fecha antes do super().close(), que encerra a sessão HTTP:
+        # senão o último flush dos logs (e os cargos e e-mails em andamento) sairia por uma sessão já fechada
+        await outbox.close()
+        await role_queue.close()
+        await log_dispatcher.close()
+        await verification_events.close()
+        await super().close()
+        if smtp_pool: await smtp_pool.close()
+        await metrics_server.close()
+        if TRACING_DUMP_PATH and len(tracer): logger.info("%d traces salvos em %s", tracer.dump(TRACING_DUMP_PATH), TRACING_DUMP_PATH)
+        await adb.close()
 
 bot = PersistentBot()
+log_dispatcher = LogDispatcher(lambda guild_id: resolve_log_channel(guild_id), flush_interval=float(os.getenv("LOG_FLUSH_INTERVAL", 2.0)))
 
 # --- FUNÇÕES AUXILIARES ---
 def format_seconds(total_seconds: float) -> str:
@@ -49,66 +260,83 @@ def format_seconds(total_seconds: float) -> str:
     if seconds > 0: parts.append(f"{seconds} segundo{'s' if seconds != 1 else ''}")
     return " e ".join(parts)
 
-async def log_action(guild: discord.Guild, embed: discord.Embed):
-    print(f"[DEBUG] Função log_action iniciada para o servidor: {guild.name} ({guild.id})")
-    
-    try:
-        settings = db.get_settings(guild.id)
-        if not settings:
-            print(f"[DEBUG] FALHA: Não há configurações (settings) no banco de dados para o servidor {guild.id}.")
-            return
-            
-        # CORREÇÃO AQUI: Desempacota 4 valores (verified_role_id, unverified_role_id, log_channel_id, lockdown_enabled)
-        _, _, log_channel_id, _ = settings 
-        
-        if not log_channel_id:
-            print(f"[DEBUG] FALHA: O log_channel_id é NULO ou NÃO FOI ENCONTRADO no banco de dados.")
-            return
+async def resolve_log_channel(guild_id: int):
+    _, _, log_channel_id, _ = await adb.get_settings(guild_id)
+    if not log_channel_id:
+        logger.debug("canal de logs não configurado guild_id=%s", guild_id)
+        return None
+    log_channel = bot.get_channel(log_channel_id)
+    if not log_channel and CLUSTER_MODE and bot.get_guild(guild_id) is None:
+        # O servidor é de outro processo do cluster (ex.: verificação concluída pela DM, no shard 0): envia pela API sem cache
+        return bot.get_partial_messageable(log_channel_id, guild_id=guild_id)
+    if not log_channel:
+        logger.warning("canal de logs não encontrado guild_id=%s channel_id=%s (permissão 'Ver Canal' ou canal excluído)", guild_id, log_channel_id)
+    return log_channel
 
-        print(f"[DEBUG] ID do canal de logs encontrado no DB: {log_channel_id}")
-        
-        log_channel = bot.get_channel(log_channel_id)
-        
-        if not log_channel:
-            print(f"[DEBUG] FALHA: O bot.get_channel({log_channel_id}) retornou None.")
-            print(f"[DEBUG] Verifique se o bot tem a permissão 'Ver Canal' ou se o canal foi excluído.")
-            return
-            
-        print(f"[DEBUG] Canal '{log_channel.name}' encontrado. Tentando enviar a mensagem...")
-        
+async def log_action(guild: discord.Guild, embed: discord.Embed, priority: int = PRIORITY_NORMAL):
+    # Os logs são agrupados por servidor e enviados em lote pelo LogDispatcher
+    started = time.perf_counter()
+    with tracer.span("log_action"):
         embed.timestamp = datetime.now()
-        await log_channel.send(embed=embed)
-        print(f"[DEBUG] SUCESSO: Log enviado para #{log_channel.name}.")
+        log_dispatcher.enqueue(guild.id, embed, priority)
+    LOG_ACTIONS.labels("high" if priority == PRIORITY_HIGH else "normal").inc()
+    LOG_ACTION_SECONDS.observe(time.perf_counter() - started)
 
-    except discord.Forbidden:
-        print(f"[DEBUG] ERRO FATAL (Forbidden): O bot não tem permissão para 'Enviar Mensagens' ou 'Incorporar Links' no canal #{log_channel.name}.")
-    except Exception as e:
-        print(f"[DEBUG] ERRO INESPERADO: Ocorreu um erro ao tentar enviar a mensagem: {e}")
-        traceback.print_exc()
+email_template = EmailTemplate("templates/email_template.html")
+smtp_pool = None
 
-async def send_email_async(recipient, code, user_name, guild_name):
+def get_smtp_pool():
+    global smtp_pool
     EMAIL, PASSWORD = os.getenv("EMAIL_ADDRESS"), os.getenv("EMAIL_PASSWORD")
-    if not EMAIL or not PASSWORD: return False
+    if not EMAIL or not PASSWORD: return None
+    if smtp_pool is None:
+        smtp_pool = SMTPPool(SMTP_HOST, SMTP_PORT, EMAIL, PASSWORD, use_tls=SMTP_USE_TLS, max_size=SMTP_POOL_SIZE)
+    return smtp_pool
+
+async def send_email_async(recipient, code, user_name, guild_name):
+    pool = get_smtp_pool()
+    if not pool: return False
     try:
-        with open("templates/email_template.html", "r", encoding="utf-8") as f:
-            html_content = f.read()
-        html_content = html_content.replace("{{NOME_USUARIO}}", user_name).replace("{{NOME_SERVIDOR}}", guild_name).replace("{{CODIGO}}", code)
+        with tracer.span("email.render"):
+            html_content = email_template.render(user_name, guild_name, code)
     except FileNotFoundError:
-        print("ERRO: O arquivo 'templates/email_template.html' não foi encontrado.")
-        html_content = f"""<p>Olá <strong>{user_name}</strong>,</p><p>Seu código de verificação para o servidor <strong>"{guild_name}"</strong> é:</p><div style="font-size: 28px; font-weight: bold;">{code}</div>"""
-    msg = EmailMessage()
-    msg["Subject"] = f"Seu Código de Verificação para {guild_name}"
-    msg["From"] = EMAIL
-    msg["To"] = recipient
-    msg.set_content(f"Seu código para '{guild_name}' é: {code}")
-    msg.add_alternative(html_content, subtype='html')
+        logger.error("O arquivo 'templates/email_template.html' não foi encontrado.")
+        html_content = f"""<p>Olá <strong>{html.escape(user_name)}</strong>,</p><p>Seu código de verificação para o servidor <strong>"{html.escape(guild_name)}"</strong> é:</p><div style="font-size: 28px; font-weight: bold;">{code}</div>"""
+    msg = build_message(pool.username, recipient, f"Seu Código de Verificação para {guild_name}", f"Seu código para '{guild_name}' é: {code}", html_content)
+    started = time.perf_counter()
+    result = "ok"
     try:
-        await aiosmtplib.send(msg, hostname="smtp.gmail.com", port=465, use_tls=True, username=EMAIL, password=PASSWORD)
+        with tracer.span("smtp.send"):
+            await pool.send(msg)
         return True
-    except aiosmtplib.SMTPRecipientsRefused: return "recipient_refused"
+    except aiosmtplib.SMTPRecipientsRefused:
+        result = "recipient_refused"
+        return "recipient_refused"
     except Exception as e:
-        print(f"Falha ao enviar e-mail: {e}")
+        result = "error"
+        logger.warning("falha ao enviar e-mail: %s", e)
         return False
+    finally:
+        EMAIL_SEND_SECONDS.labels(result).observe(time.perf_counter() - started)
+
+async def get_session(user_id, guild_id=None):
+    # Usa a sessão em memória; se não existir (ex.: o bot reiniciou), reconstrói a partir da verificação mais recente no banco
+    session = sessions.get(user_id)
+    if guild_id is not None:
+        # Só a verificação desse servidor, sem trocar a sessão ativa do usuário (que pode ser de outro servidor)
+        if session and session.guild_id == guild_id and not CLUSTER_MODE: return session
+        verification_data = await adb.get_verification(user_id, guild_id)
+        if not verification_data or time.time() - verification_data[3] > VERIFICATION_TTL: return None
+        if session and session.guild_id == guild_id and session.created_at == int(verification_data[3]): return session
+        return VerificationSession(user_id, *verification_data)
+    if session and not CLUSTER_MODE: return session
+    # Em modo cluster o /verificar pode ter rodado em outro processo: a sessão em memória só vale se ainda for a mais recente do banco
+    verification_data = await adb.get_verification(user_id)
+    if not verification_data:
+        if session: sessions.pop(user_id)
+        return None
+    if session and (session.guild_id, session.created_at) == (verification_data[0], int(verification_data[3])): return session
+    return sessions.put(user_id, *verification_data)
 
 async def send_help_message(user: discord.User, guild_name: str):
     embed = discord.Embed(title="🤔 Como usar o sistema de verificação?", description=f"Bem-vindo(a) ao processo de verificação do servidor **{guild_name}**!", color=discord.Color.blue())
@@ -118,9 +346,30 @@ async def send_help_message(user: discord.User, guild_name: str):
     try:
         await user.send(embed=embed)
     except discord.Forbidden:
-        print(f"Não foi possível enviar a DM de ajuda para {user.name}")
+        logger.info("não foi possível enviar a DM de ajuda user_id=%s", user.id)
 
 # --- INTERFACE DE VERIFICAÇÃO ---
+async def verify_in_remote_guild(user, guild_id, verified_role_id, unverified_role_id, created_at_timestamp):
+    # Modo cluster: o teclado roda no processo do shard 0, mas o servidor pertence a outro processo (sem cache local).
+    # Os cargos são trocados direto pela API; Unknown Member (404) significa que o usuário saiu do servidor.
+    role_queue.discard(guild_id, user.id)
+    try:
+        with tracer.span("discord.roles"):
+            if verified_role_id: await bot.http.add_role(guild_id, user.id, verified_role_id)
+            if unverified_role_id: await bot.http.remove_role(guild_id, user.id, unverified_role_id)
+    except discord.NotFound:
+        return
+    await adb.add_verified_user(user.id, guild_id)
+    verification_events.record(guild_id, user.id, EVENT_VERIFIED, time.time() - created_at_timestamp)
+    try:
+        guild_name = (await bot.fetch_guild(guild_id, with_counts=False)).name
+        with tracer.span("discord.dm"):
+            await user.send(f"🎉 **Bem-vindo(a) ao {guild_name}!**")
+    except discord.HTTPException:
+        pass
+    log_embed = discord.Embed(title="✅ Verificação Bem-Sucedida", color=discord.Color.green(), description=f"{user.mention} foi verificado.")
+    await log_action(discord.Object(guild_id), embed=log_embed)
+
 class VerificationKeypad(discord.ui.View):
     def __init__(self):
         super().__init__(timeout=None)
@@ -133,29 +382,33 @@ class VerificationKeypad(discord.ui.View):
         embed.add_field(name="Código:", value=f"```{display_code}```", inline=False)
         return embed
 
+    @tracer.traced("keypad.key")
     async def handle_key_press(self, interaction: discord.Interaction, key: str):
-        verification_data = db.get_verification(interaction.user.id)
-        if not verification_data: return await interaction.response.edit_message(content="❌ Verificação expirada.", embed=None, view=None)
-        *_, current_input = verification_data
+        session = await get_session(interaction.user.id)
+        if not session: return await interaction.response.edit_message(content="❌ Verificação expirada.", embed=None, view=None)
+        current_input = session.current_input
         
         if key == "backspace": new_input = current_input[:-1] if current_input else ""
         elif len(current_input) < 6: new_input = current_input + key
         else: return await interaction.response.defer()
         
-        db.update_input_code(interaction.user.id, new_input)
+        session.current_input = new_input
         status = "ready" if len(new_input) == 6 else "default"
         await interaction.response.edit_message(embed=self.create_embed(new_input, status), view=self)
 
+    @tracer.traced("keypad.submit")
     async def handle_submission(self, interaction: discord.Interaction):
-        verification_data = db.get_verification(interaction.user.id)
-        if not verification_data: return await interaction.response.edit_message(content="❌ Verificação expirada.", embed=None, view=None)
+        session = await get_session(interaction.user.id)
+        if not session: return await interaction.response.edit_message(content="❌ Verificação expirada.", embed=None, view=None)
         
-        guild_id, correct_code, attempts, created_at_timestamp, current_input = verification_data
+        guild_id, correct_code, created_at_timestamp, current_input = session.guild_id, session.code, session.created_at, session.current_input
         
-        if time.time() - created_at_timestamp > 600:
+        if time.time() - created_at_timestamp > VERIFICATION_TTL:
             for item in self.children: item.disabled = True
             await interaction.response.edit_message(content="❌ **Seu código de verificação expirou.**", embed=None, view=self)
-            db.delete_verification(interaction.user.id)
+            verification_events.record(guild_id, interaction.user.id, EVENT_EXPIRED)
+            sessions.pop(interaction.user.id)
+            await adb.delete_verification(interaction.user.id, guild_id)
             return self.stop()
             
         if not current_input:
@@ -167,30 +420,44 @@ class VerificationKeypad(discord.ui.View):
             for item in self.children: item.disabled = True
             await interaction.response.edit_message(content="✅ **Verificação concluída!**", embed=None, view=self)
             
-            verified_role_id, unverified_role_id, _, _ = db.get_settings(guild_id)
+            verified_role_id, unverified_role_id, _, _ = await adb.get_settings(guild_id)
 
-            if guild and (member := guild.get_member(interaction.user.id)):
-                if verified_role := (guild.get_role(verified_role_id) if verified_role_id else None): await member.add_roles(verified_role)
-                if unverified_role := (guild.get_role(unverified_role_id) if unverified_role_id else None): await member.remove_roles(unverified_role)
-                db.add_verified_user(member.id, guild.id)
-                await member.send(f"🎉 **Bem-vindo(a) ao {guild.name}!**")
+            # A interação vem da DM, então o membro é buscado no servidor (cache do discord.py, LRU ou API)
+            if guild and (member := await member_cache.get(guild, interaction.user.id)):
+                role_queue.discard(guild.id, member.id) # Um cargo de não verificado ainda na fila da entrada não deve ser aplicado
+                with tracer.span("discord.roles"):
+                    if verified_role := (guild.get_role(verified_role_id) if verified_role_id else None): await member.add_roles(verified_role)
+                    if unverified_role := (guild.get_role(unverified_role_id) if unverified_role_id else None): await member.remove_roles(unverified_role)
+                member_cache.invalidate(guild.id, member.id)
+                await adb.add_verified_user(member.id, guild.id)
+                verification_events.record(guild.id, member.id, EVENT_VERIFIED, time.time() - created_at_timestamp)
+                with tracer.span("discord.dm"):
+                    await member.send(f"🎉 **Bem-vindo(a) ao {guild.name}!**")
                 log_embed = discord.Embed(title="✅ Verificação Bem-Sucedida", color=discord.Color.green(), description=f"{member.mention} foi verificado.")
                 await log_action(guild, embed=log_embed)
-            db.delete_verification(interaction.user.id)
+            elif not guild and CLUSTER_MODE:
+                await verify_in_remote_guild(interaction.user, guild_id, verified_role_id, unverified_role_id, created_at_timestamp)
+            sessions.pop(interaction.user.id)
+            await adb.delete_verification(interaction.user.id, guild_id)
             self.stop()
         else:
-            db.update_attempts(interaction.user.id)
-            attempts += 1
+            # As tentativas continuam persistidas para que o limite sobreviva a um reinício do bot
+            await adb.update_attempts(interaction.user.id, guild_id)
+            session.attempts += 1
+            attempts = session.attempts
+            verification_events.record(guild_id, interaction.user.id, EVENT_WRONG_CODE)
             if attempts >= 3:
                 for item in self.children: item.disabled = True
                 await interaction.response.edit_message(content="❌ **Limite de tentativas excedido.**", embed=None, view=self)
-                if guild:
+                verification_events.record(guild_id, interaction.user.id, EVENT_ATTEMPTS_EXCEEDED)
+                if guild or CLUSTER_MODE:
                     log_embed = discord.Embed(title="⚠️ Falha na Verificação", color=discord.Color.orange(), description=f"{interaction.user.mention} excedeu as tentativas.")
-                    await log_action(guild, embed=log_embed)
-                db.delete_verification(interaction.user.id)
+                    await log_action(guild or discord.Object(guild_id), embed=log_embed)
+                sessions.pop(interaction.user.id)
+                await adb.delete_verification(interaction.user.id, guild_id)
                 self.stop()
             else:
-                db.update_input_code(interaction.user.id, "")
+                session.current_input = ""
                 await interaction.response.edit_message(content=f"❌ **Código incorreto.** Restam {3 - attempts} tentativa(s).", embed=self.create_embed("", "error"), view=self)
     
     @discord.ui.button(label="1", style=discord.ButtonStyle.secondary, custom_id="key_1", row=0)
@@ -220,22 +487,141 @@ class VerificationKeypad(discord.ui.View):
     @discord.ui.button(label="Descobrir como usar", style=discord.ButtonStyle.secondary, custom_id="help_button", row=4)
     async def help_button_callback(self, i, b):
         await i.response.defer(ephemeral=True)
-        verification_data = db.get_verification(i.user.id)
+        session = await get_session(i.user.id)
         guild_name = "seu servidor"
-        if verification_data and (guild := bot.get_guild(verification_data[0])): guild_name = guild.name
+        if session and (guild := bot.get_guild(session.guild_id)): guild_name = guild.name
         await send_help_message(i.user, guild_name)
         await i.followup.send("Enviei as instruções para você!", ephemeral=True)
     @discord.ui.button(label="Reenviar Código", style=discord.ButtonStyle.danger, custom_id="resend_button", row=4)
     async def resend_button_callback(self, i, b):
         await i.response.send_message("❌ Para reenviar, use `/verificar` novamente.", ephemeral=True, delete_after=10)
 
+# --- INTERFACE DA LISTA DE DOMÍNIOS ---
+class DomainSearchModal(discord.ui.Modal, title="Buscar domínios"):
+    prefixo = discord.ui.TextInput(label="Prefixo do domínio", placeholder="ex: temp", required=False, max_length=253)
+
+    def __init__(self, view):
+        super().__init__()
+        self.domains_view = view
+
+    async def on_submit(self, interaction: discord.Interaction):
+        self.domains_view.prefix = normalize_domain(self.prefixo.value or "")
+        self.domains_view.page_number = 1
+        await self.domains_view.load()
+        await interaction.response.edit_message(embed=self.domains_view.create_embed(), view=self.domains_view)
+
+class BlockedDomainsView(discord.ui.View):
+    PAGE_SIZE = 25
+
+    def __init__(self, owner_id: int, prefix: str = ""):
+        super().__init__(timeout=300)
+        self.owner_id = owner_id
+        self.prefix = prefix
+        self.page = []
+        self.page_number = 1
+        self.has_previous = False
+        self.has_next = False
+
+    async def load(self, after=None, before=None):
+        # Busca uma linha a mais para saber se existe outra página naquela direção
+        rows = await adb.get_blocked_domains_page(after, before, self.prefix, self.PAGE_SIZE + 1)
+        if before is not None:
+            self.has_previous, self.has_next = len(rows) > self.PAGE_SIZE, True
+            self.page = rows[-self.PAGE_SIZE:]
+        else:
+            self.has_previous, self.has_next = after is not None, len(rows) > self.PAGE_SIZE
+            self.page = rows[:self.PAGE_SIZE]
+        self.previous_page.disabled = not self.has_previous
+        self.next_page.disabled = not self.has_next
+
+    def create_embed(self):
+        descricao = "\n".join(f"- `{d}`" for d in self.page) or "Nenhum domínio encontrado."
+        embed = discord.Embed(title="🚫 Domínios de E-mail Bloqueados", description=descricao[:4096], color=discord.Color.orange())
+        filtro = f" • Prefixo: {self.prefix}" if self.prefix else ""
+        embed.set_footer(text=f"Página {self.page_number} • {len(blocklist)} domínios no total{filtro}")
+        return embed
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        return interaction.user.id == self.owner_id
+
+    @discord.ui.button(label="Anterior", emoji="◀️", style=discord.ButtonStyle.secondary)
+    async def previous_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        if self.page:
+            self.page_number = max(1, self.page_number - 1)
+            await self.load(before=self.page[0])
+        await interaction.response.edit_message(embed=self.create_embed(), view=self)
+
+    @discord.ui.button(label="Próxima", emoji="▶️", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        if self.page:
+            self.page_number += 1
+            await self.load(after=self.page[-1])
+        await interaction.response.edit_message(embed=self.create_embed(), view=self)
+
+    @discord.ui.button(label="Buscar", emoji="🔍", style=discord.ButtonStyle.primary)
+    async def search(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await interaction.response.send_modal(DomainSearchModal(self))
+
+# --- FILA DE E-MAILS ---
+# Interações de /verificar aguardando o resultado do envio, para responder ao usuário (válidas por 15 minutos)
+pending_interactions = {}
+
+async def notify_user(user_id: int, interaction: discord.Interaction, message: str):
+    # Responde pela interação original se ainda existir; senão (ex.: após reinício), tenta por DM
+    try:
+        if interaction: return await interaction.followup.send(message, ephemeral=True)
+        user = bot.get_user(user_id) or await bot.fetch_user(user_id)
+        await user.send(message)
+    except discord.HTTPException:
+        pass
+
+@tracer.traced("outbox.send")
+async def send_outbox_email(email):
+    return await send_email_async(email.recipient, email.code, email.user_name, email.guild_name)
+
+@tracer.traced("outbox.delivered")
+async def on_email_delivered(email):
+    interaction = pending_interactions.pop(email.id, None)
+    view = VerificationKeypad()
+    try:
+        with tracer.span("discord.dm"):
+            user = bot.get_user(email.user_id) or await bot.fetch_user(email.user_id)
+            await user.send(embed=view.create_embed(), view=view)
+    except discord.HTTPException:
+        sessions.pop(email.user_id, email.guild_id)
+        await adb.delete_verification(email.user_id, email.guild_id)
+        verification_events.record(email.guild_id, email.user_id, EVENT_DM_FAILED)
+        return await notify_user(email.user_id, interaction, "❌ **Não consegui te enviar uma DM!**")
+    await notify_user(email.user_id, interaction, "✉️ **Verifique suas Mensagens Diretas (DM)!**")
+    if guild := bot.get_guild(email.guild_id):
+        log_embed = discord.Embed(title="➡️ Início de Verificação", color=discord.Color.blue())
+        log_embed.add_field(name="Usuário", value=f"{user.mention} (`{user.id}`)", inline=False)
+        log_embed.add_field(name="E-mail", value=f"`{email.recipient}`", inline=False)
+        await log_action(guild, embed=log_embed)
+
+async def on_email_failed(email, reason):
+    interaction = pending_interactions.pop(email.id, None)
+    sessions.pop(email.user_id, email.guild_id)
+    await adb.delete_verification(email.user_id, email.guild_id)
+    verification_events.record(email.guild_id, email.user_id, EVENT_EMAIL_FAILED)
+    if reason == "recipient_refused":
+        message = "❌ **O e-mail foi recusado.** Verifique se o endereço está correto."
+    else:
+        message = "❌ **Ocorreu um erro ao enviar o e-mail.** Use `/verificar` para tentar novamente."
+    await notify_user(email.user_id, interaction, message)
+
+# Em modo cluster cada processo só pega (e só devolve à fila, ao reiniciar) os e-mails dos servidores dos seus shards:
+# o on_email_delivered precisa da interação guardada em pending_interactions pelo processo que rodou o /verificar
+outbox = EmailOutbox(send_outbox_email, on_email_delivered, on_email_failed, workers=SMTP_POOL_SIZE, expire_after=VERIFICATION_TTL,
+                     provider_rate=float(os.getenv("EMAIL_RATE_PER_PROVIDER", 1.0)), shards=(SHARD_COUNT, SHARD_IDS) if CLUSTER_MODE else None)
+
 # --- COMANDOS SLASH ---
 @bot.tree.command(name="verificar", description="Inicia o processo de verificação por e-mail.")
 @app_commands.describe(email="Seu endereço de e-mail para receber o código.")
 async def verificar(interaction: discord.Interaction, email: str):
     await interaction.response.defer(ephemeral=True)
     
-    verified_role_id, unverified_role_id, _, lockdown_enabled = db.get_settings(interaction.guild.id)
+    verified_role_id, unverified_role_id, _, lockdown_enabled = await adb.get_settings(interaction.guild.id)
 
     if verified_role_id and (verified_role := interaction.guild.get_role(verified_role_id)):
         if verified_role in interaction.user.roles:
@@ -249,12 +635,12 @@ async def verificar(interaction: discord.Interaction, email: str):
     
     try:
         dominio = email.split('@')[1].lower()
-        if db.is_domain_blocked(dominio):
+        if blocklist.is_blocked(dominio):
             return await interaction.followup.send("❌ **Este provedor de e-mail não é permitido.**", ephemeral=True)
     except IndexError:
         return await interaction.followup.send("❌ **Formato de e-mail inválido.**", ephemeral=True)
 
-    if verification_data := db.get_verification(interaction.user.id):
+    if verification_data := await adb.get_verification(interaction.user.id, interaction.guild.id):
         *_, created_at_timestamp, _ = verification_data
         cooldown_time = 300
         time_passed = time.time() - created_at_timestamp
@@ -266,27 +652,14 @@ async def verificar(interaction: discord.Interaction, email: str):
         return await interaction.followup.send("❌ Sistema não configurado. Use `/configurar`.", ephemeral=True)
         
     codigo = "".join(random.choices(string.digits, k=6))
-    db.create_verification(interaction.user.id, interaction.guild.id, codigo)
-    email_status = await send_email_async(email, codigo, interaction.user.display_name, interaction.guild.name)
-    
-    if email_status is True:
-        view = VerificationKeypad()
-        try:
-            await interaction.user.send(embed=view.create_embed(), view=view)
-            await interaction.followup.send("✉️ **Verifique suas Mensagens Diretas (DM)!**", ephemeral=True)
-            log_embed = discord.Embed(title="➡️ Início de Verificação", color=discord.Color.blue())
-            log_embed.add_field(name="Usuário", value=f"{interaction.user.mention} (`{interaction.user.id}`)", inline=False)
-            log_embed.add_field(name="E-mail", value=f"`{email}`", inline=False)
-            await log_action(interaction.guild, embed=log_embed)
-        except discord.Forbidden:
-            db.delete_verification(interaction.user.id)
-            await interaction.followup.send("❌ **Não consegui te enviar uma DM!**", ephemeral=True)
-    else:
-        db.delete_verification(interaction.user.id)
-        if email_status == "recipient_refused":
-            await interaction.followup.send("❌ **O e-mail foi recusado.** Verifique se o endereço está correto.", ephemeral=True)
-        else:
-            await interaction.followup.send("❌ **Ocorreu um erro ao enviar o e-mail.**", ephemeral=True)
+    await adb.create_verification(interaction.user.id, interaction.guild.id, codigo)
+    sessions.put(interaction.user.id, interaction.guild.id, codigo)
+    verification_events.record(interaction.guild.id, interaction.user.id, EVENT_STARTED)
+    # O envio acontece em segundo plano; o teclado chega na DM quando o e-mail sair (ver on_email_delivered)
+    with tracer.span("outbox.enqueue"):
+        email_id = await outbox.enqueue(interaction.user.id, interaction.guild.id, email, codigo, interaction.user.display_name, interaction.guild.name)
+    pending_interactions[email_id] = interaction
+    await interaction.followup.send("📨 **Estamos enviando seu código por e-mail!** Assim que ele sair, o teclado de verificação chegará na sua DM.", ephemeral=True)
 
 # --- COMANDOS DE ADMINISTRAÇÃO ---
 @bot.tree.command(name="configurar", description="Configura os cargos de verificação e o canal de logs.")
@@ -296,10 +669,7 @@ async def configurar(interaction: discord.Interaction,
                      cargo_nao_verificado: discord.Role, 
                      canal_logs: discord.TextChannel): # Certifique-se que é TextChannel
 
-    print(f"[DEBUG - COMANDO CONFIGURAR] Interação recebida de {interaction.user.name} no servidor {interaction.guild.name}.")
-    print(f"[DEBUG - COMANDO CONFIGURAR] Cargo Verificado recebido: {cargo_verificado.name} ({cargo_verificado.id})")
-    print(f"[DEBUG - COMANDO CONFIGURAR] Cargo Não Verificado recebido: {cargo_nao_verificado.name} ({cargo_nao_verificado.id})")
-    print(f"[DEBUG - COMANDO CONFIGURAR] Canal de Logs recebido: {canal_logs.name} ({canal_logs.id})")
+    logger.debug("configurar guild_id=%s user_id=%s verificado=%s nao_verificado=%s canal_logs=%s", interaction.guild.id, interaction.user.id, cargo_verificado.id, cargo_nao_verificado.id, canal_logs.id)
 
     # Verifica se os cargos são válidos
     if cargo_verificado.id == cargo_nao_verificado.id:
@@ -307,7 +677,7 @@ async def configurar(interaction: discord.Interaction,
         return
 
     # Verifica se o cargo do bot está acima dos cargos de verificação
-    bot_member = interaction.guild.get_member(bot.user.id)
+    bot_member = interaction.guild.me
     if bot_member and bot_member.top_role < cargo_verificado:
         await interaction.response.send_message(
             f"🚨 O cargo do Astro (`{bot_member.top_role.name}`) precisa estar acima do cargo de verificado (`{cargo_verificado.name}`) na hierarquia de cargos para poder gerenciar as permissões. Por favor, ajuste a ordem dos cargos nas configurações do servidor.", 
@@ -322,7 +692,7 @@ async def configurar(interaction: discord.Interaction,
         return
 
     # Salva as configurações
-    db.set_settings(
+    await adb.set_settings(
         interaction.guild.id, 
         cargo_verificado.id, 
         cargo_nao_verificado.id, 
@@ -330,8 +700,6 @@ async def configurar(interaction: discord.Interaction,
         "default_email_domain" # Este argumento `allowed_domains` é um resquício. Não impacta mais o DB.
     )
 
-    print(f"[DEBUG - COMANDO CONFIGURAR] Valores passados para db.set_settings: Guild ID={interaction.guild.id}, Verificado ID={cargo_verificado.id}, Não Verificado ID={cargo_nao_verificado.id}, Canal Logs ID={canal_logs.id}")
-
     embed = discord.Embed(
         title="Configuração Atualizada!",
         description="As configurações de verificação do servidor foram salvas com sucesso.",
@@ -356,19 +724,16 @@ async def configurar(interaction: discord.Interaction,
         # OU, para um teste mais direto sem depender do log_action:
         if canal_logs:
             await canal_logs.send(embed=test_embed)
-            print("[DEBUG - COMANDO CONFIGURAR] Embed de teste enviado diretamente para o canal de logs.")
-        else:
-            print("[DEBUG - COMANDO CONFIGURAR] Canal de logs é None após configuração, não foi possível enviar teste direto.")
+            logger.debug("embed de teste enviado guild_id=%s channel_id=%s", interaction.guild.id, canal_logs.id)
 
-    except Exception as e:
-        print(f"[DEBUG - COMANDO CONFIGURAR] ERRO ao enviar embed de teste após configuração: {e}")
-        traceback.print_exc()
+    except Exception:
+        logger.exception("erro ao enviar embed de teste guild_id=%s", interaction.guild.id)
 
 @bot.tree.command(name="verificar_manual", description="[Admin] Verifica um membro manualmente.")
 @app_commands.checks.has_permissions(manage_roles=True)
 @app_commands.describe(membro="O membro a ser verificado.")
 async def verificar_manual(interaction: discord.Interaction, membro: discord.Member):
-    verified_role_id, unverified_role_id, _, _ = db.get_settings(interaction.guild.id)
+    verified_role_id, unverified_role_id, _, _ = await adb.get_settings(interaction.guild.id)
     if not verified_role_id or not unverified_role_id:
         return await interaction.response.send_message("❌ Cargos não configurados.", ephemeral=True)
     verified_role = interaction.guild.get_role(verified_role_id)
@@ -376,9 +741,11 @@ async def verificar_manual(interaction: discord.Interaction, membro: discord.Mem
         return await interaction.response.send_message(f"ℹ️ O membro {membro.mention} já está verificado.", ephemeral=True)
     unverified_role = interaction.guild.get_role(unverified_role_id)
     if verified_role and unverified_role:
+        role_queue.discard(interaction.guild.id, membro.id)
         await membro.remove_roles(unverified_role, reason="Verificação manual")
         await membro.add_roles(verified_role, reason="Verificação manual")
-        db.add_verified_user(membro.id, interaction.guild.id)
+        member_cache.invalidate(interaction.guild.id, membro.id)
+        await adb.add_verified_user(membro.id, interaction.guild.id)
         await interaction.response.send_message(f"✅ `{membro.display_name}` verificado manualmente.", ephemeral=True)
         log_embed = discord.Embed(title="ℹ️ Verificação Manual", color=discord.Color.light_grey())
         log_embed.add_field(name="Membro Verificado", value=f"{membro.mention} (`{membro.id}`)", inline=False)
@@ -387,12 +754,156 @@ async def verificar_manual(interaction: discord.Interaction, membro: discord.Mem
     else:
         await interaction.response.send_message("❌ Não encontrei um dos cargos configurados.", ephemeral=True)
 
+# --- VERIFICAÇÃO EM MASSA ---
+bulk_jobs = {} # guild_id -> BulkVerificationJob (um job por servidor)
+
+def bulk_progress_text(job):
+    return f"⏳ **Verificando membros...** {job.processed}/{job.total} processados: {job.verified} verificados, {job.skipped} ignorados, {job.failed} falhas."
+
+class BulkVerificationView(discord.ui.View):
+    def __init__(self, job):
+        super().__init__(timeout=None)
+        self.job = job
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        return interaction.user.guild_permissions.manage_roles
+
+    @discord.ui.button(label="Cancelar", emoji="✖️", style=discord.ButtonStyle.danger)
+    async def cancel_job(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.job.cancel()
+        button.disabled = True
+        await interaction.response.edit_message(content="⏳ **Cancelando...** O lote em andamento será salvo.", view=self)
+
+@bot.tree.command(name="verificar_em_massa", description="[Admin] Verifica todos os membros de um cargo ou de uma lista de IDs.")
+@app_commands.checks.has_permissions(manage_roles=True)
+@app_commands.describe(cargo="Verifica todos os membros com este cargo.", arquivo="Arquivo .txt/.csv com os IDs dos membros.")
+async def verificar_em_massa(interaction: discord.Interaction, cargo: discord.Role = None, arquivo: discord.Attachment = None):
+    guild = interaction.guild
+    if (cargo is None) == (arquivo is None):
+        return await interaction.response.send_message("❌ Informe um cargo **ou** um arquivo com IDs.", ephemeral=True)
+    if (job := bulk_jobs.get(guild.id)) and not job.task.done():
+        return await interaction.response.send_message(f"ℹ️ Já existe uma verificação em massa em andamento ({job.processed}/{job.total}).", ephemeral=True)
+    verified_role_id, unverified_role_id, _, _ = await adb.get_settings(guild.id)
+    verified_role = guild.get_role(verified_role_id) if verified_role_id else None
+    unverified_role = guild.get_role(unverified_role_id) if unverified_role_id else None
+    if not verified_role or not unverified_role:
+        return await interaction.response.send_message("❌ Cargos de verificação não configurados.", ephemeral=True)
+    await interaction.response.defer(ephemeral=True)
+
+    nao_encontrados = 0
+    if cargo:
+        members = [m async for m in iter_guild_members(guild) if m.get_role(cargo.id)]
+    else:
+        if arquivo.size > BULK_VERIFY_MAX_FILE_SIZE:
+            return await interaction.followup.send(f"❌ Arquivo grande demais (máximo de {BULK_VERIFY_MAX_FILE_SIZE // (1024 * 1024)} MB).", ephemeral=True)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "membros.txt")
+            try:
+                await download_attachment(arquivo, path, {"bytes": 0})
+            except aiohttp.ClientError as e:
+                return await interaction.followup.send(f"❌ Não consegui baixar o arquivo: `{e}`", ephemeral=True)
+            # A regex percorre o arquivo inteiro: numa thread, para não travar o event loop (e o heartbeat do gateway)
+            member_ids = await asyncio.to_thread(parse_member_ids, path)
+        members = await member_cache.get_many(guild, member_ids)
+        nao_encontrados = len(member_ids) - len(members)
+    members = [m for m in members if not m.bot and verified_role not in m.roles]
+    if not members:
+        return await interaction.followup.send(f"ℹ️ Nenhum membro para verificar ({nao_encontrados} IDs não encontrados no servidor).", ephemeral=True)
+
+    async def on_progress(job):
+        try:
+            await interaction.edit_original_response(content=bulk_progress_text(job))
+        except discord.HTTPException:
+            pass # O token da interação expira em 15 minutos; o resumo final vai para o canal de logs
+
+    async def on_done(job):
+        await report_bulk_verification(job, interaction, cargo, arquivo, nao_encontrados)
+
+    # O comando responde logo e o resumo sai quando o job termina (pode levar horas), fora do trace e da latência do comando
+    job = bulk_jobs[guild.id] = BulkVerificationJob(guild, members, verified_role, unverified_role, interaction.user,
+                                                    rate=BULK_VERIFY_RATE, chunk_size=BULK_VERIFY_CHUNK, on_progress=on_progress,
+                                                    on_verified=lambda member: role_queue.discard(member.guild.id, member.id), on_done=on_done)
+    job.start()
+    await interaction.followup.send(bulk_progress_text(job), view=BulkVerificationView(job), ephemeral=True)
+
+async def report_bulk_verification(job, interaction, cargo, arquivo, nao_encontrados):
+    if job.error: titulo, cor = "❌ Verificação em Massa Interrompida", discord.Color.red()
+    elif job.cancelled: titulo, cor = "✖️ Verificação em Massa Cancelada", discord.Color.orange()
+    else: titulo, cor = "✅ Verificação em Massa Concluída", discord.Color.green()
+    resumo = f"**{job.verified}** verificados, **{job.skipped}** ignorados, **{job.failed}** falhas de {job.total} membros em {format_seconds(job.elapsed())}."
+    if nao_encontrados: resumo += f"\n{nao_encontrados} IDs do arquivo não estão no servidor."
+    if job.error: resumo += f"\nMotivo: {job.error}."
+    try:
+        await interaction.edit_original_response(content=f"**{titulo}**\n{resumo}", view=None)
+    except discord.HTTPException:
+        pass
+    log_embed = discord.Embed(title=titulo, color=cor, description=resumo)
+    log_embed.add_field(name="Origem", value=cargo.mention if cargo else f"Arquivo `{arquivo.filename}`", inline=False)
+    log_embed.add_field(name="Moderador", value=f"{interaction.user.mention} (`{interaction.user.id}`)", inline=False)
+    await log_action(job.guild, embed=log_embed)
+
+# --- RECONCILIAÇÃO ---
+reconcile_stats = {} # guild_id -> resultado da última reconciliação
+reconciling = set()
+
+async def reconcile_and_report(guild, moderator=None):
+    # Retorna o resultado, ou uma mensagem de erro se o servidor não puder ser reconciliado agora
+    verified_role_id, *_ = await adb.get_settings(guild.id)
+    verified_role = guild.get_role(verified_role_id) if verified_role_id else None
+    if not verified_role: return "cargo de verificado não configurado"
+    if guild.id in reconciling: return "já existe uma reconciliação em andamento"
+    reconciling.add(guild.id)
+    try:
+        result = reconcile_stats[guild.id] = await reconcile_guild(guild, verified_role)
+    finally:
+        reconciling.discard(guild.id)
+    drift = result["added"] + result["removed_left"] + result["removed_no_role"]
+    if drift or moderator:
+        log_embed = discord.Embed(title="🔄 Reconciliação de Verificados", color=discord.Color.orange() if drift else discord.Color.green(),
+                                  description=f"{drift} divergência(s) corrigida(s) entre o banco e o cargo {verified_role.mention}.")
+        log_embed.add_field(name="Adicionados (tinham o cargo)", value=str(result["added"]), inline=True)
+        log_embed.add_field(name="Removidos (saíram)", value=str(result["removed_left"]), inline=True)
+        log_embed.add_field(name="Removidos (sem o cargo)", value=str(result["removed_no_role"]), inline=True)
+        log_embed.set_footer(text=f"{result['verified']} verificados de {result['members']} membros" + (f" • Ação por: {moderator}" if moderator else ""))
+        await log_action(guild, embed=log_embed)
+    return result
+
+@bot.tree.command(name="reconciliar", description="[Admin] Corrige o registro de verificados com base no cargo de verificado.")
+@app_commands.checks.has_permissions(manage_roles=True)
+async def reconciliar(interaction: discord.Interaction):
+    await interaction.response.defer(ephemeral=True)
+    result = await reconcile_and_report(interaction.guild, interaction.user)
+    if isinstance(result, str):
+        return await interaction.followup.send(f"❌ Não foi possível reconciliar: {result}.", ephemeral=True)
+    await interaction.followup.send(f"✅ **Reconciliação concluída.** {result['added']} adicionados, {result['removed_left'] + result['removed_no_role']} removidos "
+                                    f"({result['verified']} verificados de {result['members']} membros).", ephemeral=True)
+
+# --- ESTATÍSTICAS ---
+@bot.tree.command(name="estatisticas", description="[Admin] Mostra o funil de verificação do servidor.")
+@app_commands.checks.has_permissions(manage_roles=True)
+@app_commands.describe(dias="Período analisado, em dias (padrão: 30).")
+async def estatisticas(interaction: discord.Interaction, dias: app_commands.Range[int, 1, 365] = 30):
+    await interaction.response.defer(ephemeral=True)
+    counts, histogram = await adb.get_verification_stats(interaction.guild.id, time.time() - dias * 86400)
+    iniciadas, verificadas = counts.get(EVENT_STARTED, 0), counts.get(EVENT_VERIFIED, 0)
+    embed = discord.Embed(title=f"📊 Verificações nos últimos {dias} dia(s)", color=discord.Color.blue())
+    funil = [("Iniciadas", EVENT_STARTED), ("Falha no e-mail", EVENT_EMAIL_FAILED), ("Falha na DM", EVENT_DM_FAILED), ("Códigos incorretos", EVENT_WRONG_CODE),
+             ("Tentativas excedidas", EVENT_ATTEMPTS_EXCEEDED), ("Expiradas", EVENT_EXPIRED), ("Verificadas", EVENT_VERIFIED)]
+    for nome, evento in funil:
+        embed.add_field(name=nome, value=str(counts.get(evento, 0)), inline=True)
+    conversao = f"{verificadas / iniciadas:.1%}" if iniciadas else "—"
+    mediana = median_from_histogram(histogram)
+    embed.add_field(name="Conversão", value=conversao, inline=True)
+    embed.add_field(name="Tempo mediano até verificar", value=f"~{format_seconds(mediana)}" if mediana is not None else "—", inline=True)
+    embed.set_footer(text="Dados agregados por hora (UTC); eventos dos últimos segundos podem ainda não aparecer.")
+    await interaction.followup.send(embed=embed, ephemeral=True)
+
 @bot.tree.command(name="desverificar", description="[Admin] Remove a verificação de um membro.")
 @app_commands.checks.has_permissions(manage_roles=True)
 @app_commands.describe(membro="O membro que será desverificado.", motivo="O motivo para a remoção da verificação.")
 async def desverificar(interaction: discord.Interaction, membro: discord.Member, motivo: str):
     await interaction.response.defer(ephemeral=True)
-    verified_role_id, unverified_role_id, _, _ = db.get_settings(interaction.guild.id)
+    verified_role_id, unverified_role_id, _, _ = await adb.get_settings(interaction.guild.id)
     if not verified_role_id or not unverified_role_id:
         return await interaction.followup.send("❌ Cargos de verificação não configurados.", ephemeral=True)
     verified_role = interaction.guild.get_role(verified_role_id)
@@ -404,7 +915,8 @@ async def desverificar(interaction: discord.Interaction, membro: discord.Member,
     try:
         await membro.remove_roles(verified_role, reason=f"Desverificado por {interaction.user}. Motivo: {motivo}")
         await membro.add_roles(unverified_role, reason=f"Desverificado por {interaction.user}. Motivo: {motivo}")
-        db.remove_verified_user(membro.id, interaction.guild.id)
+        member_cache.invalidate(interaction.guild.id, membro.id)
+        await adb.remove_verified_user(membro.id, interaction.guild.id)
         await interaction.followup.send(f"✅ O membro {membro.mention} foi desverificado.", ephemeral=True)
         log_embed = discord.Embed(title="❗ Membro Desverificado", color=discord.Color.orange())
         log_embed.add_field(name="Membro", value=membro.mention, inline=False)
@@ -427,9 +939,9 @@ async def info_membro(interaction: discord.Interaction, membro: discord.Member):
         embed.add_field(name="Entrou no Servidor", value=f"<t:{int(membro.joined_at.timestamp())}:F>", inline=False)
     embed.add_field(name="Conta Criada em", value=f"<t:{int(membro.created_at.timestamp())}:F>", inline=False)
     
-    verified_at = db.get_verified_user(membro.id, interaction.guild.id)
+    verified_at = await adb.get_verified_user(membro.id, interaction.guild.id)
     if verified_at: status = f"✅ Verificado em <t:{verified_at}:f>"
-    elif db.get_verification(membro.id): status = "⏳ Verificação Pendente"
+    elif await adb.get_verification(membro.id, interaction.guild.id): status = "⏳ Verificação Pendente"
     else: status = "❌ Não Verificado"
     embed.add_field(name="Status da Verificação", value=status, inline=False)
     
@@ -445,7 +957,7 @@ async def guia_staff(interaction: discord.Interaction):
     embed = discord.Embed(title="📘 Guia de Configuração e Uso do Bot", color=discord.Color.blue())
     embed.add_field(name="PASSO 1: Configuração", value=f"Use `/configurar` para definir os cargos (`verificado`, `não verificado`) e o `canal de logs`.", inline=False)
     embed.add_field(name="⚠️ PASSO 2: Hierarquia de Cargos", value=f"O cargo do bot deve estar **ACIMA** dos cargos que ele precisa gerenciar.", inline=False)
-    embed.add_field(name="Comandos de Staff", value=f"• `/verificar_manual <membro>`\n• `/status_verificacao <membro>`\n• `/seguranca bloqueio <ativar>`\n• `/desverificar <membro> <motivo>`\n• `/info-membro <membro>`", inline=False)
+    embed.add_field(name="Comandos de Staff", value=f"• `/verificar_manual <membro>`\n• `/verificar_em_massa <cargo|arquivo>`\n• `/reconciliar`\n• `/estatisticas [dias]`\n• `/status_verificacao <membro>`\n• `/seguranca bloqueio <ativar>`\n• `/seguranca raid <limite> <segundos>`\n• `/desverificar <membro> <motivo>`\n• `/info-membro <membro>`", inline=False)
     embed.set_footer(text="Comandos de domínio são restritos ao Dono do Bot.")
     await interaction.response.send_message(embed=embed, ephemeral=True)
 
@@ -454,15 +966,15 @@ async def guia_staff(interaction: discord.Interaction):
 @app_commands.describe(membro="O membro que você deseja checar.")
 async def status_verificacao(interaction: discord.Interaction, membro: discord.Member):
     await interaction.response.defer(ephemeral=True)
-    verified_role_id, *_, lockdown_enabled = db.get_settings(interaction.guild.id)
+    verified_role_id, *_, lockdown_enabled = await adb.get_settings(interaction.guild.id)
     role = interaction.guild.get_role(verified_role_id) if verified_role_id else None
     if not role: return await interaction.followup.send("❌ Cargo de verificado não configurado.", ephemeral=True)
     if role in membro.roles:
         embed = discord.Embed(title="Status: Concluído", description=f"✅ {membro.mention} já está verificado.", color=discord.Color.green())
         return await interaction.followup.send(embed=embed)
-    if verification_data := db.get_verification(membro.id):
-        *_, attempts, created_at_timestamp, current_input = verification_data
-        expiry_time = created_at_timestamp + 600
+    if session := await get_session(membro.id, interaction.guild.id):
+        attempts, created_at_timestamp, current_input = session.attempts, session.created_at, session.current_input
+        expiry_time = session.expires_at(VERIFICATION_TTL)
         embed = discord.Embed(title="Status: Pendente", description=f"⏳ {membro.mention} iniciou o processo.", color=discord.Color.gold())
         embed.add_field(name="Tentativas", value=f"`{attempts} de 3`", inline=True)
         embed.add_field(name="Código Digitado", value=f"`{current_input or 'Nenhum'}`", inline=True)
@@ -479,9 +991,10 @@ async def bloquear_dominio(interaction: discord.Interaction, dominio: str):
     if interaction.user.id != BOT_OWNER_ID:
         return await interaction.response.send_message("❌ Este comando é restrito ao dono do bot.", ephemeral=True)
     
-    dominio_limpo = dominio.lower().strip().replace('@', '')
+    dominio_limpo = normalize_domain(dominio)
 
-    db.add_blocked_domain(dominio_limpo)
+    await adb.add_blocked_domain(dominio_limpo)
+    blocklist.add(dominio_limpo)
     await interaction.response.send_message(f"✅ O domínio `{dominio_limpo}` foi adicionado à lista de bloqueio.", ephemeral=True)
 
 @bot.tree.command(name="desbloquear_dominio", description="[Dono do Bot] Remove um domínio da lista de bloqueio.")
@@ -494,24 +1007,102 @@ async def desbloquear_dominio(interaction: discord.Interaction, dominio: str):
     dominio_limpo = dominio_input.replace('@', '')
     
     # Tenta remover tanto a versão limpa quanto a versão com @
-    removido_limpo = db.remove_blocked_domain(dominio_limpo)
-    removido_sujo = db.remove_blocked_domain(dominio_input)
+    removido_limpo = await adb.remove_blocked_domain(dominio_limpo)
+    removido_sujo = await adb.remove_blocked_domain(dominio_input)
 
     if removido_limpo > 0 or removido_sujo > 0:
+        blocklist.discard(dominio_limpo)
         await interaction.response.send_message(f"✅ O domínio relacionado a `{dominio}` foi removido da lista de bloqueio.", ephemeral=True)
     else:
         await interaction.response.send_message(f"⚠️ O domínio `{dominio}` não foi encontrado na lista de bloqueio.", ephemeral=True)
 
 @bot.tree.command(name="listar_dominios_bloqueados", description="[Dono do Bot] Mostra todos os domínios bloqueados.")
-async def listar_dominios_bloqueados(interaction: discord.Interaction):
+@app_commands.describe(prefixo="Mostra apenas os domínios que começam com este texto.")
+async def listar_dominios_bloqueados(interaction: discord.Interaction, prefixo: str = None):
     if interaction.user.id != BOT_OWNER_ID:
         return await interaction.response.send_message("❌ Este comando é restrito ao dono do bot.", ephemeral=True)
-    dominios = db.get_all_blocked_domains()
-    if not dominios:
+    view = BlockedDomainsView(interaction.user.id, normalize_domain(prefixo or ""))
+    await view.load()
+    if not view.page and not view.prefix:
         return await interaction.response.send_message("ℹ️ Não há nenhum domínio bloqueado no momento.", ephemeral=True)
-    descricao = "\n".join([f"- `{d}`" for d in dominios])
-    embed = discord.Embed(title="🚫 Domínios de E-mail Bloqueados", description=descricao, color=discord.Color.orange())
-    await interaction.response.send_message(embed=embed, ephemeral=True)
+    await interaction.response.send_message(embed=view.create_embed(), view=view, ephemeral=True)
+
+async def report_progress(interaction: discord.Interaction, progress: dict, interval: float = 3):
+    # Edita a resposta periodicamente enquanto uma tarefa longa roda
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await interaction.edit_original_response(content=f"⏳ **{progress['etapa'].capitalize()}...** {progress['bytes'] / 1024:.0f} KB baixados, {progress['linhas']} domínios processados.")
+        except discord.HTTPException:
+            pass
+
+async def download_attachment(attachment: discord.Attachment, path: str, progress: dict):
+    # Baixa o anexo em blocos direto para o disco, sem manter o arquivo inteiro na memória
+    async with aiohttp.ClientSession() as session:
+        async with session.get(attachment.url) as resp:
+            resp.raise_for_status()
+            with open(path, "wb") as f:
+                async for chunk in resp.content.iter_chunked(64 * 1024):
+                    f.write(chunk)
+                    progress["bytes"] += len(chunk)
+
+@bot.tree.command(name="importar_dominios", description="[Dono do Bot] Bloqueia em massa os domínios de um arquivo .txt/.csv.")
+@app_commands.describe(arquivo="Arquivo com um domínio por linha (ou na primeira coluna do CSV).")
+async def importar_dominios(interaction: discord.Interaction, arquivo: discord.Attachment):
+    if interaction.user.id != BOT_OWNER_ID:
+        return await interaction.response.send_message("❌ Este comando é restrito ao dono do bot.", ephemeral=True)
+    await interaction.response.defer(ephemeral=True)
+
+    progress = {"etapa": "baixando", "bytes": 0, "linhas": 0}
+    reporter = asyncio.create_task(report_progress(interaction, progress))
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "dominios.txt")
+            await download_attachment(arquivo, path, progress)
+            progress["etapa"] = "importando"
+            processados, novos = await adb.import_blocked_domains(path, progress)
+    except aiohttp.ClientError as e:
+        return await interaction.edit_original_response(content=f"❌ Não consegui baixar o arquivo: `{e}`")
+    finally:
+        reporter.cancel()
+
+    blocklist.load(await adb.get_all_blocked_domains())
+    await interaction.edit_original_response(content=f"✅ **Importação concluída.** {processados} domínios lidos, {novos} novos adicionados. A lista agora tem {len(blocklist)} domínios.")
+
+@bot.tree.command(name="exportar_dominios", description="[Dono do Bot] Exporta a lista de domínios bloqueados como arquivo.")
+async def exportar_dominios(interaction: discord.Interaction):
+    if interaction.user.id != BOT_OWNER_ID:
+        return await interaction.response.send_message("❌ Este comando é restrito ao dono do bot.", ephemeral=True)
+    await interaction.response.defer(ephemeral=True)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "dominios_bloqueados.txt")
+        total = await adb.export_blocked_domains(path)
+        await interaction.followup.send(f"📄 {total} domínios bloqueados exportados.", file=discord.File(path, filename="dominios_bloqueados.txt"), ephemeral=True)
+
+@bot.tree.command(name="rastreamento", description="[Dono do Bot] Liga/desliga o rastreamento de desempenho dos comandos.")
+@app_commands.describe(ativar="Liga ou desliga o rastreamento.", amostragem="Fração das interações rastreadas (0 a 1; ex.: 0.01 = 1%).")
+async def rastreamento(interaction: discord.Interaction, ativar: bool = None, amostragem: app_commands.Range[float, 0.0, 1.0] = None):
+    if interaction.user.id != BOT_OWNER_ID:
+        return await interaction.response.send_message("❌ Este comando é restrito ao dono do bot.", ephemeral=True)
+    tracer.configure(ativar, amostragem)
+    stats = tracer.stats()
+    estado = "ativado" if stats["enabled"] else "desativado"
+    await interaction.response.send_message(f"🔎 Rastreamento **{estado}**, amostragem de **{stats['sample_rate']:.1%}**. "
+                                            f"{stats['buffered']}/{stats['capacity']} traces no buffer ({stats['recorded']} registrados no total).", ephemeral=True)
+
+@bot.tree.command(name="exportar_rastreamento", description="[Dono do Bot] Exporta os traces recentes no formato do Chrome (chrome://tracing).")
+@app_commands.describe(limpar="Esvazia o buffer depois de exportar.")
+async def exportar_rastreamento(interaction: discord.Interaction, limpar: bool = False):
+    if interaction.user.id != BOT_OWNER_ID:
+        return await interaction.response.send_message("❌ Este comando é restrito ao dono do bot.", ephemeral=True)
+    if not len(tracer):
+        return await interaction.response.send_message("ℹ️ Nenhum trace registrado. Use `/rastreamento ativar:True`.", ephemeral=True)
+    await interaction.response.defer(ephemeral=True)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "astro_trace.json")
+        total = tracer.dump(path)
+        await interaction.followup.send(f"📄 {total} traces exportados. Abra em chrome://tracing ou ui.perfetto.dev.", file=discord.File(path, filename="astro_trace.json"), ephemeral=True)
+    if limpar: tracer.clear()
 
 # --- GRUPO DE COMANDOS DE SEGURANÇA ---
 seguranca_group = app_commands.Group(name="seguranca", description="Comandos para gerenciar a segurança do servidor.")
@@ -521,50 +1112,78 @@ seguranca_group = app_commands.Group(name="seguranca", description="Comandos par
 async def lockdown(interaction: discord.Interaction, ativar: bool):
     if not interaction.user.guild_permissions.administrator:
         return await interaction.response.send_message("❌ Você precisa ser um administrador para usar este comando.", ephemeral=True)
-    db.set_lockdown(interaction.guild.id, ativar)
+    await adb.set_lockdown(interaction.guild.id, ativar)
     status_text, color = ("ATIVADO", discord.Color.red()) if ativar else ("DESATIVADO", discord.Color.green())
     await interaction.response.send_message(f"✅ Modo de Bloqueio (Lockdown) foi **{status_text}**.", ephemeral=True)
     log_embed = discord.Embed(title=f"🛡️ Modo de Segurança {status_text}", color=color)
     log_embed.set_footer(text=f"Ação por: {interaction.user}")
     await log_action(interaction.guild, embed=log_embed)
 
+@seguranca_group.command(name="raid", description="[Admin] Configura a detecção de raid do servidor.")
+@app_commands.describe(limite="Quantidade de entradas que dispara o alerta.", segundos="Janela de tempo, em segundos.", bloqueio_automatico="Ativa o modo de segurança automaticamente quando um raid for detectado.")
+async def raid(interaction: discord.Interaction, limite: app_commands.Range[int, 2, 1000], segundos: app_commands.Range[int, 5, 3600], bloqueio_automatico: bool = False):
+    if not interaction.user.guild_permissions.administrator:
+        return await interaction.response.send_message("❌ Você precisa ser um administrador para usar este comando.", ephemeral=True)
+    await adb.set_raid_settings(interaction.guild.id, limite, segundos, bloqueio_automatico)
+    automatico = "ativado" if bloqueio_automatico else "desativado"
+    await interaction.response.send_message(f"✅ Alerta de raid: **{limite}** entradas em **{segundos}** segundos. Bloqueio automático **{automatico}**.", ephemeral=True)
+    log_embed = discord.Embed(title="🛡️ Detecção de Raid Atualizada", color=discord.Color.blue())
+    log_embed.add_field(name="Limite", value=f"{limite} entradas em {segundos}s", inline=True)
+    log_embed.add_field(name="Bloqueio Automático", value=automatico.capitalize(), inline=True)
+    log_embed.set_footer(text=f"Ação por: {interaction.user}")
+    await log_action(interaction.guild, embed=log_embed)
+
 bot.tree.add_command(seguranca_group)
 
 # --- EVENTOS DO BOT ---
 @bot.event
 async def on_member_join(member: discord.Member):
     if member.bot: return
-    now = time.time()
-    if member.guild.id not in recent_joins:
-        recent_joins[member.guild.id] = deque()
-    recent_joins[member.guild.id].append(now)
-    while recent_joins[member.guild.id] and now - recent_joins[member.guild.id][0] > RAID_THRESHOLD_SECONDS:
-        recent_joins[member.guild.id].popleft()
-    if len(recent_joins[member.guild.id]) >= RAID_THRESHOLD_COUNT:
+    threshold_count, threshold_seconds, auto_lockdown = await adb.get_raid_settings(member.guild.id)
+    if joins := raid_detector.record(member.guild.id, time.time(), threshold_seconds, threshold_count):
         alert_embed = discord.Embed(title="🚨 ALERTA DE RAID DETECTADO!", color=discord.Color.dark_red())
-        alert_embed.add_field(name="Atividade Suspeita", value=f"**{len(recent_joins[member.guild.id])}** membros entraram nos últimos {RAID_THRESHOLD_SECONDS} segundos.", inline=False)
+        alert_embed.add_field(name="Atividade Suspeita", value=f"**{joins}** membros entraram nos últimos {threshold_seconds} segundos.", inline=False)
         alert_embed.add_field(name="Ação Imediata", value="@here Ação da staff é necessária.", inline=False)
-        alert_embed.add_field(name="Ação Recomendada", value="Use `/seguranca bloqueio ativar:True` para bloquear novas verificações.")
-        await log_action(member.guild, embed=alert_embed)
-        recent_joins[member.guild.id].clear()
+        if auto_lockdown:
+            await adb.set_lockdown(member.guild.id, True)
+            alert_embed.add_field(name="🔒 Bloqueio Automático", value="O modo de segurança foi **ATIVADO** automaticamente. Use `/seguranca bloqueio ativar:False` para desativar.")
+        else:
+            alert_embed.add_field(name="Ação Recomendada", value="Use `/seguranca bloqueio ativar:True` para bloquear novas verificações.")
+        await log_action(member.guild, embed=alert_embed, priority=PRIORITY_HIGH)
     
     # CORREÇÃO AQUI: Desempacota 4 valores
-    _, unverified_role_id, _, _ = db.get_settings(member.guild.id)
+    _, unverified_role_id, _, _ = await adb.get_settings(member.guild.id)
     if unverified_role_id and (role := member.guild.get_role(unverified_role_id)):
-        try:
-            await member.add_roles(role, reason="Novo membro.")
-        except discord.Forbidden:
-            log_embed = discord.Embed(title="🔥 Erro de Permissão na Entrada", color=discord.Color.red(), description=f"Não foi possível atribuir o cargo de não verificado para {member.mention}.")
-            await log_action(member.guild, embed=log_embed)
+        # O cargo é aplicado pela fila do servidor, no ritmo do rate limit, para não travar durante raids
+        role_queue.enqueue(member, role, reason="Novo membro.")
+
+@bot.event
+async def on_raw_member_remove(payload: discord.RawMemberRemoveEvent):
+    # Evento raw: no perfil de memória baixo o membro não está em cache e o member_remove nunca é disparado
+    role_queue.discard(payload.guild_id, payload.user.id)
+    member_cache.invalidate(payload.guild_id, payload.user.id)
+
+async def on_role_assignment_forbidden(member: discord.Member, role: discord.Role):
+    log_embed = discord.Embed(title="🔥 Erro de Permissão na Entrada", color=discord.Color.red(), description=f"Não foi possível atribuir o cargo de não verificado para {member.mention}.")
+    await log_action(member.guild, embed=log_embed)
+
+async def verified_since_join(member: discord.Member, role: discord.Role):
+    # Verificado depois desta entrada (inclusive por outro processo do cluster, que não enxerga esta fila)
+    verified_at = await adb.get_verified_user(member.id, member.guild.id)
+    return verified_at is not None and member.joined_at is not None and verified_at >= int(member.joined_at.timestamp())
+
+role_queue = RoleAssignmentQueue(on_role_assignment_forbidden, rate=float(os.getenv("ROLE_QUEUE_RATE", 1.0)), burst=int(os.getenv("ROLE_QUEUE_BURST", 10)),
+                                 skip_if=verified_since_join)
 
 @bot.tree.error
 async def on_app_command_error(interaction: discord.Interaction, error: app_commands.AppCommandError):
+    observe_command(interaction, "check_failed" if isinstance(error, app_commands.CheckFailure) else "error")
     user_error_message = "🔴 Ocorreu um erro inesperado. A equipe de administração foi notificada."
     try:
         if interaction.response.is_done(): await interaction.followup.send(user_error_message, ephemeral=True)
         else: await interaction.response.send_message(user_error_message, ephemeral=True)
     except discord.NotFound:
-        print("Não foi possível notificar o usuário sobre um erro.")
+        logger.warning("não foi possível notificar o usuário sobre um erro.")
     error_embed = discord.Embed(title="🔥 Erro Inesperado em Comando", color=discord.Color.red())
     error_embed.add_field(name="Comando", value=f"`{interaction.command.name}`", inline=False)
     error_embed.add_field(name="Usuário", value=f"{interaction.user.mention} (`{interaction.user.id}`)", inline=False)
@@ -573,17 +1192,24 @@ async def on_app_command_error(interaction: discord.Interaction, error: app_comm
         error_embed.add_field(name="⚠️ Erro de Permissão", value="O bot não tem permissão. Verifique a hierarquia de cargos.", inline=False)
     traceback_str = ''.join(traceback.format_exception(type(original_error), original_error, original_error.__traceback__))
     error_embed.add_field(name="Traceback", value=f"```py\n{traceback_str[:1000]}\n...```", inline=False)
-    if interaction.guild: await log_action(interaction.guild, embed=error_embed)
+    if interaction.guild: await log_action(interaction.guild, embed=error_embed, priority=PRIORITY_HIGH)
+
+@bot.event
+async def on_app_command_completion(interaction: discord.Interaction, command):
+    observe_command(interaction, "ok")
 
 @bot.event
 async def on_ready():
-    print(f'Bot conectado como {bot.user}')
-    quantidade_servidores = len(bot.guilds)
-    print(f'O bot está em {quantidade_servidores} servidores.')
+    logger.info("Bot conectado como %s", bot.user)
+    logger.info("O bot está em %d servidores.", len(bot.guilds))
+    if not any(phase == "ready" for phase, _ in startup_phases):
+        mark_startup("ready")
+        total = sum(seconds for _, seconds in startup_phases)
+        logger.info("tempo até ready: %.2fs (%s)", total, ", ".join(f"{phase}={seconds:.2f}s" for phase, seconds in startup_phases))
     activity = discord.Game(name="Astro • Melhor bot de verificação!") 
     await bot.change_presence(status=discord.Status.online, activity=activity)
-    print(f"Status definido para 'Jogando {activity.name}'")
-    await bot.tree.sync()
-    print("Comandos sincronizados.")
+    logger.info("Status definido para 'Jogando %s'", activity.name)
 
-bot.run(os.getenv("DISCORD_TOKEN"))
\ No newline at end of file
+mark_startup("definitions")
+if __name__ == "__main__": # Importar o main sem conectar (benchmarks/bench_load.py) não inicia o bot
+    bot.run(os.getenv("DISCORD_TOKEN"), log_handler=None) # O logging já foi configurado acima
\ No newline at end of file
@@ -0,0 +1,77 @@
+import asyncio
+import os
+import time
+
+import discord
+
+from cache import LRUCache
+
+# --- PERFIL DE CACHE DE MEMBROS ---
+# "full": comportamento padrão do discord.py (todos os membros de todos os servidores na memória, carregados na
+# inicialização). "low": sem chunking na inicialização, sem cache de membros nem de mensagens; os membros são
+# buscados sob demanda (fetch_member) e os mais recentes ficam num LRU pequeno, com validade de ttl segundos
+# para que mudanças de cargo feitas fora do bot não fiquem velhas por muito tempo.
+# A memória deixa de crescer com o total de membros: fica limitada ao tamanho do LRU.
+MEMBER_CACHE_PROFILE = os.getenv("MEMBER_CACHE_PROFILE", "full").lower()
+
+def client_options():
+    # Opções extras para o construtor do bot, conforme o perfil
+    if MEMBER_CACHE_PROFILE != "low": return {}
+    return {"chunk_guilds_at_startup": False, "member_cache_flags": discord.MemberCacheFlags.none(), "max_messages": None}
+
+class MemberCache:
+    def __init__(self, maxsize=1000, ttl=300):
+        self.ttl = ttl
+        self.fetches = 0
+        self._cache = LRUCache(maxsize)
+
+    def stats(self):
+        return {**self._cache.stats(), "fetches": self.fetches}
+
+    def put(self, member: discord.Member):
+        self._cache.put((member.guild.id, member.id), (member, time.monotonic()))
+
+    def invalidate(self, guild_id, user_id):
+        self._cache.invalidate((guild_id, user_id))
+
+    async def get(self, guild: discord.Guild, user_id: int):
+        # Cache do discord.py (perfil "full") -> LRU -> API; retorna None se o usuário não estiver no servidor
+        if member := guild.get_member(user_id): return member
+        key = (guild.id, user_id)
+        entry = self._cache.get(key)
+        if entry and time.monotonic() - entry[1] < self.ttl: return entry[0]
+        try:
+            member = await guild.fetch_member(user_id)
+        except discord.NotFound:
+            self._cache.invalidate(key)
+            return None
+        self.fetches += 1
+        self.put(member)
+        return member
+
+    async def get_many(self, guild: discord.Guild, user_ids, chunk_size=100):
+        # Para listas grandes (verificação em massa): uma consulta ao gateway por bloco de 100 IDs, sem guardar no cache
+        members = []
+        missing = []
+        for user_id in user_ids:
+            if member := guild.get_member(user_id): members.append(member)
+            else: missing.append(user_id)
+        for start in range(0, len(missing), chunk_size):
+            members += await guild.query_members(user_ids=missing[start:start + chunk_size], cache=False)
+        return members
+
+async def iter_guild_members(guild: discord.Guild, chunk_size=1000):
+    # Percorre todos os membros: do cache, se o servidor estiver carregado, senão paginando pela API (1000 por página).
+    # Cede o loop a cada chunk_size membros.
+    if guild.chunked:
+        members = guild.members
+        for start in range(0, len(members), chunk_size):
+            for member in members[start:start + chunk_size]:
+                yield member
+            await asyncio.sleep(0)
+        return
+    count = 0
+    async for member in guild.fetch_members(limit=None):
+        yield member
+        count += 1
+        if count % chunk_size == 0: await asyncio.sleep(0)
@@ -0,0 +1,63 @@
+import asyncio
+import contextlib
+import logging
+
+import uvicorn
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+
+from metrics import REGISTRY
+
+logger = logging.getLogger("astro.metrics")
+
+# --- SERVIDOR DE MÉTRICAS ---
+# Servidor uvicorn rodando como uma task no próprio loop do bot (sem thread ou processo extra).
+# /metrics devolve o registro no formato texto do Prometheus; /health só responde ok.
+app = FastAPI(title="Astro", docs_url=None, redoc_url=None, openapi_url=None)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/health")
+async def health():
+    return {"status": "ok"}
+
+class _EmbeddedServer(uvicorn.Server):
+    # Quem cuida dos sinais (Ctrl+C, SIGTERM) é o bot; o servidor só para quando o bot fecha.
+    # install_signal_handlers é usado pelo uvicorn até a 0.28, capture_signals a partir da 0.29.
+    def install_signal_handlers(self):
+        pass
+
+    @contextlib.contextmanager
+    def capture_signals(self):
+        yield
+
+class MetricsServer:
+    def __init__(self, host="127.0.0.1", port=9100):
+        self.host = host
+        self.port = port
+        self._server = None
+        self._task = None
+
+    def start(self):
+        config = uvicorn.Config(app, host=self.host, port=self.port, log_level="warning", access_log=False, lifespan="off")
+        self._server = _EmbeddedServer(config)
+        self._task = asyncio.create_task(self._serve())
+        logger.info("métricas disponíveis em http://%s:%d/metrics", self.host, self.port)
+
+    async def _serve(self):
+        # O uvicorn chama sys.exit se não conseguir abrir a porta; um SystemExit numa task derrubaria o loop do bot
+        try:
+            await self._server.serve()
+        except SystemExit:
+            logger.error("não foi possível iniciar o servidor de métricas em %s:%d", self.host, self.port)
+
+    async def close(self):
+        if not self._task: return
+        self._server.should_exit = True
+        try:
+            await asyncio.wait_for(self._task, 5)
+        except asyncio.TimeoutError:
+            self._task.cancel()
+        self._task = None
@@ -0,0 +1,74 @@
+from collections import OrderedDict
+
+# --- DETECÇÃO DE RAID ---
+# Janela deslizante aproximada com contadores em baldes: cada servidor guarda BUCKETS contadores de tamanho
+# window / BUCKETS, então a memória por servidor é constante, não importa quantas entradas aconteçam.
+# O total da janela é mantido incrementalmente: ao avançar de balde, só os baldes que saíram da janela são zerados.
+# Servidores sem entradas há mais de idle_after segundos são descartados (o mais antigo fica no começo do OrderedDict).
+BUCKETS = 12
+
+class _GuildWindow:
+    __slots__ = ("width", "counts", "total", "slot", "last_seen")
+
+    def __init__(self, width, slot):
+        self.width = width
+        self.counts = [0] * BUCKETS
+        self.total = 0
+        self.slot = slot
+        self.last_seen = 0.0
+
+    def advance(self, slot):
+        # Zera os baldes entre o último usado e o atual (no máximo BUCKETS), tirando-os do total
+        if slot - self.slot >= BUCKETS:
+            self.counts = [0] * BUCKETS
+            self.total = 0
+        else:
+            counts = self.counts
+            for s in range(self.slot + 1, slot + 1):
+                i = s % BUCKETS
+                self.total -= counts[i]
+                counts[i] = 0
+        self.slot = slot
+
+class RaidDetector:
+    def __init__(self, idle_after=3600):
+        self.idle_after = idle_after
+        self.evicted = 0
+        self._guilds = OrderedDict()
+
+    def __len__(self):
+        return len(self._guilds)
+
+    def record(self, guild_id, now, window, threshold):
+        # Registra uma entrada; retorna o número de entradas na janela se o limite foi atingido, senão None
+        width = window / BUCKETS
+        slot = int(now // width)
+        guilds = self._guilds
+        state = guilds.get(guild_id)
+        if state is None or state.width != width:
+            state = guilds[guild_id] = _GuildWindow(width, slot)
+        elif slot > state.slot:
+            state.advance(slot)
+        guilds.move_to_end(guild_id)
+        state.last_seen = now
+        state.counts[slot % BUCKETS] += 1
+        state.total += 1
+        total = state.total
+
+        if now - next(iter(guilds.values())).last_seen > self.idle_after: self.evict_idle(now)
+        if total >= threshold:
+            # Zera a janela para não disparar um alerta por entrada durante o mesmo raid
+            state.counts = [0] * BUCKETS
+            state.total = 0
+            return total
+        return None
+
+    def evict_idle(self, now):
+        evicted = 0
+        while self._guilds:
+            guild_id, state = next(iter(self._guilds.items()))
+            if now - state.last_seen <= self.idle_after: break
+            del self._guilds[guild_id]
+            evicted += 1
+        self.evicted += evicted
+        return evicted
@@ -0,0 +1,39 @@
+import logging
+import time
+
+import async_database as adb
+from member_cache import iter_guild_members
+
+logger = logging.getLogger("astro.reconcile")
+
+# --- RECONCILIAÇÃO DE VERIFICADOS ---
+# O cargo de verificado é a fonte da verdade: verified_users é corrigido para bater com quem tem o cargo.
+# Os membros são percorridos em blocos de chunk_size (do cache ou paginando pela API, ver iter_guild_members),
+# cedendo o loop entre um bloco e outro, e a diferença é feita com conjuntos: quem tem o cargo e não está no banco
+# é adicionado; quem está no banco e saiu do servidor ou perdeu o cargo é removido. As correções são gravadas em lotes de write_batch com executemany.
+def _batches(items, size):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+async def reconcile_guild(guild, verified_role, chunk_size=500, write_batch=500):
+    started = time.perf_counter()
+    db_ids = set(await adb.get_verified_user_ids(guild.id))
+    member_ids, holders = set(), set()
+    async for member in iter_guild_members(guild, chunk_size):
+        member_ids.add(member.id)
+        if member.get_role(verified_role.id): holders.add(member.id)
+
+    missing = holders - db_ids
+    stale = db_ids - holders
+    left = stale - member_ids
+    for batch in _batches(missing, write_batch):
+        # keep_existing: se a linha apareceu no meio do caminho (verificação concluída agora), mantém o verified_at dela
+        await adb.add_verified_users([(user_id, guild.id) for user_id in batch], keep_existing=True)
+    for batch in _batches(stale, write_batch):
+        await adb.remove_verified_users([(user_id, guild.id) for user_id in batch])
+
+    result = {"members": len(member_ids), "verified": len(holders), "added": len(missing), "removed_left": len(left),
+              "removed_no_role": len(stale) - len(left), "duration": time.perf_counter() - started}
+    logger.log(logging.INFO if missing or stale else logging.DEBUG, "reconciliação guild_id=%s %s", guild.id, result)
+    return result
@@ -0,0 +1,122 @@
+import asyncio
+import logging
+import time
+
+import discord
+
+from rate_limit import TokenBucket
+
+logger = logging.getLogger("astro.roles")
+
+# --- FILA DE ATRIBUIÇÃO DE CARGOS ---
+# Cada servidor tem uma fila limitada e um worker próprio que aplica os cargos no ritmo do rate limit da rota
+# do Discord (token bucket por servidor + um bucket global), em vez de uma chamada REST por evento de entrada.
+# `pending` guarda quem ainda está na fila: entradas duplicadas são ignoradas e quem saiu do servidor (ou já se
+# verificou) é descartado. skip_if(member, role) é checado logo antes da chamada, depois da espera no rate limit.
+# Workers sem trabalho por idle_timeout segundos são encerrados.
+class _GuildQueue:
+    __slots__ = ("queue", "pending", "bucket", "task")
+
+    def __init__(self, max_queue, rate, burst):
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.pending = set()
+        self.bucket = TokenBucket(rate, burst)
+        self.task = None
+
+class RoleAssignmentQueue:
+    def __init__(self, on_forbidden=None, rate=1.0, burst=10, global_rate=40.0, max_queue=1000, idle_timeout=60, skip_if=None):
+        # on_forbidden(member, role) é uma coroutine chamada quando o bot não tem permissão para dar o cargo
+        self.on_forbidden = on_forbidden
+        self.skip_if = skip_if
+        self.rate = rate
+        self.burst = burst
+        self.max_queue = max_queue
+        self.idle_timeout = idle_timeout
+        self.assigned = 0
+        self.skipped = 0
+        self.dropped = 0
+        self.failed = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self._global_bucket = TokenBucket(global_rate, global_rate)
+        self._guilds = {}
+
+    def depth(self):
+        return sum(q.queue.qsize() for q in self._guilds.values())
+
+    def stats(self):
+        return {"guilds": len(self._guilds), "depth": self.depth(), "assigned": self.assigned, "skipped": self.skipped,
+                "dropped": self.dropped, "failed": self.failed, "last_lag": self.last_lag, "max_lag": self.max_lag}
+
+    def enqueue(self, member: discord.Member, role: discord.Role, reason=None):
+        guild_queue = self._guilds.get(member.guild.id)
+        if guild_queue is None:
+            guild_queue = self._guilds[member.guild.id] = _GuildQueue(self.max_queue, self.rate, self.burst)
+            guild_queue.task = asyncio.create_task(self._worker(member.guild.id, guild_queue))
+        if member.id in guild_queue.pending:
+            self.skipped += 1
+            return False
+        try:
+            guild_queue.queue.put_nowait((member, role, reason, time.monotonic()))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logger.warning("fila de cargos cheia guild_id=%s user_id=%s", member.guild.id, member.id)
+            return False
+        guild_queue.pending.add(member.id)
+        return True
+
+    def discard(self, guild_id, member_id):
+        # Chamado quando o membro sai do servidor ou é verificado: o item continua na fila, mas será ignorado
+        if guild_queue := self._guilds.get(guild_id):
+            guild_queue.pending.discard(member_id)
+
+    async def _worker(self, guild_id, guild_queue):
+        try:
+            while True:
+                try:
+                    member, role, reason, enqueued_at = await asyncio.wait_for(guild_queue.queue.get(), self.idle_timeout)
+                except asyncio.TimeoutError:
+                    return
+                if member.id not in guild_queue.pending or role in member.roles:
+                    guild_queue.pending.discard(member.id)
+                    self.skipped += 1
+                    continue
+                await guild_queue.bucket.acquire()
+                await self._global_bucket.acquire()
+                # O membro continua em pending durante a espera, para que um discard nesse meio-tempo ainda valha
+                if member.id not in guild_queue.pending:
+                    self.skipped += 1
+                    continue
+                guild_queue.pending.discard(member.id)
+                if self.skip_if and await self._should_skip(guild_id, member, role):
+                    self.skipped += 1
+                    continue
+                self.last_lag = time.monotonic() - enqueued_at
+                self.max_lag = max(self.max_lag, self.last_lag)
+                try:
+                    await member.add_roles(role, reason=reason)
+                    self.assigned += 1
+                except discord.NotFound:
+                    self.skipped += 1
+                except discord.Forbidden:
+                    self.failed += 1
+                    if self.on_forbidden: await self.on_forbidden(member, role)
+                except (discord.HTTPException, asyncio.TimeoutError) as e:
+                    self.failed += 1
+                    logger.warning("erro ao atribuir cargo guild_id=%s user_id=%s: %s", guild_id, member.id, e)
+        finally:
+            if self._guilds.get(guild_id) is guild_queue: del self._guilds[guild_id]
+
+    async def _should_skip(self, guild_id, member, role):
+        # Uma falha no skip_if (ex.: leitura no banco) não pode derrubar o worker e a fila do servidor: aplica o cargo
+        try:
+            return await self.skip_if(member, role)
+        except Exception:
+            logger.exception("erro no skip_if guild_id=%s user_id=%s; aplicando o cargo", guild_id, member.id)
+            return False
+
+    async def close(self):
+        tasks = [q.task for q in self._guilds.values() if q.task]
+        for task in tasks: task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._guilds.clear()
@@ -0,0 +1,64 @@
+import time
+
+# --- SESSÕES DE VERIFICAÇÃO EM MEMÓRIA ---
+# Guarda o estado de uma verificação ativa (inclusive o código sendo digitado no teclado) por user_id.
+# Se o usuário verificar em mais de um servidor, a sessão é a da verificação mais recente; as outras continuam no banco.
+# Cada tecla só altera a memória; o banco de dados só é atualizado nos estados finais (sucesso, falha, expiração).
+class VerificationSession:
+    __slots__ = ("user_id", "guild_id", "code", "attempts", "created_at", "current_input")
+
+    def __init__(self, user_id, guild_id, code, attempts=0, created_at=None, current_input=""):
+        self.user_id = user_id
+        self.guild_id = guild_id
+        self.code = code
+        self.attempts = attempts or 0
+        self.created_at = int(created_at if created_at is not None else time.time())
+        self.current_input = current_input or ""
+
+    def expires_at(self, ttl):
+        return self.created_at + ttl
+
+class SessionStore:
+    def __init__(self, ttl=600, purge_interval=60):
+        self.ttl = ttl
+        # A ordem de inserção não segue created_at (sessões reconstruídas do banco entram com o created_at original),
+        # então a limpeza varre todas as sessões; no put ela roda no máximo uma vez a cada purge_interval segundos
+        self.purge_interval = purge_interval
+        self._next_purge = 0
+        self._sessions = {}
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def __contains__(self, user_id):
+        return self.get(user_id) is not None
+
+    def _expired(self, session, now):
+        return now - session.created_at > self.ttl
+
+    def put(self, user_id, guild_id, code, attempts=0, created_at=None, current_input=""):
+        session = VerificationSession(user_id, guild_id, code, attempts, created_at, current_input)
+        self._sessions.pop(user_id, None)
+        self._sessions[user_id] = session
+        if time.time() >= self._next_purge: self.purge_expired()
+        return session
+
+    def get(self, user_id):
+        session = self._sessions.get(user_id)
+        if session and self._expired(session, time.time()):
+            del self._sessions[user_id]
+            return None
+        return session
+
+    def pop(self, user_id, guild_id=None):
+        # Com guild_id, só remove se a sessão ativa for desse servidor (o usuário pode ter começado outra depois)
+        session = self._sessions.get(user_id)
+        if session is None or (guild_id is not None and session.guild_id != guild_id): return None
+        return self._sessions.pop(user_id)
+
+    def purge_expired(self):
+        now = time.time()
+        self._next_purge = now + self.purge_interval
+        expired = [user_id for user_id, session in self._sessions.items() if self._expired(session, now)]
+        for user_id in expired: del self._sessions[user_id]
+        return len(expired)
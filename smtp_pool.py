@@ -0,0 +1,83 @@
+import asyncio
+import time
+from collections import deque
+
+import aiosmtplib
+
+# --- POOL DE CONEXÕES SMTP ---
+# Mantém sessões SMTP já autenticadas abertas e as reutiliza entre e-mails, evitando um handshake TLS + AUTH por código.
+# No máximo max_size envios acontecem ao mesmo tempo; conexões paradas há mais de idle_timeout são descartadas.
+# Se o servidor derrubou uma conexão ociosa, o envio é refeito uma vez numa conexão nova.
+class SMTPPool:
+    def __init__(self, hostname, port, username=None, password=None, use_tls=True, max_size=4, idle_timeout=120, timeout=30):
+        self.hostname = hostname
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.connects = 0
+        self.sent = 0
+        self._idle = deque()
+        self._slots = None
+        self._in_use = 0
+
+    def stats(self):
+        return {"idle": len(self._idle), "in_use": self._in_use, "max_size": self.max_size, "connects": self.connects, "sent": self.sent}
+
+    async def _connect(self):
+        client = aiosmtplib.SMTP(hostname=self.hostname, port=self.port, use_tls=self.use_tls, username=self.username, password=self.password, timeout=self.timeout)
+        await client.connect() # Também faz o login, se houver usuário e senha
+        self.connects += 1
+        return client
+
+    def _discard(self, client):
+        try:
+            client.close()
+        except Exception:
+            pass
+
+    async def _acquire(self):
+        # Usa a conexão devolvida mais recentemente (LIFO), que tem menos chance de ter expirado no servidor
+        while self._idle:
+            client, last_used = self._idle.pop()
+            if client.is_connected and time.monotonic() - last_used < self.idle_timeout:
+                return client
+            self._discard(client)
+        return await self._connect()
+
+    def _release(self, client):
+        self._idle.append((client, time.monotonic()))
+
+    async def send(self, message):
+        if self._slots is None: self._slots = asyncio.Semaphore(self.max_size)
+        async with self._slots:
+            self._in_use += 1
+            client = None
+            try:
+                client = await self._acquire()
+                try:
+                    response = await client.send_message(message)
+                except aiosmtplib.SMTPServerDisconnected:
+                    self._discard(client)
+                    client = await self._connect()
+                    response = await client.send_message(message)
+            except Exception:
+                if client is not None: self._discard(client)
+                raise
+            else:
+                self._release(client)
+                self.sent += 1
+                return response
+            finally:
+                self._in_use -= 1
+
+    async def close(self):
+        while self._idle:
+            client, _ = self._idle.pop()
+            try:
+                await client.quit()
+            except Exception:
+                self._discard(client)
@@ -0,0 +1,371 @@
+import abc
+import bisect
+import http.client
+import json
+import os
+import threading
+import time
+import urllib.parse
+
+import database as db
+
+# --- BACKENDS DE ARMAZENAMENTO ---
+# Configurações, verificações, usuários verificados e domínios bloqueados passam por um StorageBackend, escolhido
+# por STORAGE_BACKEND: "sqlite" (padrão, o database.py), "memory" (dicts em processo, para testes e benchmarks)
+# ou "remote" (HTTP para um storage_server.py, em STORAGE_URL). O restante (fila de e-mails, eventos, bot_state)
+# continua no SQLite em qualquer backend: mesmo com "remote", cada processo do bot ainda precisa do seu arquivo DB_PATH.
+# Um backend que não implementa todas as operações falha ao ser instanciado (StorageBackend é uma ABC).
+# Todas as chamadas rodam na thread do banco (async_database.run), então um backend não precisa ser seguro entre
+# threads; as operações e os formatos de retorno são os mesmos do database.py.
+# A conformidade e o desempenho de cada backend são medidos por benchmarks/bench_storage.py.
+OPERATIONS = (
+    "get_settings_version", "set_settings", "get_settings", "set_lockdown", "get_raid_settings", "set_raid_settings",
+    "create_verification", "get_verification", "update_attempts", "update_input_code", "delete_verification", "delete_expired_verifications",
+    "add_verified_user", "add_verified_users", "remove_verified_user", "remove_verified_users", "get_verified_user_ids", "get_verified_user",
+    "get_blocklist_version", "add_blocked_domain", "add_blocked_domains", "remove_blocked_domain", "is_domain_blocked", "get_all_blocked_domains", "get_blocked_domains_page",
+)
+
+class StorageError(Exception):
+    pass
+
+class StorageBackend(abc.ABC):
+    name = None
+
+    def init(self):
+        pass
+
+    def close(self):
+        pass
+
+    # Configurações
+    @abc.abstractmethod
+    def get_settings_version(self): ...
+    @abc.abstractmethod
+    def set_settings(self, guild_id, verified_role_id, unverified_role_id, log_channel_id, allowed_domains=None): ...
+    @abc.abstractmethod
+    def get_settings(self, guild_id): ...
+    @abc.abstractmethod
+    def set_lockdown(self, guild_id, status: bool): ...
+    @abc.abstractmethod
+    def get_raid_settings(self, guild_id): ...
+    @abc.abstractmethod
+    def set_raid_settings(self, guild_id, threshold_count, threshold_seconds, auto_lockdown: bool): ...
+
+    # Verificações
+    @abc.abstractmethod
+    def create_verification(self, user_id, guild_id, code): ...
+    @abc.abstractmethod
+    def get_verification(self, user_id, guild_id=None): ...
+    @abc.abstractmethod
+    def update_attempts(self, user_id, guild_id): ...
+    @abc.abstractmethod
+    def update_input_code(self, user_id, guild_id, new_input): ...
+    @abc.abstractmethod
+    def delete_verification(self, user_id, guild_id): ...
+    @abc.abstractmethod
+    def delete_expired_verifications(self, max_age=None, batch_size=500): ...
+
+    # Usuários verificados
+    @abc.abstractmethod
+    def add_verified_user(self, user_id, guild_id): ...
+    @abc.abstractmethod
+    def add_verified_users(self, pairs, verified_at=None, keep_existing=False): ...
+    @abc.abstractmethod
+    def remove_verified_user(self, user_id, guild_id): ...
+    @abc.abstractmethod
+    def remove_verified_users(self, pairs): ...
+    @abc.abstractmethod
+    def get_verified_user_ids(self, guild_id): ...
+    @abc.abstractmethod
+    def get_verified_user(self, user_id, guild_id): ...
+
+    # Domínios bloqueados
+    @abc.abstractmethod
+    def get_blocklist_version(self): ...
+    @abc.abstractmethod
+    def add_blocked_domain(self, domain): ...
+    @abc.abstractmethod
+    def add_blocked_domains(self, domains, batch_size=1000, progress=None): ...
+    @abc.abstractmethod
+    def remove_blocked_domain(self, domain): ...
+    @abc.abstractmethod
+    def is_domain_blocked(self, domain): ...
+    @abc.abstractmethod
+    def get_all_blocked_domains(self): ...
+    @abc.abstractmethod
+    def get_blocked_domains_page(self, after=None, before=None, prefix="", limit=25): ...
+
+    def iter_blocked_domains(self, batch_size=1000):
+        # Genérico: percorre a lista em páginas (keyset); o SQLite sobrescreve com um cursor
+        after = None
+        while page := self.get_blocked_domains_page(after=after, limit=batch_size):
+            yield from page
+            after = page[-1]
+
+    def export_blocked_domains(self, path):
+        count = 0
+        with open(path, "w", encoding="utf-8") as f:
+            for domain in self.iter_blocked_domains():
+                f.write(domain + "\n")
+                count += 1
+        return count
+
+class SQLiteBackend(StorageBackend):
+    # O database.py já é a implementação afinada (WAL, conexão persistente, índices, executemany); aqui só é exposto como backend
+    name = "sqlite"
+
+    def init(self):
+        db.init_db()
+
+    def close(self):
+        db.close_connection()
+
+    def iter_blocked_domains(self, batch_size=1000):
+        return db.iter_blocked_domains(batch_size)
+
+    def export_blocked_domains(self, path):
+        return db.export_blocked_domains(path)
+
+# Os métodos são atribuídos depois de criar a classe, então a lista de métodos abstratos é recalculada
+for _name in OPERATIONS: setattr(SQLiteBackend, _name, staticmethod(getattr(db, _name)))
+abc.update_abstractmethods(SQLiteBackend)
+
+class MemoryBackend(StorageBackend):
+    # Mesma semântica do SQLite, em dicts. Domínios ficam num set (busca) e numa lista ordenada (páginas por bisect).
+    name = "memory"
+
+    def __init__(self):
+        self.settings_version = 0
+        self.blocklist_version = 0
+        self.settings = {}
+        self.verifications = {}
+        self.verified_users = {}
+        self.domains = set()
+        self._sorted_domains = []
+        self._sequence = 0 # Ordem de inserção, o equivalente ao rowid no desempate de get_verification
+
+    # Configurações
+    def get_settings_version(self):
+        return self.settings_version
+
+    def _settings_row(self, guild_id):
+        if guild_id not in self.settings:
+            self.settings[guild_id] = {"verified_role_id": None, "unverified_role_id": None, "log_channel_id": None, "lockdown_enabled": False,
+                                       "raid_threshold_count": db.DEFAULT_RAID_THRESHOLD_COUNT, "raid_threshold_seconds": db.DEFAULT_RAID_THRESHOLD_SECONDS,
+                                       "raid_auto_lockdown": False}
+        return self.settings[guild_id]
+
+    def set_settings(self, guild_id, verified_role_id, unverified_role_id, log_channel_id, allowed_domains=None):
+        self._settings_row(guild_id).update(verified_role_id=verified_role_id, unverified_role_id=unverified_role_id, log_channel_id=log_channel_id, lockdown_enabled=False)
+        self.settings_version += 1
+
+    def get_settings(self, guild_id):
+        if (row := self.settings.get(guild_id)) is None: return (None, None, None, False)
+        return (row["verified_role_id"], row["unverified_role_id"], row["log_channel_id"], row["lockdown_enabled"])
+
+    def set_lockdown(self, guild_id, status: bool):
+        if row := self.settings.get(guild_id): row["lockdown_enabled"] = status
+        self.settings_version += 1
+
+    def get_raid_settings(self, guild_id):
+        if (row := self.settings.get(guild_id)) is None: return (db.DEFAULT_RAID_THRESHOLD_COUNT, db.DEFAULT_RAID_THRESHOLD_SECONDS, False)
+        return (row["raid_threshold_count"], row["raid_threshold_seconds"], row["raid_auto_lockdown"])
+
+    def set_raid_settings(self, guild_id, threshold_count, threshold_seconds, auto_lockdown: bool):
+        self._settings_row(guild_id).update(raid_threshold_count=threshold_count, raid_threshold_seconds=threshold_seconds, raid_auto_lockdown=auto_lockdown)
+        self.settings_version += 1
+
+    # Verificações: {user_id: {guild_id: [code, attempts, created_at, current_input, sequência]}}
+    def create_verification(self, user_id, guild_id, code):
+        rows = self.verifications.setdefault(user_id, {})
+        if (row := rows.get(guild_id)) is None:
+            self._sequence += 1
+            sequence = self._sequence
+        else:
+            sequence = row[4]
+        rows[guild_id] = [code, 0, int(time.time()), "", sequence]
+
+    def _verification(self, user_id, guild_id):
+        return self.verifications.get(user_id, {}).get(guild_id)
+
+    def get_verification(self, user_id, guild_id=None):
+        rows = self.verifications.get(user_id)
+        if not rows: return None
+        if guild_id is None: guild_id = max(rows, key=lambda row_guild_id: (rows[row_guild_id][2], rows[row_guild_id][4]))
+        if (row := rows.get(guild_id)) is None: return None
+        return (guild_id, row[0], row[1], row[2], row[3])
+
+    def update_attempts(self, user_id, guild_id):
+        if row := self._verification(user_id, guild_id): row[1] += 1
+
+    def update_input_code(self, user_id, guild_id, new_input):
+        if row := self._verification(user_id, guild_id): row[3] = new_input
+
+    def delete_verification(self, user_id, guild_id):
+        if (rows := self.verifications.get(user_id)) is None: return
+        rows.pop(guild_id, None)
+        if not rows: del self.verifications[user_id]
+
+    def delete_expired_verifications(self, max_age=None, batch_size=500):
+        timeout = int(time.time()) - (db.VERIFICATION_TTL if max_age is None else max_age)
+        expired = []
+        for user_id, rows in self.verifications.items():
+            expired += [(user_id, guild_id) for guild_id, row in rows.items() if row[2] < timeout]
+            if len(expired) >= batch_size: break
+        for user_id, guild_id in expired[:batch_size]: self.delete_verification(user_id, guild_id)
+        return min(len(expired), batch_size)
+
+    # Usuários verificados: {guild_id: {user_id: verified_at}}
+    def add_verified_user(self, user_id, guild_id):
+        self.verified_users.setdefault(guild_id, {})[user_id] = int(time.time())
+
+    def add_verified_users(self, pairs, verified_at=None, keep_existing=False):
+        verified_at = int(time.time()) if verified_at is None else verified_at
+        for user_id, guild_id in pairs:
+            users = self.verified_users.setdefault(guild_id, {})
+            if keep_existing: users.setdefault(user_id, verified_at)
+            else: users[user_id] = verified_at
+
+    def remove_verified_user(self, user_id, guild_id):
+        if users := self.verified_users.get(guild_id): users.pop(user_id, None)
+
+    def remove_verified_users(self, pairs):
+        for user_id, guild_id in pairs: self.remove_verified_user(user_id, guild_id)
+
+    def get_verified_user_ids(self, guild_id):
+        return list(self.verified_users.get(guild_id, ()))
+
+    def get_verified_user(self, user_id, guild_id):
+        return self.verified_users.get(guild_id, {}).get(user_id)
+
+    # Domínios bloqueados
+    def get_blocklist_version(self):
+        return self.blocklist_version
+
+    def add_blocked_domain(self, domain):
+        if domain in self.domains: return
+        self.domains.add(domain)
+        bisect.insort(self._sorted_domains, domain)
+        self.blocklist_version += 1
+
+    def add_blocked_domains(self, domains, batch_size=1000, progress=None):
+        # Como no SQLite: conta o que foi lido e o que era novo; a lista ordenada é refeita uma única vez no fim
+        processed, before = 0, len(self.domains)
+        for domain in domains:
+            self.domains.add(domain)
+            processed += 1
+            if progress and processed % batch_size == 0: progress(processed)
+        if progress and processed % batch_size: progress(processed)
+        if len(self.domains) != before:
+            self._sorted_domains = sorted(self.domains)
+            self.blocklist_version += 1
+        return processed, len(self.domains) - before
+
+    def remove_blocked_domain(self, domain):
+        if domain not in self.domains: return 0
+        self.domains.remove(domain)
+        del self._sorted_domains[bisect.bisect_left(self._sorted_domains, domain)]
+        self.blocklist_version += 1
+        return 1
+
+    def is_domain_blocked(self, domain):
+        return domain in self.domains
+
+    def get_all_blocked_domains(self):
+        return list(self._sorted_domains)
+
+    def get_blocked_domains_page(self, after=None, before=None, prefix="", limit=25):
+        lower, upper = db._prefix_range(prefix)
+        domains = self._sorted_domains
+        start, end = bisect.bisect_left(domains, lower), bisect.bisect_left(domains, upper)
+        if before is not None:
+            end = min(end, bisect.bisect_left(domains, before))
+            return domains[max(start, end - limit):end]
+        start = max(start, bisect.bisect_right(domains, after or ""))
+        return domains[start:min(end, start + limit)]
+
+class RemoteBackend(StorageBackend):
+    # Cada operação vira um POST /storage/<operação> com {"args": [...], "kwargs": {...}} e a resposta {"result": ...}, numa conexão
+    # HTTP keep-alive por thread. Um storage_server.py local serve de substituto para testes.
+    name = "remote"
+    # Linhas que o SQLite devolve como tupla chegam como lista no JSON
+    _TUPLE_RESULTS = {"get_settings", "get_raid_settings", "get_verification"}
+
+    def __init__(self, url, timeout=10):
+        parsed = urllib.parse.urlsplit(url)
+        self.host = parsed.hostname
+        self.port = parsed.port or (443 if parsed.scheme == "https" else 80)
+        self.https = parsed.scheme == "https"
+        self.prefix = parsed.path.rstrip("/")
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        con = getattr(self._local, "con", None)
+        if con is None:
+            cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+            con = self._local.con = cls(self.host, self.port, timeout=self.timeout)
+        return con
+
+    def _call(self, operation, *args, **kwargs):
+        body = json.dumps({"args": args, "kwargs": kwargs})
+        for attempt in range(2):
+            con = self._connection()
+            try:
+                con.request("POST", f"{self.prefix}/storage/{operation}", body, {"Content-Type": "application/json"})
+                response = con.getresponse()
+                data = response.read()
+                break
+            except (http.client.HTTPException, ConnectionError):
+                # O servidor pode ter fechado a conexão keep-alive ociosa: reconecta uma vez
+                con.close()
+                self._local.con = None
+                if attempt: raise StorageError(f"falha na conexão com o backend remoto ({operation})")
+        if response.status != 200:
+            raise StorageError(f"backend remoto respondeu {response.status} em {operation}: {data[:200].decode(errors='replace')}")
+        result = json.loads(data)["result"]
+        if operation in self._TUPLE_RESULTS and result is not None: result = tuple(result)
+        return result
+
+    def init(self):
+        self._call("get_settings_version")
+
+    def close(self):
+        if con := getattr(self._local, "con", None): con.close()
+        self._local.con = None
+
+    def add_blocked_domains(self, domains, batch_size=1000, progress=None):
+        # O iterável é enviado em lotes (um POST por lote); o progresso é contado aqui
+        processed, added, batch = 0, 0, []
+        for domain in domains:
+            batch.append(domain)
+            if len(batch) >= batch_size:
+                added += self._call("add_blocked_domains", batch)[1]
+                processed += len(batch)
+                batch = []
+                if progress: progress(processed)
+        if batch:
+            added += self._call("add_blocked_domains", batch)[1]
+            processed += len(batch)
+            if progress: progress(processed)
+        return processed, added
+
+def _remote_method(name):
+    def method(self, *args, **kwargs):
+        return self._call(name, *args, **kwargs)
+    method.__name__ = name
+    return method
+
+for _name in OPERATIONS:
+    if _name not in RemoteBackend.__dict__: setattr(RemoteBackend, _name, _remote_method(_name))
+abc.update_abstractmethods(RemoteBackend)
+
+def create_backend(name=None, url=None):
+    name = (name or os.getenv("STORAGE_BACKEND", "sqlite")).lower()
+    if name == "sqlite": return SQLiteBackend()
+    if name == "memory": return MemoryBackend()
+    if name == "remote":
+        url = url or os.getenv("STORAGE_URL")
+        if not url: raise ValueError("STORAGE_BACKEND=remote exige STORAGE_URL")
+        return RemoteBackend(url, timeout=float(os.getenv("STORAGE_TIMEOUT", 10)))
+    raise ValueError(f"STORAGE_BACKEND desconhecido: {name}")
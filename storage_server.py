@@ -0,0 +1,42 @@
+import logging
+import os
+import threading
+
+import uvicorn
+from fastapi import FastAPI, HTTPException
+
+import storage
+
+logger = logging.getLogger("astro.storage")
+
+# --- SERVIDOR DE ARMAZENAMENTO ---
+# Expõe um StorageBackend por HTTP para o RemoteBackend: POST /storage/<operação> com {"args": [...], "kwargs": {...}}.
+# Serve de substituto local de um armazenamento em rede (testes e benchmarks do backend "remote") e também permite
+# que vários processos do bot usem o mesmo armazenamento. As chamadas ao backend são serializadas por um lock.
+# Uso: STORAGE_SERVER_BACKEND=sqlite python storage_server.py (porta em STORAGE_SERVER_PORT, padrão 9200)
+def create_app(backend):
+    app = FastAPI(title="Astro storage", docs_url=None, redoc_url=None, openapi_url=None)
+    lock = threading.Lock()
+
+    @app.post("/storage/{operation}")
+    def call(operation: str, payload: dict):
+        if operation not in storage.OPERATIONS: raise HTTPException(404, f"operação desconhecida: {operation}")
+        with lock:
+            try:
+                result = getattr(backend, operation)(*payload.get("args", ()), **payload.get("kwargs", {}))
+            except (TypeError, ValueError) as e:
+                raise HTTPException(400, str(e))
+        return {"result": result}
+
+    @app.get("/health")
+    def health():
+        return {"status": "ok", "backend": backend.name}
+
+    return app
+
+if __name__ == "__main__":
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper(), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    backend = storage.create_backend(os.getenv("STORAGE_SERVER_BACKEND", "sqlite"))
+    backend.init()
+    uvicorn.run(create_app(backend), host=os.getenv("STORAGE_SERVER_HOST", "127.0.0.1"), port=int(os.getenv("STORAGE_SERVER_PORT", 9200)),
+                log_level="warning", access_log=False)
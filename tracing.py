@@ -0,0 +1,137 @@
+import contextvars
+import functools
+import itertools
+import json
+import os
+import random
+import time
+from collections import deque
+
+# --- RASTREAMENTO (TRACING) ---
+# Opcional: um trace por comando slash ou clique no teclado, com um span por etapa (banco, SMTP, DM, log_action...).
+# O trace atual fica num ContextVar, então os spans de qualquer função chamada dentro do comando caem nele sem
+# precisar passar nada adiante. Traces concluídos vão para um buffer circular e podem ser exportados no formato
+# JSON do Chrome (chrome://tracing ou ui.perfetto.dev).
+# Com sample_rate < 1, só uma fração dos traces é registrada; nos demais, span() custa uma leitura do ContextVar.
+_current = contextvars.ContextVar("astro_trace", default=None)
+
+class _Trace:
+    __slots__ = ("trace_id", "name", "attrs", "start", "end", "status", "spans")
+
+    def __init__(self, trace_id, name, attrs):
+        self.trace_id = trace_id
+        self.name = name
+        self.attrs = attrs
+        self.start = time.perf_counter_ns()
+        self.end = None
+        self.status = "ok"
+        self.spans = []
+
+class _Span:
+    __slots__ = ("trace", "name", "start")
+
+    def __init__(self, trace, name):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.trace.spans.append((self.name, self.start, time.perf_counter_ns() - self.start, exc_type is not None))
+        return False
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_NULL_SPAN = _NullSpan()
+
+class Tracer:
+    def __init__(self, enabled=False, sample_rate=1.0, capacity=1000):
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.recorded = 0
+        self._traces = deque(maxlen=capacity)
+        self._ids = itertools.count(1)
+        self._epoch = time.perf_counter_ns()
+
+    def __len__(self):
+        return len(self._traces)
+
+    def stats(self):
+        return {"enabled": self.enabled, "sample_rate": self.sample_rate, "buffered": len(self._traces), "capacity": self._traces.maxlen, "recorded": self.recorded}
+
+    def configure(self, enabled=None, sample_rate=None):
+        if enabled is not None: self.enabled = enabled
+        if sample_rate is not None: self.sample_rate = max(0.0, min(1.0, sample_rate))
+
+    def start_trace(self, name, **attrs):
+        # Retorna None (e nada é registrado) se o tracing estiver desligado, fora da amostra ou já houver um trace ativo
+        if not self.enabled or _current.get() is not None: return None
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate: return None
+        trace = _Trace(next(self._ids), name, attrs)
+        _current.set(trace)
+        return trace
+
+    def finish_trace(self, trace=None, status="ok"):
+        trace = trace or _current.get()
+        if trace is None or trace.end is not None: return
+        trace.end = time.perf_counter_ns()
+        trace.status = status
+        self._traces.append(trace)
+        self.recorded += 1
+        if _current.get() is trace: _current.set(None)
+
+    def span(self, name):
+        trace = _current.get()
+        return _Span(trace, name) if trace is not None else _NULL_SPAN
+
+    def traced(self, name):
+        # Decorator para coroutines que devem abrir um trace próprio (ex.: callbacks de botões)
+        def decorator(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                trace = self.start_trace(name)
+                if trace is None: return await func(*args, **kwargs)
+                status = "ok"
+                try:
+                    return await func(*args, **kwargs)
+                except BaseException:
+                    status = "error"
+                    raise
+                finally:
+                    self.finish_trace(trace, status)
+            return wrapper
+        return decorator
+
+    def clear(self):
+        self._traces.clear()
+
+    def to_chrome_trace(self):
+        # Cada trace vira uma "thread" no visualizador, com o evento raiz e os spans aninhados por tempo
+        events = []
+        for trace in list(self._traces):
+            tid = trace.trace_id
+            events.append({"name": "thread_name", "ph": "M", "pid": 1, "tid": tid, "args": {"name": f"{trace.name} #{tid}"}})
+            events.append({"name": trace.name, "cat": "trace", "ph": "X", "pid": 1, "tid": tid, "ts": (trace.start - self._epoch) / 1000,
+                           "dur": (trace.end - trace.start) / 1000, "args": {**{k: str(v) for k, v in trace.attrs.items()}, "status": trace.status}})
+            for name, start, duration, failed in trace.spans:
+                events.append({"name": name, "cat": "span", "ph": "X", "pid": 1, "tid": tid, "ts": (start - self._epoch) / 1000,
+                               "dur": duration / 1000, "args": {"error": True} if failed else {}})
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def dump(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_chrome_trace(), f)
+        return len(self._traces)
+
+tracer = Tracer(enabled=os.getenv("TRACING_ENABLED", "false").lower() == "true",
+                sample_rate=float(os.getenv("TRACING_SAMPLE_RATE", 1.0)),
+                capacity=int(os.getenv("TRACING_CAPACITY", 1000)))